@@ -2,16 +2,86 @@
 Base interfaces pro adaptéry
 """
 from abc import ABC, abstractmethod
-from typing import Iterator, Callable, Optional, List
+from collections import defaultdict
+from typing import Iterator, Callable, Optional, List, Iterable, Dict, Tuple
 from dataclasses import dataclass
+from backend.config import ExcludeMatcher
+from backend.adapters.fingerprint import Fingerprinter
+from backend.job_control import JobControl
+from backend.scan_manifest import ScanManifest
 
-@dataclass
+@dataclass(slots=True)
 class FileEntry:
-    """Reprezentace souboru"""
+    """Reprezentace souboru (slotted - scan i copy jich drží v paměti hodně)"""
     full_rel_path: str
     size: int
     mtime_epoch: float
     root_rel_path: str
+    fingerprint: Optional[str] = None  # Otisk obsahu (jen při zapnutém fingerprint režimu)
+    # Identita inode - vyplněná jen u hardlinků (st_nlink > 1), jinak None
+    inode: Optional[int] = None
+    dev: Optional[int] = None
+    nlink: Optional[int] = None
+
+@dataclass(slots=True)
+class DirState:
+    """Stav adresáře zaznamenaný při scanu (pro inkrementální scan)"""
+    rel_path: str
+    mtime_epoch: float
+    inode: int
+    child_count: int
+    fs_name: Optional[str] = None  # Název na disku, pokud se liší od NFC tvaru v rel_path
+    complete: bool = True  # False = adresář nebo některou jeho položku se nepodařilo vylistovat
+
+class DirIndex:
+    """
+    Adresáře z předchozího scanu datasetu.
+    Adresář je nezměněný, pokud má stejné mtime i inode a jeho mtime je starší než začátek
+    předchozího scanu (změna ve stejné sekundě jako předchozí listing by nebyla vidět).
+    Změna obsahu souboru mtime adresáře nemění - inkrementální scan ji nezachytí.
+    Neúplně vylistovaný adresář (complete=False) se vždy listuje znovu.
+    exclude_patterns jsou výjimky předchozího scanu (None = neznámé).
+    """
+
+    # Rezerva pro hrubou granularitu mtime (FAT/SMB až 2 s)
+    MTIME_GRANULARITY = 2.0
+
+    def __init__(self, dirs: Iterable[DirState], scanned_at: float, exclude_patterns: Optional[List[str]] = None):
+        self.dirs: Dict[str, DirState] = {d.rel_path: d for d in dirs}
+        self.scanned_at = scanned_at
+        self.exclude_patterns = exclude_patterns
+        self.children: Dict[str, List[str]] = defaultdict(list)
+        for rel_path in self.dirs:
+            if rel_path:
+                parent = rel_path.rsplit("/", 1)[0] if "/" in rel_path else ""
+                self.children[parent].append(rel_path)
+
+    def unchanged(self, rel_path: str, mtime_epoch: float, inode: int) -> Optional[DirState]:
+        """Vrátí předchozí stav adresáře, pokud se od předchozího scanu nezměnil"""
+        previous = self.dirs.get(rel_path)
+        if previous is None or not previous.complete:
+            return None
+        if previous.mtime_epoch != mtime_epoch or previous.inode != inode:
+            return None
+        if mtime_epoch >= self.scanned_at - self.MTIME_GRANULARITY:
+            return None
+        return previous
+
+    def same_exclude(self, exclude: Optional[ExcludeMatcher]) -> bool:
+        """
+        Má předchozí scan stejné výjimky? Jinak v indexu chybí dříve ořezané adresáře
+        a převzaly by se i nově vyloučené soubory - index se nesmí použít.
+        """
+        if self.exclude_patterns is None:
+            return False
+        return set(self.exclude_patterns) == set(exclude.patterns if exclude is not None else [])
+
+    def subdirs(self, rel_path: str) -> List[str]:
+        """Podadresáře adresáře podle předchozího scanu"""
+        return self.children.get(rel_path, [])
+
+# checkpoint_cb(root_rel, dir_path, rel_dir, subdirs, subtree)
+CheckpointCallback = Callable[[str, str, str, List[Tuple[str, str]], bool], None]
 
 class ScanAdapter(ABC):
     """Rozhraní pro scan adaptéry - pouze listování souborů"""
@@ -21,11 +91,38 @@ class ScanAdapter(ABC):
         self,
         roots: List[str],
         progress_cb: Optional[Callable[[int, str], None]] = None,
-        log_cb: Optional[Callable[[str], None]] = None
+        log_cb: Optional[Callable[[str], None]] = None,
+        dir_cb: Optional[Callable[[DirState, bool], None]] = None,
+        dir_index: Optional[DirIndex] = None,
+        exclude: Optional[ExcludeMatcher] = None,
+        checkpoint_cb: Optional[CheckpointCallback] = None,
+        resume: Optional[Dict[str, List[Tuple[str, str]]]] = None,
+        fingerprinter: Optional[Fingerprinter] = None,
+        manifest: Optional[ScanManifest] = None,
+        control: Optional[JobControl] = None
     ) -> Iterator[FileEntry]:
         """
         Vrátí iterator FileEntry pro všechny soubory v roots.
         Nesmí kopírovat data, pouze listovat.
+
+        exclude slouží k ořezání průchodu - do adresářů, pod kterými by byly vyloučené
+        všechny soubory (exclude.excludes_dir), se nesestupuje. Jednotlivé soubory
+        filtruje volající.
+
+        dir_cb(state, reused) se volá pro každý prošlý adresář; reused=True znamená, že adresář
+        je podle dir_index nezměněný, jeho soubory se nelistovaly a mají se převzít z předchozího
+        scanu. Adresář, který se nepodařilo (celý) vylistovat, má state.complete=False.
+        Adaptéry bez podpory inkrementálního scanu dir_cb ani dir_index nepoužívají.
+
+        fingerprinter (volitelný) doplní FileEntry.fingerprint - adaptér mu předává soubory
+        po adresářích spolu s funkcí, která soubor otevře pod skutečným jménem na disku.
+
+        manifest (volitelný, SSH agent) je předchozí scan - adaptér pak u rootů, které potvrdí
+        (manifest.mark_root), vrací jen nové a změněné soubory a odebrané hlásí manifestu.
+        Ostatní adaptéry ho ignorují a listují vše.
+
+        control (volitelný) je token jobu - adaptér volá control.checkpoint() mezi adresáři
+        (bloky výstupu), takže se scan pozastaví nebo ukončí výjimkou JobCancelled.
         """
         pass
 
@@ -40,11 +137,15 @@ class TransferAdapter(ABC):
         target_base: str,
         dry_run: bool = False,
         progress_cb: Optional[Callable[[int, str], None]] = None,
-        log_cb: Optional[Callable[[str], None]] = None
+        log_cb: Optional[Callable[[str], None]] = None,
+        control: Optional[JobControl] = None
     ) -> dict:
         """
         Zkopíruje soubory z source_base do target_base.
         Pracuje pouze s batch items - nerozhoduje co kopírovat.
+
+        control (volitelný) se připojí ke spuštěnému rsync - pauza ho zastaví (SIGSTOP),
+        zrušení ukončí; po skončení rsync adaptér vyhodí JobCancelled. Soubory zkopírované
+        do té doby už byly nahlášeny přes progress_cb.
         """
         pass
-
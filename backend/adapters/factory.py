@@ -16,23 +16,35 @@ class AdapterFactory:
         config = dataset.scan_adapter_config or {}
         
         if dataset.scan_adapter_type == "local":
+            # Počet vláken pro paralelní scan (1 = sériový průchod)
+            try:
+                workers = int(config.get("workers") or 1)
+            except (TypeError, ValueError):
+                workers = 1
             if location == "NAS1":
-                return LocalScanAdapter(base_path="/mnt/nas1")
+                return LocalScanAdapter(base_path="/mnt/nas1", workers=workers)
             elif location == "USB":
-                return LocalScanAdapter(base_path="/mnt/usb")
+                return LocalScanAdapter(base_path="/mnt/usb", workers=workers)
             elif location == "NAS2":
-                return LocalScanAdapter(base_path="/mnt/nas2")
+                return LocalScanAdapter(base_path="/mnt/nas2", workers=workers)
             else:
                 raise ValueError(f"Unknown location for local adapter: {location}")
         
         elif dataset.scan_adapter_type == "ssh":
+            # Počet souběžných SFTP kanálů (1 = sériový průchod)
+            try:
+                sftp_workers = int(config.get("sftp_workers") or 1)
+            except (TypeError, ValueError):
+                sftp_workers = 1
             return SshScanAdapter(
                 host=config.get("host", ""),
                 port=config.get("port", 22),
                 username=config.get("username", ""),
                 password=config.get("password", ""),
                 key_file=config.get("key_file"),
-                base_path=config.get("base_path", "/")
+                base_path=config.get("base_path", "/"),
+                scan_mode=config.get("scan_mode") or "auto",
+                sftp_workers=sftp_workers
             )
         
         else:
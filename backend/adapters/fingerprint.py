@@ -0,0 +1,168 @@
+"""
+Otisky obsahu souborů (fingerprint) pro scan - částečný hash s perzistentní cache
+"""
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+try:
+    import xxhash
+except ImportError:  # volitelná závislost - bez ní blake2b ze standardní knihovny
+    xxhash = None
+
+if TYPE_CHECKING:
+    from backend.adapters.base import FileEntry
+
+FINGERPRINT_SAMPLE = 64 * 1024  # kolik bajtů se čte ze začátku a z konce souboru
+FINGERPRINT_WORKERS = 4         # souběžné čtení souborů (I/O bound - NAS / SFTP)
+FINGERPRINT_ALGO = "xxh128" if xxhash is not None else "blake2b"
+FINGERPRINT_LOOKUP_CHUNK = 500  # cest v jednom SELECT ... IN (...) do file_hash_cache
+
+# (velikost, mtime, fingerprint) podle full_rel_path
+FingerprintCacheMap = Dict[str, Tuple[int, float, str]]
+Opener = Callable[[], BinaryIO]
+
+
+def fingerprint_stream(fh: BinaryIO, size: int, sample: int = FINGERPRINT_SAMPLE) -> str:
+    """
+    Otisk souboru: velikost + celý obsah (soubory do 2 * sample), jinak prvních
+    a posledních `sample` bajtů. Prefix algoritmu odliší otisky z jiné konfigurace.
+    """
+    h = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+    h.update(size.to_bytes(8, "little"))
+    if size <= 2 * sample:
+        while True:
+            chunk = fh.read(sample)
+            if not chunk:
+                break
+            h.update(chunk)
+    else:
+        h.update(fh.read(sample))
+        fh.seek(size - sample)
+        h.update(fh.read(sample))
+    return f"{FINGERPRINT_ALGO}:{h.hexdigest()}"
+
+
+class FingerprintCache:
+    """
+    Otisky z file_hash_cache datasetu dohledávané po dávkách (soubory jednoho adresáře)
+    přes index (dataset_id, path) - cache datasetu se nenačítá celá do paměti. Jedno
+    sqlite3 spojení sdílené vlákny procházení pod zámkem.
+    """
+
+    def __init__(self, db_path: str, dataset_id: int):
+        self.dataset_id = dataset_id
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+
+    def get_many(self, paths: List[str]) -> FingerprintCacheMap:
+        result = {}
+        with self._lock:
+            for start in range(0, len(paths), FINGERPRINT_LOOKUP_CHUNK):
+                chunk = paths[start:start + FINGERPRINT_LOOKUP_CHUNK]
+                result.update(
+                    (path, (size, mtime, fingerprint))
+                    for path, size, mtime, fingerprint in self._conn.execute(
+                        "SELECT path, size, mtime_epoch, fingerprint FROM file_hash_cache "
+                        f"WHERE dataset_id = ? AND path IN ({','.join('?' * len(chunk))})",
+                        [self.dataset_id] + chunk
+                    )
+                )
+        return result
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM file_hash_cache WHERE dataset_id = ?", (self.dataset_id,)
+            ).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Fingerprinter:
+    """
+    Doplňuje FileEntry.fingerprint během scanu. Nezměněné soubory (stejná cesta,
+    velikost a mtime jako v cache datasetu) se nečtou; nově spočítané otisky
+    si vyzvedává writer scanu přes drain() a ukládá je do file_hash_cache.
+    """
+
+    def __init__(self, cache: Optional[FingerprintCache] = None, workers: int = FINGERPRINT_WORKERS):
+        self._cache = cache
+        self.workers = max(1, workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._new: List[Tuple[str, int, float, str]] = []
+        self.stats = {"cached": 0, "hashed": 0, "bytes_read": 0, "errors": 0}
+        self.first_error: Optional[str] = None
+
+    def fill(self, items: List[Tuple["FileEntry", Opener]]):
+        """Doplní otisky souborů jednoho adresáře; opener otevře soubor pod skutečným jménem na disku"""
+        misses = []
+        cached = 0
+        hits = self._cache.get_many([entry.full_rel_path for entry, _ in items]) if self._cache else {}
+        for entry, opener in items:
+            hit = hits.get(entry.full_rel_path)
+            if (hit is not None and hit[0] == entry.size and hit[1] == entry.mtime_epoch
+                    and hit[2].startswith(FINGERPRINT_ALGO + ":")):
+                entry.fingerprint = hit[2]
+                cached += 1
+            else:
+                misses.append((entry, opener))
+        if cached:
+            with self._lock:
+                self.stats["cached"] += cached
+
+        if len(misses) <= 1 or self.workers == 1:
+            for entry, opener in misses:
+                self._hash(entry, opener)
+            return
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fingerprint")
+        list(self._executor.map(lambda item: self._hash(*item), misses))
+
+    def _hash(self, entry: "FileEntry", opener: Opener):
+        try:
+            with opener() as fh:
+                fingerprint = fingerprint_stream(fh, entry.size)
+        except Exception as e:
+            # Nečitelný soubor zůstane bez otisku, scan pokračuje
+            with self._lock:
+                self.stats["errors"] += 1
+                if self.first_error is None:
+                    self.first_error = f"{entry.full_rel_path}: {e}"
+            return
+        entry.fingerprint = fingerprint
+        with self._lock:
+            self._new.append((entry.full_rel_path, entry.size, entry.mtime_epoch, fingerprint))
+            self.stats["hashed"] += 1
+            self.stats["bytes_read"] += min(entry.size, 2 * FINGERPRINT_SAMPLE)
+
+    def drain(self) -> List[Tuple[str, int, float, str]]:
+        """Vyzvedne nově spočítané otisky (path, size, mtime, fingerprint) pro uložení do cache"""
+        with self._lock:
+            new, self._new = self._new, []
+        return new
+
+    def summary(self) -> str:
+        st = self.stats
+        text = (
+            f"Fingerprints ({FINGERPRINT_ALGO}): {st['hashed']} hashed "
+            f"({st['bytes_read'] / 1024 / 1024:.1f} MB read), {st['cached']} from cache, {st['errors']} errors"
+        )
+        if self.first_error:
+            text += f" (first: {self.first_error})"
+        return text
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._cache is not None:
+            self._cache.close()
+            self._cache = None
@@ -2,42 +2,93 @@
 Local filesystem scan adapter
 """
 import os
+import stat as stat_module
 import unicodedata
-from typing import Iterator, List, Optional, Callable
-from backend.adapters.base import ScanAdapter, FileEntry
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterator, List, Optional, Callable, Tuple, NamedTuple, Dict
+from backend.adapters.base import ScanAdapter, FileEntry, DirState, DirIndex, CheckpointCallback
+from backend.adapters.fingerprint import Fingerprinter
+from backend.config import ExcludeMatcher
+from backend.job_control import JobControl
+from backend.scan_manifest import ScanManifest
+
+
+def _nfc(name: str) -> str:
+    """NFC normalizace názvu - ASCII názvy se vrací beze změny"""
+    if name.isascii():
+        return name
+    return unicodedata.normalize("NFC", name)
+
+
+class _WalkContext(NamedTuple):
+    """Parametry průchodu jedné root složky"""
+    base_path_abs: str
+    root_rel_clean: str
+    roots: List[str]
+    dir_index: Optional[DirIndex]
+    track_dirs: bool
+    exclude: Optional[ExcludeMatcher]
+    fingerprinter: Optional[Fingerprinter]
+
+
+class _DirListing(NamedTuple):
+    """Výsledek zpracování jednoho adresáře"""
+    files: List[FileEntry]
+    subdirs: List[Tuple[str, str]]  # (absolutní cesta, relativní NFC cesta)
+    errors: List[str]
+    state: Optional[DirState]
+    reused: bool
+    pruned: int  # počet vyloučených podadresářů, do kterých se nesestupuje
+    dir_path: str
+    rel_dir: str
+    listed: bool  # False = adresář se nepodařilo vylistovat (při pokračování scanu se zkusí znovu)
+
 
 class LocalScanAdapter(ScanAdapter):
     """Scan adapter pro lokální filesystem"""
-    
-    def __init__(self, base_path: str):
+
+    def __init__(self, base_path: str, workers: int = 1):
         self.base_path = base_path
-    
+        # Počet vláken pro paralelní listování adresářů (1 = sériový průchod)
+        self.workers = max(1, workers)
+
     def list_files(
         self,
         roots: List[str],
         progress_cb: Optional[Callable[[int, str], None]] = None,
-        log_cb: Optional[Callable[[str], None]] = None
+        log_cb: Optional[Callable[[str], None]] = None,
+        dir_cb: Optional[Callable[[DirState, bool], None]] = None,
+        dir_index: Optional[DirIndex] = None,
+        exclude: Optional[ExcludeMatcher] = None,
+        checkpoint_cb: Optional[CheckpointCallback] = None,
+        resume: Optional[Dict[str, List[Tuple[str, str]]]] = None,
+        fingerprinter: Optional[Fingerprinter] = None,
+        manifest: Optional[ScanManifest] = None,
+        control: Optional[JobControl] = None
     ) -> Iterator[FileEntry]:
-        """Listuje soubory pomocí os.walk"""
+        """Listuje soubory pomocí os.scandir (stat z DirEntry, bez přepočtu cest pro každý soubor)"""
         count = 0
-        
+        reused_dirs = 0
+        pruned_dirs = 0
+
         # Normalizace base_path pro bezpečnostní kontroly
         base_path_abs = os.path.abspath(os.path.normpath(self.base_path))
-        
+
         for root_rel in roots:
             # Normalizace root_rel - odstranit úvodní lomítka
             root_rel_clean = root_rel.strip("/")
-            
+
             # Vytvoření absolutní cesty k root složce
             if root_rel_clean:
                 root_abs = os.path.join(self.base_path, root_rel_clean)
             else:
                 # Pokud root_rel je prázdný nebo "/", použij base_path
                 root_abs = self.base_path
-            
+
             # Normalizace absolutní cesty
             root_abs = os.path.abspath(os.path.normpath(root_abs))
-            
+
             # Bezpečnostní kontrola - root_abs musí být pod base_path
             try:
                 common_path = os.path.commonpath([base_path_abs, root_abs])
@@ -50,91 +101,254 @@ class LocalScanAdapter(ScanAdapter):
                 if log_cb:
                     log_cb(f"Warning: Root path is outside base_path: {root_abs} (base: {base_path_abs})")
                 continue
-            
+
             if not os.path.exists(root_abs):
                 if log_cb:
                     log_cb(f"Warning: Root path does not exist: {root_abs}")
                 continue
-            
+
             if not os.path.isdir(root_abs):
                 if log_cb:
                     log_cb(f"Warning: Root path is not a directory: {root_abs}")
                 continue
-            
+
+            # Relativní cesta root složky vůči base_path - počítá se jednou, dál se jen skládá
+            root_rel_dir = os.path.relpath(root_abs, base_path_abs).replace("\\", "/")
+            root_rel_dir = "" if root_rel_dir == "." else _nfc(root_rel_dir)
+
+            starts = [(root_abs, root_rel_dir)]
+            if resume is not None and root_rel in resume:
+                starts = resume[root_rel]
+                if not starts:
+                    if log_cb:
+                        log_cb(f"Resume: {root_abs} already completed, skipping")
+                    continue
+                if log_cb:
+                    log_cb(f"Resume: {root_abs} from {len(starts)} pending directories")
+
             if log_cb:
                 log_cb(f"Scanning: {root_abs} (base: {base_path_abs})")
-            
-            for dirpath, dirnames, filenames in os.walk(root_abs):
-                # Normalizace dirpath pro bezpečnostní kontrolu
-                dirpath_abs = os.path.abspath(os.path.normpath(dirpath))
-                
-                # Bezpečnostní kontrola - dirpath musí být pod base_path
-                try:
-                    common_path = os.path.commonpath([base_path_abs, dirpath_abs])
-                    if common_path != base_path_abs:
-                        # Pokud jsme mimo base_path, přeskočit tento adresář
-                        if log_cb:
-                            log_cb(f"Warning: Directory outside base_path, skipping: {dirpath_abs}")
-                        dirnames[:] = []  # Zastavit procházení do podadresářů
-                        continue
-                except ValueError:
-                    # Pokud commonpath selže, přeskočit
-                    dirnames[:] = []
-                    continue
-                
-                for filename in filenames:
-                    file_path = os.path.join(dirpath, filename)
-                    file_path_abs = os.path.abspath(os.path.normpath(file_path))
-                    
-                    # Bezpečnostní kontrola - file_path musí být pod base_path
-                    try:
-                        common_path = os.path.commonpath([base_path_abs, file_path_abs])
-                        if common_path != base_path_abs:
-                            # Soubor je mimo base_path, přeskočit
-                            continue
-                    except ValueError:
-                        # Pokud commonpath selže, přeskočit
-                        continue
-                    
-                    try:
-                        stat = os.stat(file_path)
-                        
-                        rel_path = os.path.relpath(file_path_abs, base_path_abs)
-                        rel_path = rel_path.replace("\\", "/")
-                        rel_path = unicodedata.normalize("NFC", rel_path)
-                        
-                        # Pokud rel_path začíná "..", znamená to, že jsme mimo base_path
-                        if rel_path.startswith("../"):
-                            if log_cb:
-                                log_cb(f"Warning: File path outside base_path, skipping: {file_path_abs}")
+                if self.workers > 1:
+                    log_cb(f"Parallel scan: {self.workers} workers")
+
+            ctx = _WalkContext(
+                base_path_abs=base_path_abs,
+                root_rel_clean=root_rel_clean,
+                roots=roots,
+                dir_index=dir_index,
+                track_dirs=dir_cb is not None or dir_index is not None,
+                exclude=exclude if exclude else None,
+                fingerprinter=fingerprinter
+            )
+
+            for listing in self._walk(starts, ctx):
+                if log_cb:
+                    for error in listing.errors:
+                        log_cb(error)
+                if listing.state is not None and dir_cb:
+                    dir_cb(listing.state, listing.reused)
+                if listing.reused:
+                    reused_dirs += 1
+                pruned_dirs += listing.pruned
+                for entry in listing.files:
+                    count += 1
+                    if progress_cb:
+                        progress_cb(count, entry.full_rel_path)
+                    yield entry
+                # Checkpoint až po vydání všech souborů adresáře
+                if checkpoint_cb and listing.listed:
+                    checkpoint_cb(root_rel, listing.dir_path, listing.rel_dir, listing.subdirs, False)
+                # Pauza / zrušení až za checkpointem - pokračování scanu adresář znovu nelistuje
+                if control is not None:
+                    control.checkpoint()
+
+        if dir_index is not None and log_cb:
+            log_cb(f"Incremental scan: {reused_dirs} unchanged directories reused from previous scan")
+        if pruned_dirs and log_cb:
+            log_cb(f"Skipped {pruned_dirs} excluded directories")
+
+    def _walk(self, starts: List[Tuple[str, str]], ctx: _WalkContext) -> Iterator[_DirListing]:
+        """
+        Prochází stromy pod starts [(absolutní cesta, relativní cesta)] (top-down, stejné pořadí
+        jako os.walk, symlinky na adresáře se nenásledují). Při workers > 1 se adresáře listují
+        paralelně a pořadí není zaručeno.
+        """
+        if self.workers > 1:
+            yield from self._walk_parallel(starts, ctx)
+            return
+
+        # Explicitní zásobník místo rekurze - hluboké stromy nevyčerpají limit rekurze
+        stack = list(reversed(starts))
+
+        while stack:
+            dir_abs, rel_dir = stack.pop()
+            listing = self._scan_dir(dir_abs, rel_dir, ctx)
+            yield listing
+            # Podadresáře v pořadí listingu (zásobník => obráceně)
+            stack.extend(reversed(listing.subdirs))
+
+    def _walk_parallel(self, starts: List[Tuple[str, str]], ctx: _WalkContext) -> Iterator[_DirListing]:
+        """
+        Paralelní procházení - podadresáře se předávají omezenému thread poolu, takže je
+        na síťovém mountu (SMB/NFS) rozpracováno více požadavků najednou. Výsledky se slučují
+        do jednoho iterátoru ve volajícím vlákně (tam se volají i callbacky).
+        """
+        pending = deque(reversed(starts))
+        in_flight = set()
+        # Max. počet rozpracovaných adresářů - omezuje paměť pro nevyzvednuté výsledky
+        max_in_flight = self.workers * 2
+
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="local-scan")
+        try:
+            while pending or in_flight:
+                while pending and len(in_flight) < max_in_flight:
+                    # LIFO - do hloubky, fronta čekajících adresářů zůstává malá
+                    dir_abs, rel_dir = pending.pop()
+                    in_flight.add(executor.submit(self._scan_dir, dir_abs, rel_dir, ctx))
+
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    listing = future.result()
+                    pending.extend(listing.subdirs)
+                    yield listing
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _scan_dir(self, dir_abs: str, rel_dir: str, ctx: _WalkContext) -> _DirListing:
+        """
+        Vylistuje jeden adresář. Relativní cesty se skládají z cesty adresáře a názvu souboru,
+        stat se bere z DirEntry a bezpečnostní kontrola se dělá jednou za adresář.
+        Nezměněný adresář (podle ctx.dir_index) se nelistuje - podadresáře se převezmou z indexu.
+        """
+        files: List[FileEntry] = []
+        subdirs: List[Tuple[str, str]] = []
+        errors: List[str] = []
+        state = None
+        pruned = 0
+        exclude = ctx.exclude
+
+        # Bezpečnostní kontrola - adresář musí být pod base_path
+        base_path_abs = ctx.base_path_abs
+        base_prefix = base_path_abs if base_path_abs.endswith(os.sep) else base_path_abs + os.sep
+        if dir_abs != base_path_abs and not dir_abs.startswith(base_prefix):
+            errors.append(f"Warning: Directory outside base_path, skipping: {dir_abs}")
+            return _DirListing(files, subdirs, errors, None, False, 0, dir_abs, rel_dir, False)
+
+        if ctx.track_dirs:
+            dir_name = os.path.basename(dir_abs)
+            fs_name = dir_name if _nfc(dir_name) != dir_name else None
+            try:
+                dir_stat = os.stat(dir_abs)
+            except OSError as e:
+                errors.append(f"Error accessing {dir_abs}: {e}")
+                # Neúplný stav - adresář zůstane v indexu pod rodičem a příští scan ho projde znovu
+                state = DirState(rel_path=rel_dir, mtime_epoch=0.0, inode=0, child_count=0,
+                                 fs_name=fs_name, complete=False)
+                return _DirListing(files, subdirs, errors, state, False, 0, dir_abs, rel_dir, False)
+
+            if ctx.dir_index is not None:
+                previous = ctx.dir_index.unchanged(rel_dir, dir_stat.st_mtime, dir_stat.st_ino)
+                if previous is not None:
+                    # Obsah adresáře se nezměnil - soubory převezme volající z předchozího scanu
+                    for child_rel in ctx.dir_index.subdirs(rel_dir):
+                        if exclude is not None and exclude.excludes_dir(child_rel):
+                            pruned += 1
                             continue
-                        
-                        # Určení root_rel_path
-                        root_rel_path = root_rel_clean if root_rel_clean else "/"
-                        
-                        # Pokud rel_path nezačíná root_rel, zkusit najít správný root
-                        if root_rel_clean and not rel_path.startswith(root_rel_clean + "/") and rel_path != root_rel_clean:
-                            # Zkusit najít nejbližší root
-                            for r in roots:
-                                r_clean = r.strip("/")
-                                if r_clean and (rel_path.startswith(r_clean + "/") or rel_path == r_clean):
-                                    root_rel_path = r_clean
-                                    break
-                        
-                        entry = FileEntry(
-                            full_rel_path=rel_path,
-                            size=stat.st_size,
-                            mtime_epoch=stat.st_mtime,
-                            root_rel_path=root_rel_path.replace("\\", "/")
-                        )
-                        
-                        count += 1
-                        if progress_cb:
-                            progress_cb(count, rel_path)
-                        
-                        yield entry
-                    except (OSError, PermissionError) as e:
-                        if log_cb:
-                            log_cb(f"Error accessing {file_path}: {e}")
-                        continue
+                        child = ctx.dir_index.dirs[child_rel]
+                        child_name = child.fs_name or child_rel.rsplit("/", 1)[-1]
+                        subdirs.append((os.path.join(dir_abs, child_name), child_rel))
+                    state = DirState(
+                        rel_path=rel_dir,
+                        mtime_epoch=dir_stat.st_mtime,
+                        inode=dir_stat.st_ino,
+                        child_count=previous.child_count,
+                        fs_name=fs_name
+                    )
+                    return _DirListing(files, subdirs, errors, state, True, pruned, dir_abs, rel_dir, True)
+
+        try:
+            with os.scandir(dir_abs) as it:
+                entries = list(it)
+        except OSError as e:
+            errors.append(f"Error accessing {dir_abs}: {e}")
+            if ctx.track_dirs:
+                state = DirState(rel_path=rel_dir, mtime_epoch=dir_stat.st_mtime, inode=dir_stat.st_ino,
+                                 child_count=0, fs_name=fs_name, complete=False)
+            return _DirListing(files, subdirs, errors, state, False, 0, dir_abs, rel_dir, False)
+
+        if ctx.track_dirs:
+            state = DirState(
+                rel_path=rel_dir,
+                mtime_epoch=dir_stat.st_mtime,
+                inode=dir_stat.st_ino,
+                child_count=len(entries),
+                fs_name=fs_name
+            )
+
+        root_rel_path = self._root_for_dir(rel_dir, ctx.root_rel_clean, ctx.roots)
+        prefix = rel_dir + "/" if rel_dir else ""
+        to_hash = []
+
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+
+            if is_dir:
+                # Symlinky na adresáře se neprocházejí (stejně jako os.walk(followlinks=False))
+                if not entry.is_symlink():
+                    child_rel = prefix + _nfc(entry.name)
+                    if exclude is not None and exclude.excludes_dir(child_rel):
+                        pruned += 1
+                    else:
+                        subdirs.append((entry.path, child_rel))
+                continue
+
+            try:
+                stat = entry.stat()
+            except OSError as e:
+                errors.append(f"Error accessing {entry.path}: {e}")
+                continue
+
+            file_entry = FileEntry(
+                full_rel_path=prefix + _nfc(entry.name),
+                size=stat.st_size,
+                mtime_epoch=stat.st_mtime,
+                root_rel_path=root_rel_path
+            )
+            if stat.st_nlink > 1:
+                # Hardlink - stejná data pod více cestami (zálohy typu hardlink farm)
+                file_entry.inode = stat.st_ino
+                file_entry.dev = stat.st_dev
+                file_entry.nlink = stat.st_nlink
+            files.append(file_entry)
+            # Jen běžné soubory - otevření FIFO / zařízení by zablokovalo scan
+            if ctx.fingerprinter is not None and stat_module.S_ISREG(stat.st_mode):
+                to_hash.append((files[-1], lambda path=entry.path: open(path, "rb")))
+
+        if to_hash:
+            # Otisky se počítají ve vlákně, které adresář listuje (paralelní scan = paralelní čtení)
+            ctx.fingerprinter.fill(to_hash)
+
+        if errors and state is not None:
+            # Chybějící soubory by převzetí adresáře v příštím inkrementálním scanu neobnovilo
+            state.complete = False
+
+        return _DirListing(files, subdirs, errors, state, False, pruned, dir_abs, rel_dir, True)
+
+    @staticmethod
+    def _root_for_dir(rel_dir: str, root_rel_clean: str, roots: List[str]) -> str:
+        """Určení root_rel_path pro všechny soubory v adresáři rel_dir"""
+        if not root_rel_clean:
+            return "/"
+
+        if rel_dir == root_rel_clean or rel_dir.startswith(root_rel_clean + "/"):
+            return root_rel_clean
 
+        # Pokud adresář neleží pod root_rel, zkusit najít nejbližší root
+        for r in roots:
+            r_clean = r.strip("/")
+            if r_clean and (rel_dir == r_clean or rel_dir.startswith(r_clean + "/")):
+                return r_clean
+        return root_rel_clean
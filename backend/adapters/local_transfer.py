@@ -3,8 +3,10 @@ Local filesystem transfer adapter (rsync)
 """
 import subprocess
 import os
+from collections import Counter
 from typing import List, Optional, Callable
 from backend.adapters.base import TransferAdapter, FileEntry
+from backend.job_control import JobCancelled, JobControl
 
 class LocalRsyncTransferAdapter(TransferAdapter):
     """Transfer adapter pro lokální rsync"""
@@ -16,7 +18,8 @@ class LocalRsyncTransferAdapter(TransferAdapter):
         target_base: str,
         dry_run: bool = False,
         progress_cb: Optional[Callable[[int, str], None]] = None,
-        log_cb: Optional[Callable[[str], None]] = None
+        log_cb: Optional[Callable[[str], None]] = None,
+        control: Optional[JobControl] = None
     ) -> dict:
         """Kopíruje soubory pomocí rsync"""
         
@@ -44,20 +47,30 @@ class LocalRsyncTransferAdapter(TransferAdapter):
                 target_base + "/"
             ]
             
+            # Hardlinky v batchi - data se přenesou jednou a na cíli se vytvoří odkazy
+            link_groups = [count for count in Counter((f.dev, f.inode) for f in files if f.inode is not None).values() if count > 1]
+            if link_groups:
+                cmd.insert(1, "-H")
+                if log_cb:
+                    log_cb(f"Preserving hardlinks: {sum(link_groups)} files in {len(link_groups)} inode groups (rsync -H)")
+            
             if dry_run:
                 cmd.append("--dry-run")
             
             if log_cb:
                 log_cb(f"Running: {' '.join(cmd)}")
             
-            # Spuštění rsync
+            # Spuštění rsync - ve vlastní skupině procesů, pauza / zrušení jobu zasáhne i jeho potomky
             process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True,
-                bufsize=1
+                bufsize=1,
+                start_new_session=control is not None
             )
+            if control is not None:
+                control.attach_process(process)
             
             # Build lookup dict for O(1) file matching
             files_by_path = {f.full_rel_path: f for f in files}
@@ -74,6 +87,10 @@ class LocalRsyncTransferAdapter(TransferAdapter):
                 if not line_stripped or line_stripped.startswith(rsync_info_prefixes) or line_stripped.endswith("/"):
                     continue
                 
+                # Hardlink na už přenesený soubor: "cesta => cíl odkazu"
+                if " => " in line_stripped:
+                    line_stripped = line_stripped.split(" => ", 1)[0]
+                
                 matched_file = None
                 file_size = 0
                 
@@ -87,7 +104,16 @@ class LocalRsyncTransferAdapter(TransferAdapter):
                     if progress_cb:
                         progress_cb(copied, matched_file, file_size, success=True, error=None)
             
-            returncode = process.wait()
+            if control is not None:
+                returncode = control.wait_process(process)
+                control.detach_process(process)
+                if control.cancelled:
+                    # Zkopírované soubory už jsou nahlášené, nedokončený zůstane díky --partial
+                    if log_cb:
+                        log_cb(f"Rsync cancelled after {copied} files")
+                    raise JobCancelled(f"Rsync cancelled after {copied} files")
+            else:
+                returncode = process.wait()
             
             if returncode != 0:
                 error_output = process.stderr.read()
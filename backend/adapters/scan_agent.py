@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Remote scan agent - uploaded to the SSH host by SshScanAdapter (scan_mode "agent").
+
+Self-contained (standard library only, Python 3.4+): it must not import anything
+from the backend package, the file is copied to the remote host as is.
+
+Usage: python3 scan_agent.py <root> <manifest> [<pruned literal> ...]
+
+The manifest is a zlib-compressed list of the files of the previous scan below
+<root>, sorted by path components in byte order (see sort_key) and front-coded:
+
+    SOMANIFEST1\n
+    <shared prefix length>\t<size>\t<mtime>\t<links>\t<path suffix>\0 ...
+
+The agent walks <root> depth-first with names sorted per directory (the same
+order; symlinks are not followed), merges the walk with the manifest and writes
+only the differences to stdout: the SOAGENT1 header, then frames of a 4-byte
+big-endian length + zlib-compressed records
+
+    <op>\t<type>\t<size>\t<mtime>\t<inode>\t<device>\t<links>\t<path relative to root>\0
+
+op: a = added, m = modified, r = removed (only the path is meaningful),
+p = progress (size = files walked so far), s = summary (size = files,
+mtime = directories, inode = unchanged files). The summary is always the last
+record - a stream without it was cut short. Unreadable entries go to stderr.
+"""
+import os
+import stat
+import struct
+import sys
+import time
+import zlib
+
+MAGIC = b"SOAGENT1\n"
+MANIFEST_MAGIC = b"SOMANIFEST1\n"
+FRAME_BYTES = 256 * 1024        # uncompressed record bytes per frame
+PROGRESS_INTERVAL = 5.0         # seconds between progress records (keeps the channel busy)
+READ_SIZE = 256 * 1024
+
+
+def sort_key(path):
+    """Component-wise byte order: the separator sorts before every name byte"""
+    return path.replace(b"/", b"\x00")
+
+
+def read_manifest(path):
+    """Yield (path, size, mtime, links) from the compressed manifest file"""
+    decompressor = zlib.decompressobj()
+    buf = b""
+    previous = b""
+    header_checked = False
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(READ_SIZE)
+            buf += decompressor.decompress(chunk) if chunk else decompressor.flush()
+            if not header_checked and (len(buf) >= len(MANIFEST_MAGIC) or not chunk):
+                if not buf.startswith(MANIFEST_MAGIC):
+                    raise ValueError("unsupported manifest format")
+                buf = buf[len(MANIFEST_MAGIC):]
+                header_checked = True
+            if header_checked:
+                records = buf.split(b"\0")
+                buf = records.pop()
+                for record in records:
+                    shared, size, mtime, links, suffix = record.split(b"\t", 4)
+                    previous = previous[:int(shared)] + suffix
+                    yield previous, int(size), float(mtime), int(links)
+            if not chunk:
+                break
+    if buf:
+        raise ValueError("truncated manifest")
+
+
+class Walker(object):
+    """Depth-first walk with names sorted per directory - yields (path, stat) in sort_key order"""
+
+    def __init__(self, root, pruned):
+        self.root = root
+        self.pruned = pruned
+        self.files = 0
+        self.dirs = 0
+
+    def _list(self, rel_dir):
+        path = self.root + b"/" + rel_dir if rel_dir else self.root
+        try:
+            names = sorted(os.listdir(path), reverse=True)
+        except OSError as e:
+            sys.stderr.write("cannot read directory {0}: {1}\n".format(os.fsdecode(path), e))
+            return None
+        self.dirs += 1
+        return names
+
+    def walk(self):
+        # Stack of (directory, remaining names reversed) - no recursion for deep trees
+        stack = [(b"", self._list(b"") or [])]
+        while stack:
+            rel_dir, names = stack[-1]
+            if not names:
+                stack.pop()
+                continue
+            name = names.pop()
+            rel = rel_dir + b"/" + name if rel_dir else name
+            try:
+                st = os.lstat(self.root + b"/" + rel)
+            except OSError as e:
+                sys.stderr.write("cannot stat {0}: {1}\n".format(os.fsdecode(rel), e))
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                if any(literal in rel for literal in self.pruned):
+                    continue
+                children = self._list(rel)
+                if children:
+                    stack.append((rel, children))
+                continue
+            self.files += 1
+            yield rel, st
+
+
+def same_mtime(recorded, current):
+    # SFTP scans record whole seconds, find/local scans fractions
+    if recorded == int(recorded):
+        return int(current) == int(recorded)
+    return abs(current - recorded) < 0.001
+
+
+class FrameWriter(object):
+    def __init__(self, out):
+        self.out = out
+        self.records = []
+        self.size = 0
+        self.out.write(MAGIC)
+
+    def add(self, op, ftype, size, mtime, inode, dev, links, path):
+        record = "{0}\t{1}\t{2}\t{3!r}\t{4}\t{5}\t{6}\t".format(
+            op, ftype, size, mtime, inode, dev, links
+        ).encode("ascii") + path + b"\0"
+        self.records.append(record)
+        self.size += len(record)
+        if self.size >= FRAME_BYTES:
+            self.flush()
+
+    def flush(self):
+        if not self.records:
+            return
+        payload = zlib.compress(b"".join(self.records), 6)
+        self.out.write(struct.pack(">I", len(payload)))
+        self.out.write(payload)
+        self.out.flush()
+        self.records = []
+        self.size = 0
+
+
+def file_type(mode):
+    if stat.S_ISREG(mode):
+        return "f"
+    if stat.S_ISLNK(mode):
+        return "l"
+    return "o"
+
+
+def main(argv):
+    if len(argv) < 3:
+        sys.stderr.write("usage: scan_agent.py <root> <manifest> [<pruned literal> ...]\n")
+        return 2
+    root = os.fsencode(argv[1]).rstrip(b"/") or b"/"
+    pruned = [os.fsencode(literal) for literal in argv[3:]]
+    out = FrameWriter(sys.stdout.buffer)
+    walker = Walker(root, pruned)
+    unchanged = 0
+    last_progress = time.time()
+
+    def changed(op, path, st):
+        links = st.st_nlink
+        out.add(op, file_type(st.st_mode), st.st_size, st.st_mtime,
+                st.st_ino if links > 1 else 0, st.st_dev if links > 1 else 0, links, path)
+
+    manifest = read_manifest(argv[2])
+    old = next(manifest, None)
+    for path, st in walker.walk():
+        key = sort_key(path)
+        while old is not None and sort_key(old[0]) < key:
+            out.add("r", "-", 0, 0.0, 0, 0, 0, old[0])
+            old = next(manifest, None)
+        if old is not None and old[0] == path:
+            _, size, mtime, links = old
+            if size == st.st_size and links == st.st_nlink and same_mtime(mtime, st.st_mtime):
+                unchanged += 1
+            else:
+                changed("m", path, st)
+            old = next(manifest, None)
+        else:
+            changed("a", path, st)
+        now = time.time()
+        if now - last_progress >= PROGRESS_INTERVAL:
+            last_progress = now
+            out.add("p", "-", walker.files, 0.0, 0, 0, 0, b"")
+            out.flush()
+    while old is not None:
+        out.add("r", "-", 0, 0.0, 0, 0, 0, old[0])
+        old = next(manifest, None)
+    out.add("s", "-", walker.files, float(walker.dirs), unchanged, 0, 0, b"")
+    out.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -2,13 +2,27 @@
 SSH/SFTP scan adapter – robust version with retry, reconnection and encoding fixes.
 """
 import logging
+import os
+import queue
+import shlex
+import socket
+import threading
 import time
 import stat as stat_module
+import struct
+import tempfile
 import unicodedata
+import uuid
+import zlib
 import paramiko
-from typing import Iterator, List, Optional, Callable
+from typing import Iterator, List, Optional, Callable, Dict, Tuple
 
-from backend.adapters.base import ScanAdapter, FileEntry
+from backend.adapters.base import ScanAdapter, FileEntry, DirState, DirIndex, CheckpointCallback
+from backend.adapters.fingerprint import Fingerprinter
+from backend.config import ExcludeMatcher
+from backend.job_control import JobControl
+from backend.scan_manifest import ScanManifest
+from backend.ssh_pool import ssh_pool, PooledConnection
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +30,23 @@ MAX_RETRIES = 3
 RETRY_DELAY = 2
 BATCH_RECONNECT_THRESHOLD = 3
 
+# Remote `find` scan mode: one exec channel per root, NUL-delimited records
+#   <type>\t<size>\t<mtime>\t<inode>\t<device>\t<links>\t<path relative to root>\0
+SCAN_MODES = ("auto", "find", "sftp", "agent")
+FIND_PRINTF = "%y\\t%s\\t%T@\\t%i\\t%D\\t%n\\t%P\\0"
+FIND_PATH_FIELD = 6
+FIND_RECV_SIZE = 256 * 1024
+FIND_POLL_TIMEOUT = 1.0      # seconds between stderr drains while stdout is idle
+FIND_IDLE_TIMEOUT = 600      # abort when the remote find produces nothing for this long
+
+# Remote agent scan mode: scan_agent.py + manifest of the previous scan uploaded over SFTP,
+# the agent streams back only added / modified / removed files (see scan_agent.py)
+AGENT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scan_agent.py")
+AGENT_PYTHON = "python3"
+AGENT_MAGIC = b"SOAGENT1\n"
+AGENT_RECORD_FIELDS = 7      # index of the path field in an agent record
+AGENT_REMOTE_DIR = "/tmp"
+
 
 def _try_fix_encoding(name: str) -> str:
     """Attempt to repair double-encoded UTF-8 filenames (mojibake).
@@ -42,15 +73,29 @@ class SshScanAdapter(ScanAdapter):
 
     def __init__(self, host: str, port: int = 22, username: str = "",
                  password: str = "", key_file: Optional[str] = None,
-                 base_path: str = "/"):
+                 base_path: str = "/", scan_mode: str = "auto",
+                 sftp_workers: int = 1):
         self.host = host
         self.port = port
         self.username = username
         self.password = password
         self.key_file = key_file
         self.base_path = base_path.rstrip("/")
+        # "auto" = remote find when available, otherwise SFTP; "find" / "sftp" force one backend
+        self.scan_mode = scan_mode if scan_mode in SCAN_MODES else "auto"
+        # Number of concurrent SFTP channels for the SFTP walker (1 = serial)
+        self.sftp_workers = max(1, sftp_workers)
+        self._conn_lock = threading.Lock()
+        # Exclude matcher of the running list_files() call (directory pruning)
+        self._exclude: Optional[ExcludeMatcher] = None
+        self._checkpoint_cb: Optional[CheckpointCallback] = None
+        self._fingerprinter: Optional[Fingerprinter] = None
+        # Cancel / pause token of the running list_files() call
+        self._control: Optional[JobControl] = None
         self.client: Optional[paramiko.SSHClient] = None
         self.sftp: Optional[paramiko.SFTPClient] = None
+        # Connection borrowed from the shared SSH pool
+        self._pooled: Optional[PooledConnection] = None
         # scan-level statistics
         self.stats = {
             "dirs_visited": 0,
@@ -58,6 +103,7 @@ class SshScanAdapter(ScanAdapter):
             "files_found": 0,
             "errors": [],          # list of (path, error_str)
             "encoding_fixes": 0,
+            "dirs_pruned": 0,
         }
 
     # ------------------------------------------------------------------
@@ -72,39 +118,28 @@ class SshScanAdapter(ScanAdapter):
             except Exception:
                 self._disconnect()
 
-        self.client = paramiko.SSHClient()
-        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
         try:
-            kw = dict(hostname=self.host, port=self.port, username=self.username)
-            if self.key_file:
-                kw["key_filename"] = self.key_file
-            else:
-                kw["password"] = self.password
-
-            self.client.connect(**kw, timeout=30, banner_timeout=30)
-            transport = self.client.get_transport()
-            if transport:
-                transport.set_keepalive(15)
-            self.sftp = self.client.open_sftp()
-            self.sftp.get_channel().settimeout(60)
+            self._pooled = ssh_pool.acquire(
+                self.host, self.port, self.username,
+                password=self.password, key_file=self.key_file, timeout=30
+            )
+            self.client = self._pooled.client
+            self.sftp = self._pooled.sftp()
         except Exception as e:
-            self.client = None
+            self._disconnect()
             raise Exception(f"Failed to connect to SSH {self.host}:{self.port}: {e}")
 
-    def _disconnect(self):
-        if self.sftp:
-            try:
-                self.sftp.close()
-            except Exception:
-                pass
-            self.sftp = None
-        if self.client:
-            try:
-                self.client.close()
-            except Exception:
-                pass
-            self.client = None
+    def _disconnect(self, broken: bool = True):
+        """Return the borrowed connection to the pool.
+
+        Called after failures by default, so the connection is closed instead
+        of being reused; the end of a scan passes broken=False.
+        """
+        if self._pooled is not None:
+            ssh_pool.release(self._pooled, broken=broken)
+            self._pooled = None
+        self.sftp = None
+        self.client = None
 
     def _ensure_connection(self):
         """Reconnect if the connection was dropped."""
@@ -126,7 +161,10 @@ class SshScanAdapter(ScanAdapter):
         last_err = None
         for attempt in range(1, MAX_RETRIES + 1):
             try:
-                self._ensure_connection()
+                # No stat('.') probe per directory - a dead connection surfaces
+                # as a listdir failure and is reconnected on the retry
+                if not self.sftp:
+                    self._connect()
                 items = self.sftp.listdir_attr(path)
                 return items
             except Exception as e:
@@ -161,14 +199,18 @@ class SshScanAdapter(ScanAdapter):
         return unicodedata.normalize("NFC", fixed)
 
     # ------------------------------------------------------------------
-    # Recursive walker
+    # SFTP walker (explicit work queue)
     # ------------------------------------------------------------------
 
-    def _walk_sftp(self, remote_path: str, root_rel: str,
-                   log_cb: Optional[Callable[[str], None]] = None,
-                   depth: int = 0) -> Iterator[FileEntry]:
-        """Recursively walk a remote directory, yielding FileEntry objects."""
-        items = self._listdir_attr_safe(remote_path)
+    def _process_listing(self, remote_path: str, depth: int, items: Optional[list],
+                         root_rel: str, log_cb: Optional[Callable[[str], None]] = None):
+        """Turn one listdir_attr result into (files, subdirs) and update stats.
+
+        Always runs in the consuming thread, so stats need no locking.
+        """
+        files: List[FileEntry] = []
+        subdirs: List[str] = []
+
         if items is None:
             err_msg = f"Failed to list directory after {MAX_RETRIES} retries: {remote_path}"
             logger.error(err_msg)
@@ -176,37 +218,37 @@ class SshScanAdapter(ScanAdapter):
             self.stats["errors"].append((remote_path, err_msg))
             if log_cb:
                 log_cb(f"ERROR: {err_msg}")
-            return
+            return files, subdirs
 
         self.stats["dirs_visited"] += 1
         if log_cb and depth < 2:
             log_cb(f"Scanning: {remote_path} ({len(items)} items)")
 
-        files_count = 0
-        dirs_count = 0
+        root_rel_path = root_rel.strip("/") if root_rel else ""
+        to_hash = []
 
         for item in items:
             try:
                 filename = self._fix_filename(item.filename)
                 child_path = f"{remote_path}/{filename}" if remote_path != "/" else f"/{filename}"
 
-                is_dir = stat_module.S_ISDIR(item.st_mode)
-
-                if is_dir:
-                    dirs_count += 1
-                    yield from self._walk_sftp(child_path, root_rel, log_cb, depth + 1)
+                if stat_module.S_ISDIR(item.st_mode):
+                    if self._exclude is not None and self._exclude.excludes_dir(self._compute_rel_path(child_path)):
+                        self.stats["dirs_pruned"] += 1
+                    else:
+                        subdirs.append(child_path)
                 else:
-                    files_count += 1
                     self.stats["files_found"] += 1
-                    rel_path = self._compute_rel_path(child_path)
-
-                    entry = FileEntry(
-                        full_rel_path=rel_path,
+                    files.append(FileEntry(
+                        full_rel_path=self._compute_rel_path(child_path),
                         size=item.st_size,
                         mtime_epoch=float(item.st_mtime),
-                        root_rel_path=root_rel.strip("/") if root_rel else ""
-                    )
-                    yield entry
+                        root_rel_path=root_rel_path
+                    ))
+                    if self._fingerprinter is not None and stat_module.S_ISREG(item.st_mode):
+                        # Open by the name as listed, before any encoding fix
+                        raw_path = f"{remote_path}/{item.filename}" if remote_path != "/" else f"/{item.filename}"
+                        to_hash.append((files[-1], self._remote_opener(raw_path)))
 
             except Exception as e:
                 child_name = getattr(item, "filename", "?")
@@ -217,8 +259,538 @@ class SshScanAdapter(ScanAdapter):
                     log_cb(f"WARNING: {err_msg}")
                 continue
 
+        if to_hash:
+            self._fingerprinter.fill(to_hash)
+
         if log_cb and depth == 0:
-            log_cb(f"Directory {remote_path}: {files_count} files, {dirs_count} subdirectories")
+            log_cb(f"Directory {remote_path}: {len(files)} files, {len(subdirs)} subdirectories")
+
+        return files, subdirs
+
+    def _remote_opener(self, path):
+        """Opener for the fingerprinter: read-only file on the main SFTP channel.
+
+        paramiko multiplexes concurrent requests on one channel, so the
+        fingerprint workers can share it.
+        """
+        sftp = self.sftp
+        return lambda: sftp.open(path, "rb")
+
+    def _walk_sftp(self, starts: List[str], root_rel: str,
+                   log_cb: Optional[Callable[[str], None]] = None,
+                   root_key: Optional[str] = None) -> Iterator[FileEntry]:
+        """Walk remote directory trees below `starts`, yielding FileEntry objects.
+
+        Directories are kept on an explicit stack (same depth-first order as the
+        old recursive walker), so deep trees do not pile up generator frames.
+        With sftp_workers > 1 the concurrent walker is used instead.
+        """
+        if self.sftp_workers > 1:
+            yield from self._walk_sftp_parallel(starts, root_rel, log_cb, root_key)
+            return
+
+        stack = [(path, 0) for path in reversed(starts)]
+        while stack:
+            path, depth = stack.pop()
+            items = self._listdir_attr_safe(path)
+            files, subdirs = self._process_listing(path, depth, items, root_rel, log_cb)
+            yield from files
+            if items is not None:
+                self._checkpoint(root_key, path, subdirs)
+            self._check_control()
+            stack.extend((child, depth + 1) for child in reversed(subdirs))
+
+    def _checkpoint(self, root_key: Optional[str], path: str, subdirs: List[str]):
+        """Report a fully yielded directory to checkpoint_cb (resumable scans)."""
+        if self._checkpoint_cb is None:
+            return
+        self._checkpoint_cb(
+            root_key, path, self._compute_rel_path(path),
+            [(child, self._compute_rel_path(child)) for child in subdirs], False
+        )
+
+    def _check_control(self):
+        """Cancel / pause point between directories and output chunks (raises JobCancelled)."""
+        if self._control is not None:
+            self._control.checkpoint()
+
+    def _open_worker_sftp(self) -> paramiko.SFTPClient:
+        """Open an extra SFTP channel on the shared transport, reconnecting if it died."""
+        with self._conn_lock:
+            transport = self.client.get_transport() if self.client else None
+            if transport is None or not transport.is_active():
+                self._disconnect()
+                self._connect()
+                transport = self.client.get_transport()
+            sftp = paramiko.SFTPClient.from_transport(transport)
+        sftp.get_channel().settimeout(60)
+        return sftp
+
+    def _sftp_worker(self, tasks: "queue.Queue", results: "queue.Queue",
+                     stop: threading.Event):
+        """Worker thread: list directories from `tasks` on its own SFTP channel."""
+        sftp = None
+        try:
+            while not stop.is_set():
+                task = tasks.get()
+                if task is None:
+                    break
+                path, depth = task
+                items = None
+                for attempt in range(1, MAX_RETRIES + 1):
+                    if stop.is_set():
+                        break
+                    try:
+                        if sftp is None:
+                            sftp = self._open_worker_sftp()
+                        items = sftp.listdir_attr(path)
+                        break
+                    except Exception as e:
+                        logger.warning(f"listdir_attr({path}) attempt {attempt}/{MAX_RETRIES} failed: {e}")
+                        if sftp is not None:
+                            try:
+                                sftp.close()
+                            except Exception:
+                                pass
+                            sftp = None
+                        if attempt < MAX_RETRIES:
+                            time.sleep(RETRY_DELAY * attempt)
+                results.put((path, depth, items))
+        finally:
+            if sftp is not None:
+                try:
+                    sftp.close()
+                except Exception:
+                    pass
+
+    def _walk_sftp_parallel(self, starts: List[str], root_rel: str,
+                            log_cb: Optional[Callable[[str], None]] = None,
+                            root_key: Optional[str] = None) -> Iterator[FileEntry]:
+        """Concurrent SFTP walk: several readdir requests in flight.
+
+        Each worker thread owns one SFTP channel on the shared paramiko
+        Transport and takes directories from a work queue. Listings are
+        processed (stats, logging, FileEntry creation) in the consuming thread.
+        Result order is not deterministic.
+        """
+        tasks: "queue.Queue" = queue.Queue()
+        # Bounded so that a slow consumer does not buffer the whole tree
+        results: "queue.Queue" = queue.Queue(maxsize=self.sftp_workers * 4)
+        stop = threading.Event()
+
+        workers = [
+            threading.Thread(
+                target=self._sftp_worker, args=(tasks, results, stop),
+                name=f"sftp-scan-{i}", daemon=True
+            )
+            for i in range(self.sftp_workers)
+        ]
+        for t in workers:
+            t.start()
+
+        for path in starts:
+            tasks.put((path, 0))
+        outstanding = len(starts)
+        try:
+            while outstanding:
+                path, depth, items = results.get()
+                outstanding -= 1
+                files, subdirs = self._process_listing(path, depth, items, root_rel, log_cb)
+                for child in subdirs:
+                    tasks.put((child, depth + 1))
+                outstanding += len(subdirs)
+                yield from files
+                if items is not None:
+                    self._checkpoint(root_key, path, subdirs)
+                self._check_control()
+        finally:
+            stop.set()
+            for _ in workers:
+                tasks.put(None)
+            # Unblock workers waiting on a full results queue
+            try:
+                while True:
+                    results.get_nowait()
+            except queue.Empty:
+                pass
+
+    # ------------------------------------------------------------------
+    # Remote find walker (single exec channel)
+    # ------------------------------------------------------------------
+
+    def _find_supported(self, remote_path: str,
+                        log_cb: Optional[Callable[[str], None]] = None) -> bool:
+        """Probe whether the remote shell has a `find` with GNU -printf.
+
+        BusyBox find (and SFTP-only accounts without an exec channel) fail the
+        probe, in which case the caller falls back to the SFTP walker.
+        """
+        cmd = f"LC_ALL=C find {shlex.quote(remote_path)} -maxdepth 0 -printf '%y'"
+        try:
+            self._ensure_connection()
+            chan = self.client.get_transport().open_session()
+            try:
+                chan.settimeout(30)
+                chan.exec_command(cmd)
+                out = b""
+                while True:
+                    chunk = chan.recv(1024)
+                    if not chunk:
+                        break
+                    out += chunk
+                exit_status = chan.recv_exit_status()
+            finally:
+                chan.close()
+        except Exception as e:
+            logger.info(f"Remote find probe failed on {self.host}: {e}")
+            if log_cb:
+                log_cb(f"Remote find not available ({e}), using SFTP")
+            return False
+
+        if exit_status != 0 or out.strip() != b"d":
+            logger.info(f"Remote find probe on {self.host}: exit={exit_status}, output={out[:200]!r}")
+            if log_cb:
+                log_cb(f"Remote find -printf not supported (exit={exit_status}), using SFTP")
+            return False
+        return True
+
+    def _decode_find_path(self, raw: bytes) -> str:
+        """Decode one %P path from find output and fix every path component."""
+        try:
+            rel = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            rel = raw.decode("utf-8", errors="replace")
+            self.stats["errors"].append((rel, "Filename is not valid UTF-8"))
+        if rel.isascii():
+            return rel
+        return "/".join(self._fix_filename(part) for part in rel.split("/"))
+
+    def _walk_find(self, remote_path: str, root_rel: str,
+                   log_cb: Optional[Callable[[str], None]] = None) -> Iterator[FileEntry]:
+        """Stream `find -printf` output of one root and parse it into FileEntry objects.
+
+        Records are parsed as chunks arrive, so memory stays flat regardless of
+        tree size. Like the SFTP walker, every non-directory entry is reported
+        (symlinks are not followed, their own size is used).
+        """
+        cmd = (
+            f"LC_ALL=C find {shlex.quote(remote_path)} -mindepth 1 "
+            f"{self._find_prune_expr(remote_path)}"
+            f"-printf '{FIND_PRINTF}'"
+        )
+        prefix = remote_path.rstrip("/")
+        root_rel_path = root_rel.strip("/") if root_rel else ""
+
+        self._ensure_connection()
+        chan = self.client.get_transport().open_session()
+        chan.settimeout(FIND_POLL_TIMEOUT)
+        chan.exec_command(cmd)
+
+        buf = b""
+        err_buf = b""
+        idle = 0.0
+        try:
+            while True:
+                while chan.recv_stderr_ready():
+                    err_buf += chan.recv_stderr(FIND_RECV_SIZE)
+                # While paused the remote side blocks on the full channel window
+                self._check_control()
+                try:
+                    chunk = chan.recv(FIND_RECV_SIZE)
+                except socket.timeout:
+                    idle += FIND_POLL_TIMEOUT
+                    if idle >= FIND_IDLE_TIMEOUT:
+                        raise Exception(f"Remote find produced no output for {FIND_IDLE_TIMEOUT}s")
+                    continue
+                if not chunk:
+                    break
+                idle = 0.0
+                buf += chunk
+                records = buf.split(b"\0")
+                buf = records.pop()
+                entries = []
+                to_hash = []
+                for record in records:
+                    entry = self._parse_find_record(record, prefix, root_rel_path, log_cb)
+                    if entry is not None:
+                        entries.append(entry)
+                        if self._fingerprinter is not None and record.startswith(b"f\t"):
+                            raw_path = prefix.encode("utf-8") + b"/" + record.split(b"\t", FIND_PATH_FIELD)[FIND_PATH_FIELD]
+                            to_hash.append((entry, self._remote_opener(raw_path)))
+                if to_hash:
+                    self._fingerprinter.fill(to_hash)
+                yield from entries
+
+            while chan.recv_stderr_ready():
+                err_buf += chan.recv_stderr(FIND_RECV_SIZE)
+            chan.settimeout(30)
+            exit_status = chan.recv_exit_status()
+        finally:
+            chan.close()
+
+        if buf:
+            # Stream ended mid-record - connection dropped
+            raise Exception(f"Remote find output truncated in {remote_path}")
+
+        # find reports unreadable directories on stderr and exits with 1
+        for line in err_buf.decode("utf-8", errors="replace").splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            self.stats["dirs_skipped"] += 1
+            self.stats["errors"].append((remote_path, line))
+            if log_cb:
+                log_cb(f"WARNING: {line}")
+        if exit_status not in (0, 1):
+            raise Exception(f"Remote find failed in {remote_path} (exit={exit_status})")
+
+    def _find_prune_expr(self, remote_path: str) -> str:
+        """`-path ... -prune -o` expression for literal exclude patterns.
+
+        A literal pattern anywhere below the root excludes the whole subtree
+        (substring rule of the matcher), so find does not descend into e.g.
+        @eaDir or .git. Glob patterns are only applied client-side.
+        """
+        if self._exclude is None:
+            return ""
+        literals = self._exclude.literal_patterns()
+        if not literals:
+            return ""
+        # find -path uses glob syntax - escape the root itself
+        root_glob = "".join("\\" + c if c in "*?[]\\" else c for c in remote_path.rstrip("/"))
+        tests = " -o ".join(
+            f"-path {shlex.quote(f'{root_glob}/*{literal}*')}" for literal in literals
+        )
+        return f"-type d \\( {tests} \\) -prune -o "
+
+    def _parse_find_record(self, record: bytes, prefix: str, root_rel_path: str,
+                           log_cb: Optional[Callable[[str], None]] = None) -> Optional[FileEntry]:
+        """Parse one find record (see FIND_PRINTF), directories only update stats."""
+        try:
+            ftype, size, mtime, inode, dev, nlink, raw_path = record.split(b"\t", FIND_PATH_FIELD)
+            if ftype == b"d":
+                self.stats["dirs_visited"] += 1
+                return None
+            rel = self._decode_find_path(raw_path)
+            self.stats["files_found"] += 1
+            entry = FileEntry(
+                full_rel_path=self._compute_rel_path(f"{prefix}/{rel}"),
+                size=int(size),
+                mtime_epoch=float(mtime),
+                root_rel_path=root_rel_path
+            )
+            if int(nlink) > 1:
+                # Hardlink identity; plain SFTP attributes carry no inode
+                entry.inode = int(inode)
+                entry.dev = int(dev)
+                entry.nlink = int(nlink)
+            return entry
+        except Exception as e:
+            err_msg = f"Unparseable find record {record[:200]!r}: {e}"
+            logger.warning(err_msg)
+            self.stats["errors"].append((prefix, err_msg))
+            if log_cb:
+                log_cb(f"WARNING: {err_msg}")
+            return None
+
+    # ------------------------------------------------------------------
+    # Remote agent walker (changes against the previous scan only)
+    # ------------------------------------------------------------------
+
+    def _agent_supported(self, log_cb: Optional[Callable[[str], None]] = None) -> bool:
+        """Probe for a Python 3 interpreter on the remote host (exec channel required)."""
+        cmd = f"{AGENT_PYTHON} -c 'import sys, zlib; sys.stdout.write(str(sys.version_info[0]))'"
+        try:
+            self._ensure_connection()
+            chan = self.client.get_transport().open_session()
+            try:
+                chan.settimeout(30)
+                chan.exec_command(cmd)
+                out = b""
+                while True:
+                    chunk = chan.recv(1024)
+                    if not chunk:
+                        break
+                    out += chunk
+                exit_status = chan.recv_exit_status()
+            finally:
+                chan.close()
+        except Exception as e:
+            logger.info(f"Remote agent probe failed on {self.host}: {e}")
+            if log_cb:
+                log_cb(f"Remote scan agent not available ({e})")
+            return False
+
+        if exit_status != 0 or out.strip() != b"3":
+            logger.info(f"Remote agent probe on {self.host}: exit={exit_status}, output={out[:200]!r}")
+            if log_cb:
+                log_cb(f"Remote scan agent needs {AGENT_PYTHON} on the host (exit={exit_status})")
+            return False
+        return True
+
+    def _upload_agent(self, manifest: ScanManifest, root_rel_path: str,
+                      prefix_rel: str) -> Tuple[str, int, int]:
+        """Upload the agent script and the root's manifest into a fresh remote directory.
+
+        Returns (remote directory, manifest files, manifest bytes).
+        """
+        remote_dir = f"{AGENT_REMOTE_DIR}/sync-orchestrator-agent-{uuid.uuid4().hex}"
+        with tempfile.TemporaryFile() as manifest_file:
+            manifest_files = manifest.write(manifest_file, root_rel_path, prefix_rel)
+            manifest_bytes = manifest_file.tell()
+            manifest_file.seek(0)
+            self._ensure_connection()
+            self.sftp.mkdir(remote_dir, 0o700)
+            try:
+                self.sftp.put(AGENT_SCRIPT, f"{remote_dir}/scan_agent.py")
+                self.sftp.putfo(manifest_file, f"{remote_dir}/manifest.z", file_size=manifest_bytes)
+            except Exception:
+                self._remove_agent(remote_dir)
+                raise
+        return remote_dir, manifest_files, manifest_bytes
+
+    def _remove_agent(self, remote_dir: str):
+        try:
+            self._ensure_connection()
+            for name in self.sftp.listdir(remote_dir):
+                self.sftp.remove(f"{remote_dir}/{name}")
+            self.sftp.rmdir(remote_dir)
+        except Exception as e:
+            logger.warning(f"Failed to remove remote agent directory {remote_dir}: {e}")
+
+    def _walk_agent(self, remote_path: str, root_rel: str, manifest: ScanManifest,
+                    log_cb: Optional[Callable[[str], None]] = None) -> Iterator[FileEntry]:
+        """Run the remote agent for one root and yield only added / modified files.
+
+        Removed files are reported to the manifest; once the agent's summary
+        record arrives the root is confirmed (manifest.mark_root) and its
+        unchanged files are later copied from the previous scan. Frames are
+        decoded as they arrive, like the find walker.
+        """
+        prefix = remote_path.rstrip("/")
+        prefix_rel = self._compute_rel_path(remote_path)
+        root_rel_path = root_rel.strip("/") if root_rel else ""
+
+        remote_dir, manifest_files, manifest_bytes = self._upload_agent(manifest, root_rel_path, prefix_rel)
+        if log_cb:
+            log_cb(f"Remote agent: manifest of {manifest_files} files ({manifest_bytes / 1024:.0f} KB) uploaded")
+
+        literals = self._exclude.literal_patterns() if self._exclude is not None else []
+        cmd = " ".join(shlex.quote(arg) for arg in (
+            AGENT_PYTHON, f"{remote_dir}/scan_agent.py", remote_path, f"{remote_dir}/manifest.z", *literals
+        ))
+        counts = {"a": 0, "m": 0, "r": 0}
+        summary = None
+        received = 0
+        buf = b""
+        err_buf = b""
+        idle = 0.0
+        try:
+            self._ensure_connection()
+            chan = self.client.get_transport().open_session()
+            chan.settimeout(FIND_POLL_TIMEOUT)
+            chan.exec_command(cmd)
+            try:
+                header_checked = False
+                while True:
+                    while chan.recv_stderr_ready():
+                        err_buf += chan.recv_stderr(FIND_RECV_SIZE)
+                    self._check_control()
+                    try:
+                        chunk = chan.recv(FIND_RECV_SIZE)
+                    except socket.timeout:
+                        idle += FIND_POLL_TIMEOUT
+                        if idle >= FIND_IDLE_TIMEOUT:
+                            raise Exception(f"Remote agent produced no output for {FIND_IDLE_TIMEOUT}s")
+                        continue
+                    if not chunk:
+                        break
+                    idle = 0.0
+                    received += len(chunk)
+                    buf += chunk
+                    if not header_checked:
+                        if len(buf) < len(AGENT_MAGIC):
+                            continue
+                        if not buf.startswith(AGENT_MAGIC):
+                            raise Exception(f"Unexpected remote agent output: {buf[:200]!r}")
+                        buf = buf[len(AGENT_MAGIC):]
+                        header_checked = True
+                    entries = []
+                    to_hash = []
+                    while len(buf) >= 4:
+                        (length,) = struct.unpack(">I", buf[:4])
+                        if len(buf) < 4 + length:
+                            break
+                        records = zlib.decompress(buf[4:4 + length]).split(b"\0")
+                        buf = buf[4 + length:]
+                        for record in records[:-1]:
+                            fields = record.split(b"\t", AGENT_RECORD_FIELDS)
+                            op = fields[0].decode("ascii")
+                            if op in ("a", "m"):
+                                entry = self._parse_agent_record(fields, prefix, root_rel_path)
+                                counts[op] += 1
+                                entries.append(entry)
+                                if self._fingerprinter is not None and fields[1] == b"f":
+                                    raw_path = prefix.encode("utf-8") + b"/" + fields[AGENT_RECORD_FIELDS]
+                                    to_hash.append((entry, self._remote_opener(raw_path)))
+                            elif op == "r":
+                                # The path comes from the manifest - stored form, no encoding fix
+                                rel = fields[AGENT_RECORD_FIELDS].decode("utf-8", errors="surrogateescape")
+                                manifest.mark_removed(f"{prefix_rel}/{rel}" if prefix_rel else rel)
+                                counts["r"] += 1
+                            elif op == "s":
+                                summary = (int(fields[2]), int(float(fields[3])), int(fields[4]))
+                    if to_hash:
+                        self._fingerprinter.fill(to_hash)
+                    yield from entries
+
+                while chan.recv_stderr_ready():
+                    err_buf += chan.recv_stderr(FIND_RECV_SIZE)
+                chan.settimeout(30)
+                exit_status = chan.recv_exit_status()
+            finally:
+                chan.close()
+        finally:
+            self._remove_agent(remote_dir)
+
+        for line in err_buf.decode("utf-8", errors="replace").splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            self.stats["errors"].append((remote_path, line))
+            if log_cb:
+                log_cb(f"WARNING: {line}")
+        if exit_status != 0:
+            raise Exception(f"Remote agent failed in {remote_path} (exit={exit_status})")
+        if summary is None or buf:
+            raise Exception(f"Remote agent output truncated in {remote_path}")
+
+        files, dirs, unchanged = summary
+        self.stats["files_found"] += files
+        self.stats["dirs_visited"] += dirs
+        manifest.mark_root(root_rel_path, prefix_rel)
+        if log_cb:
+            log_cb(
+                f"Remote agent: {files} files in {dirs} directories, {counts['a']} added, "
+                f"{counts['m']} modified, {counts['r']} removed, {unchanged} unchanged "
+                f"({received / 1024:.0f} KB received)"
+            )
+
+    def _parse_agent_record(self, fields: List[bytes], prefix: str, root_rel_path: str) -> FileEntry:
+        """FileEntry from an added / modified agent record (see scan_agent.py)."""
+        _, _, size, mtime, inode, dev, nlink, raw_path = fields
+        rel = self._decode_find_path(raw_path)
+        entry = FileEntry(
+            full_rel_path=self._compute_rel_path(f"{prefix}/{rel}"),
+            size=int(size),
+            mtime_epoch=float(mtime),
+            root_rel_path=root_rel_path
+        )
+        if int(nlink) > 1:
+            entry.inode = int(inode)
+            entry.dev = int(dev)
+            entry.nlink = int(nlink)
+        return entry
 
     # ------------------------------------------------------------------
     # Public API
@@ -229,10 +801,42 @@ class SshScanAdapter(ScanAdapter):
         roots: List[str],
         progress_cb: Optional[Callable[[int, str], None]] = None,
         log_cb: Optional[Callable[[str], None]] = None,
+        dir_cb: Optional[Callable[[DirState, bool], None]] = None,
+        dir_index: Optional[DirIndex] = None,
+        exclude: Optional[ExcludeMatcher] = None,
+        checkpoint_cb: Optional[CheckpointCallback] = None,
+        resume: Optional[Dict[str, List[Tuple[str, str]]]] = None,
+        fingerprinter: Optional[Fingerprinter] = None,
+        manifest: Optional[ScanManifest] = None,
+        control: Optional[JobControl] = None,
     ) -> Iterator[FileEntry]:
-        """List files via SFTP with full error handling and retry logic."""
+        """List files over SSH with full error handling and retry logic.
+
+        With scan_mode "auto" each root is listed by a single remote
+        `find -printf` (one exec channel instead of one SFTP round trip per
+        directory); when the remote find lacks -printf the SFTP walker is used.
+
+        With scan_mode "agent" and a manifest of the previous scan, the remote
+        agent yields only added / modified files and reports the rest to the
+        manifest; without python3 on the host (or a previous scan) it behaves
+        like "auto".
+
+        Incremental scans (dir_cb / dir_index) are not supported over SFTP; every
+        directory is listed. Fingerprints are read over the main SFTP channel,
+        regular files only.
+
+        With a control token the walk stops (JobCancelled) or waits at the next
+        directory / output chunk; closing the exec channel ends a remote find.
+        """
+        self._exclude = exclude if exclude else None
+        self._control = control
+        self._checkpoint_cb = checkpoint_cb
+        self._fingerprinter = fingerprinter
         self._connect()
         count = 0
+        agent_ok: Optional[bool] = None
+        if self.scan_mode == "agent" and manifest is None and log_cb:
+            log_cb("Remote agent: no previous completed scan, listing everything")
 
         try:
             for root_rel in roots:
@@ -264,14 +868,52 @@ class SshScanAdapter(ScanAdapter):
                 if log_cb:
                     log_cb(f"Resolved remote path: {remote_path}")
 
+                starts = [remote_path]
+                if resume is not None and root_rel in resume:
+                    starts = [path for path, _ in resume[root_rel]]
+                    if not starts:
+                        if log_cb:
+                            log_cb(f"Resume: {remote_path} already completed, skipping")
+                        continue
+                    if log_cb:
+                        log_cb(f"Resume: {remote_path} from {len(starts)} pending directories")
+
+                # The agent needs the previous scan and a fresh root; probed once per scan
+                use_agent = (
+                    self.scan_mode == "agent" and manifest is not None and starts == [remote_path]
+                    and agent_ok is not False
+                )
+                if use_agent and agent_ok is None:
+                    agent_ok = use_agent = self._agent_supported(log_cb)
+                # find has no per-directory checkpoints, a resumed root continues over SFTP
+                use_find = not use_agent and starts == [remote_path] and (self.scan_mode == "find" or (
+                    self.scan_mode in ("auto", "agent") and self._find_supported(remote_path, log_cb)
+                ))
+                if log_cb:
+                    log_cb(f"Scan backend: {'remote agent' if use_agent else 'remote find' if use_find else 'sftp'}")
+                if use_agent:
+                    # Agent roots are not checkpointed - until the end of the scan they hold
+                    # only the changes, a resumed scan lists them again
+                    walker = self._walk_agent(remote_path, root_rel_clean, manifest, log_cb)
+                elif use_find:
+                    # The root itself is listed too, as in the SFTP walker
+                    self.stats["dirs_visited"] += 1
+                    walker = self._walk_find(remote_path, root_rel_clean, log_cb)
+                else:
+                    walker = self._walk_sftp(starts, root_rel_clean, log_cb, root_key=root_rel)
+
                 entry_count = 0
-                for entry in self._walk_sftp(remote_path, root_rel_clean, log_cb):
+                for entry in walker:
                     entry_count += 1
                     count += 1
                     if progress_cb:
                         progress_cb(count, entry.full_rel_path)
                     yield entry
 
+                if use_find and self._checkpoint_cb is not None:
+                    # Whole subtree is in the output only once find has finished
+                    self._checkpoint_cb(root_rel, remote_path, self._compute_rel_path(remote_path), [], True)
+
                 if log_cb:
                     log_cb(f"Completed {remote_path}: {entry_count} files")
 
@@ -281,6 +923,7 @@ class SshScanAdapter(ScanAdapter):
                 f"dirs_skipped={self.stats['dirs_skipped']}, "
                 f"files_found={self.stats['files_found']}, "
                 f"encoding_fixes={self.stats['encoding_fixes']}, "
+                f"dirs_pruned={self.stats['dirs_pruned']}, "
                 f"errors={len(self.stats['errors'])}"
             )
             logger.info(summary)
@@ -292,7 +935,7 @@ class SshScanAdapter(ScanAdapter):
                         log_cb(f"  {path}: {err}")
 
         finally:
-            self._disconnect()
+            self._disconnect(broken=False)
 
     # ------------------------------------------------------------------
     # Path resolution
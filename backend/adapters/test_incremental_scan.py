@@ -0,0 +1,90 @@
+"""
+Regresní testy inkrementálního scanu (LocalScanAdapter + DirIndex) - adresář, který
+se v předchozím scanu nepodařilo vylistovat nebo byl vyloučený, se nesmí ztratit.
+
+Spuštění (z kořene repozitáře):
+    python -m pytest backend/adapters/test_incremental_scan.py
+"""
+import os
+import time
+
+from backend.adapters import local_scan
+from backend.adapters.base import DirIndex
+from backend.adapters.local_scan import LocalScanAdapter
+from backend.config import DEFAULT_EXCLUDE_PATTERNS, compile_exclude_patterns
+
+
+def _make_tree(base, paths):
+    for rel in paths:
+        path = os.path.join(base, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write("x")
+
+
+def _scan(base, roots, previous=None, exclude=None):
+    """
+    Vylistuje roots jako job scanu - soubory převzatých adresářů doplní z předchozího
+    scanu. Vrací (soubory, index pro další scan); previous je výsledek předchozího _scan.
+    """
+    states = []
+    files = set()
+    dir_index = previous[1] if previous is not None else None
+
+    def dir_cb(state, reused):
+        states.append(state)
+        if reused:
+            files.update(p for p in previous[0] if p.rpartition("/")[0] == state.rel_path)
+
+    files.update(
+        entry.full_rel_path
+        for entry in LocalScanAdapter(base).list_files(roots, dir_cb=dir_cb, dir_index=dir_index, exclude=exclude)
+    )
+    # Začátek scanu v budoucnosti - všechny adresáře jsou starší než scan
+    index = DirIndex(states, time.time() + 10, list(exclude.patterns) if exclude is not None else [])
+    return files, index
+
+
+def test_failed_listing_is_retried(tmp_path, monkeypatch):
+    base = str(tmp_path)
+    _make_tree(base, ["INC2/keep/a.txt", "INC2/keep/flaky/f.txt"])
+    flaky = os.path.join(base, "INC2", "keep", "flaky")
+    real_scandir = os.scandir
+
+    def failing_scandir(path):
+        if path == flaky:
+            raise PermissionError(13, "Permission denied (simulated)", path)
+        return real_scandir(path)
+
+    monkeypatch.setattr(local_scan.os, "scandir", failing_scandir)
+    files, index = _scan(base, ["INC2"])
+    monkeypatch.setattr(local_scan.os, "scandir", real_scandir)
+    assert "INC2/keep/flaky/f.txt" not in files
+    assert not index.dirs["INC2/keep/flaky"].complete
+
+    # Rodič je nezměněný, neúplný podadresář se musí vylistovat znovu
+    second = _scan(base, ["INC2"], previous=(files, index))
+    assert "INC2/keep/flaky/f.txt" in second[0]
+    assert second[1].dirs["INC2/keep/flaky"].complete
+
+    files, _ = _scan(base, ["INC2"], previous=second)
+    assert files == second[0]
+
+
+def test_changed_exclude_disables_reuse(tmp_path):
+    base = str(tmp_path)
+    _make_tree(base, ["INC/keep/a.txt", "INC/keep/skipme/f.txt"])
+    with_skip = compile_exclude_patterns(tuple(DEFAULT_EXCLUDE_PATTERNS + ["skipme"]))
+    without_skip = compile_exclude_patterns(tuple(DEFAULT_EXCLUDE_PATTERNS))
+
+    files, index = _scan(base, ["INC"], exclude=with_skip)
+    assert "INC/keep/skipme/f.txt" not in files
+    assert index.same_exclude(with_skip)
+
+    # Po odebrání výjimky se index nesmí použít - plný scan soubor najde
+    assert not index.same_exclude(without_skip)
+    files, _ = _scan(base, ["INC"], exclude=without_skip)
+    assert "INC/keep/skipme/f.txt" in files
+
+    # Index bez uložených výjimek (scan před migrací) se také nepoužije
+    assert not DirIndex(index.dirs.values(), index.scanned_at).same_exclude(without_skip)
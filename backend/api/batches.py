@@ -39,6 +39,7 @@ class BatchItemResponse(BaseModel):
     size: int
     category: str
     enabled: Optional[bool] = True
+    hardlink_of: Optional[str] = None
     
     model_config = {"from_attributes": True}
 
@@ -128,6 +129,37 @@ async def get_batch(batch_id: int):
     finally:
         session.close()
 
+@router.post("/{batch_id}/cancel", response_model=BatchResponse)
+async def cancel_batch(batch_id: int, _: None = Depends(check_safe_mode)):
+    """Zrušit běžící plánování batche (plán se nezapíše)"""
+    return await _control_batch(batch_id, "cancel")
+
+@router.post("/{batch_id}/pause", response_model=BatchResponse)
+async def pause_batch(batch_id: int, _: None = Depends(check_safe_mode)):
+    """Pozastavit běžící plánování batche"""
+    return await _control_batch(batch_id, "pause")
+
+@router.post("/{batch_id}/resume", response_model=BatchResponse)
+async def resume_batch(batch_id: int, _: None = Depends(check_safe_mode)):
+    """Pokračovat v pozastaveném plánování batche"""
+    return await _control_batch(batch_id, "resume")
+
+async def _control_batch(batch_id: int, action: str):
+    from backend.job_runner import job_runner
+    if not await job_runner.control_job("batch", batch_id, action):
+        raise HTTPException(status_code=400, detail="Batch is not running")
+    
+    session = storage_service.get_session()
+    if not session:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    try:
+        batch = session.query(Batch).filter(Batch.id == batch_id).first()
+        if not batch:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        return BatchResponse.model_validate(batch)
+    finally:
+        session.close()
+
 @router.get("/{batch_id}/items", response_model=List[BatchItemResponse])
 async def get_batch_items(batch_id: int, skip: int = 0, limit: int = 100):
     """Položky batchu"""
@@ -161,7 +193,9 @@ async def get_batch_summary(batch_id: int):
             BatchItem.enabled == True
         ).all()
         
-        total_size = sum(item.size for item in items)
+        # Hardlink na povolenou položku nezabírá na USB další místo
+        enabled_paths = {item.full_rel_path for item in items}
+        total_size = sum(item.size for item in items if item.hardlink_of not in enabled_paths)
         
         # Získat skutečnou dostupnou kapacitu USB
         import shutil
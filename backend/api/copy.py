@@ -202,9 +202,40 @@ async def get_job_files(job_id: int):
     finally:
         session.close()
 
+@router.post("/jobs/{job_id}/cancel", response_model=JobRunResponse)
+async def cancel_job(job_id: int, _: None = Depends(check_safe_mode)):
+    """Zrušit běžící copy job (ukončí rsync, stav zkopírovaných souborů se uloží)"""
+    return await _control_job(job_id, "cancel")
+
+@router.post("/jobs/{job_id}/pause", response_model=JobRunResponse)
+async def pause_job(job_id: int, _: None = Depends(check_safe_mode)):
+    """Pozastavit běžící copy job (rsync se zastaví)"""
+    return await _control_job(job_id, "pause")
+
+@router.post("/jobs/{job_id}/resume", response_model=JobRunResponse)
+async def resume_job(job_id: int, _: None = Depends(check_safe_mode)):
+    """Pokračovat v pozastaveném copy jobu"""
+    return await _control_job(job_id, "resume")
+
+async def _control_job(job_id: int, action: str):
+    from backend.job_runner import job_runner
+    if not await job_runner.control_job("copy", job_id, action):
+        raise HTTPException(status_code=400, detail="Job is not running")
+    
+    session = storage_service.get_session()
+    if not session:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    try:
+        job = session.query(JobRun).filter(JobRun.id == job_id).first()
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return JobRunResponse.model_validate(job)
+    finally:
+        session.close()
+
 @router.post("/jobs/{job_id}/retry")
 async def retry_job(job_id: int, _: None = Depends(check_safe_mode)):
-    """Retry a failed copy job with the same parameters"""
+    """Retry a failed or cancelled copy job with the same parameters"""
     session = storage_service.get_session()
     if not session:
         raise HTTPException(status_code=503, detail="Database unavailable")
@@ -213,8 +244,8 @@ async def retry_job(job_id: int, _: None = Depends(check_safe_mode)):
         old_job = session.query(JobRun).filter(JobRun.id == job_id).first()
         if not old_job:
             raise HTTPException(status_code=404, detail="Job not found")
-        if old_job.status != "failed":
-            raise HTTPException(status_code=400, detail="Only failed jobs can be retried")
+        if old_job.status not in ("failed", "cancelled"):
+            raise HTTPException(status_code=400, detail="Only failed or cancelled jobs can be retried")
         
         metadata = old_job.job_metadata or {}
         batch_id = metadata.get("batch_id")
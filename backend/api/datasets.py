@@ -7,7 +7,7 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime
 
 from backend.storage_service import storage_service
-from backend.database import Dataset
+from backend.database import Dataset, FileHashCache
 from backend.mount_service import mount_service
 
 router = APIRouter()
@@ -188,6 +188,7 @@ async def delete_dataset(dataset_id: int, _: None = Depends(check_safe_mode)):
         if not dataset:
             raise HTTPException(status_code=404, detail="Dataset not found")
         
+        session.query(FileHashCache).filter(FileHashCache.dataset_id == dataset_id).delete()
         session.delete(dataset)
         session.commit()
         
@@ -266,50 +267,29 @@ async def test_dataset_connection(dataset_id: int):
                     "error": "SSH host or username not configured"
                 }
             
+            if not key_file and not password:
+                return {
+                    "connected": False,
+                    "error": "SSH password not configured"
+                }
+            
+            import paramiko
+            from backend.ssh_pool import ssh_pool
             try:
-                import paramiko
-                client = paramiko.SSHClient()
-                client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                
-                if key_file:
-                    client.connect(
-                        hostname=host,
-                        port=port,
-                        username=username,
-                        key_filename=key_file,
-                        timeout=5
-                    )
-                else:
-                    if not password:
+                # Spojení ze sdíleného poolu - opakovaný test nedělá nový handshake
+                with ssh_pool.connection(host, port, username, password=password, key_file=key_file, timeout=5) as conn:
+                    # Test SFTP připojení a přístupnosti base_path
+                    try:
+                        conn.sftp().listdir(base_path)
+                        return {
+                            "connected": True,
+                            "message": f"SSH connection successful to {username}@{host}:{port}, base path: {base_path}"
+                        }
+                    except IOError as e:
                         return {
                             "connected": False,
-                            "error": "SSH password not configured"
+                            "error": f"Cannot access base path {base_path}: {str(e)}"
                         }
-                    client.connect(
-                        hostname=host,
-                        port=port,
-                        username=username,
-                        password=password,
-                        timeout=5
-                    )
-                
-                # Test SFTP připojení a přístupnosti base_path
-                sftp = client.open_sftp()
-                try:
-                    sftp.listdir(base_path)
-                    sftp.close()
-                    client.close()
-                    return {
-                        "connected": True,
-                        "message": f"SSH connection successful to {username}@{host}:{port}, base path: {base_path}"
-                    }
-                except Exception as e:
-                    sftp.close()
-                    client.close()
-                    return {
-                        "connected": False,
-                        "error": f"Cannot access base path {base_path}: {str(e)}"
-                    }
             except paramiko.AuthenticationException:
                 return {
                     "connected": False,
@@ -539,32 +519,17 @@ async def browse_dataset_path(dataset_id: int, path: str = "/"):
         if not host or not username:
             raise HTTPException(status_code=400, detail="SSH host or username not configured")
         
+        if not key_file and not password:
+            raise HTTPException(status_code=400, detail="SSH password not configured")
+        
+        import paramiko
+        import stat as stat_module
+        from backend.ssh_pool import ssh_pool
         try:
-            import paramiko
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            if key_file:
-                client.connect(
-                    hostname=host,
-                    port=port,
-                    username=username,
-                    key_filename=key_file,
-                    timeout=5
-                )
-            else:
-                if not password:
-                    raise HTTPException(status_code=400, detail="SSH password not configured")
-                client.connect(
-                    hostname=host,
-                    port=port,
-                    username=username,
-                    password=password,
-                    timeout=5
-                )
-            
-            sftp = client.open_sftp()
-            try:
+            # Spojení ze sdíleného poolu - procházení složek v BrowseModal nedělá handshake pro každou složku
+            with ssh_pool.connection(host, port, username, password=password, key_file=key_file, timeout=5) as conn:
+                sftp = conn.sftp()
+                
                 # Normalizace cesty
                 if not path.startswith("/"):
                     path = "/" + path
@@ -572,20 +537,22 @@ async def browse_dataset_path(dataset_id: int, path: str = "/"):
                 # Zkusit stat - zjistit, zda je to adresář nebo soubor
                 try:
                     stat_info = sftp.stat(path)
-                    is_dir = (stat_info.st_mode & 0o170000) == 0o040000
+                    is_dir = stat_module.S_ISDIR(stat_info.st_mode)
                 except FileNotFoundError:
                     raise HTTPException(status_code=404, detail=f"Path does not exist: {path}")
                 
                 if not is_dir:
                     raise HTTPException(status_code=400, detail=f"Path is not a directory: {path}")
                 
-                # Listovat obsah adresáře
+                # Listovat obsah adresáře - listdir_attr vrací atributy v jednom požadavku,
+                # zvlášť se stat-uje jen symlink (kvůli typu cíle)
                 items = []
-                for item_name in sftp.listdir(path):
+                for attr in sftp.listdir_attr(path):
+                    item_name = attr.filename
                     item_path = f"{path.rstrip('/')}/{item_name}" if path != "/" else f"/{item_name}"
                     try:
-                        item_stat = sftp.stat(item_path)
-                        is_item_dir = (item_stat.st_mode & 0o170000) == 0o040000
+                        item_stat = sftp.stat(item_path) if stat_module.S_ISLNK(attr.st_mode or 0) else attr
+                        is_item_dir = stat_module.S_ISDIR(item_stat.st_mode)
                         items.append({
                             "name": item_name,
                             "path": item_path,
@@ -611,9 +578,6 @@ async def browse_dataset_path(dataset_id: int, path: str = "/"):
                     "items": items,
                     "base_path": base_path
                 }
-            finally:
-                sftp.close()
-                client.close()
                 
         except paramiko.AuthenticationException:
             raise HTTPException(status_code=401, detail="SSH authentication failed")
@@ -4,6 +4,7 @@ between datasets, scans, diffs and batches.
 """
 from fastapi import APIRouter
 from backend.storage_service import storage_service
+from backend.ssh_pool import ssh_pool
 from backend.database import Dataset, Scan, FileEntry, Diff, DiffItem, Batch, BatchItem
 from backend.utils import normalize_path, normalize_root_rel_path, is_ignored_path
 from sqlalchemy import func
@@ -23,6 +24,7 @@ async def get_diagnostics():
             "scans": [],
             "diffs": [],
             "batches": [],
+            "ssh_pool": ssh_pool.stats(),
         }
 
         # --- Datasets ---
@@ -66,7 +68,8 @@ async def get_diagnostics():
                 file_root = normalize_root_rel_path(f.root_rel_path) if f.root_rel_path else ""
                 if not file_root and ds_roots:
                     file_root = normalize_root_rel_path(ds_roots[0])
-                normalized = normalize_path(f.full_rel_path, file_root)
+                # Normalized path stored at scan time (diff and copy pair files by it)
+                normalized = f.rel_path
                 ignored = is_ignored_path(f.full_rel_path)
                 samples.append({
                     "full_rel_path": f.full_rel_path,
@@ -128,7 +131,7 @@ async def get_diagnostics():
                     src_samples.append({
                         "original": f.full_rel_path,
                         "root": file_root,
-                        "normalized": normalize_path(f.full_rel_path, file_root),
+                        "normalized": f.rel_path,
                     })
 
             tgt_samples = []
@@ -140,7 +143,7 @@ async def get_diagnostics():
                     tgt_samples.append({
                         "original": f.full_rel_path,
                         "root": file_root,
-                        "normalized": normalize_path(f.full_rel_path, file_root),
+                        "normalized": f.rel_path,
                     })
 
             # Sample diff items by category
@@ -8,6 +8,7 @@ from datetime import datetime
 
 from backend.storage_service import storage_service
 from backend.database import Diff, DiffItem, Scan
+from backend.diff_engine import DIFF_CATEGORIES, category_totals, same_items, store_totals
 from backend.mount_service import mount_service
 
 router = APIRouter()
@@ -15,6 +16,11 @@ router = APIRouter()
 class DiffCreate(BaseModel):
     source_scan_id: int
     target_scan_id: int
+    store_same: bool = False  # Uložit i shodné soubory jako položky (jinak jen počet a velikost)
+
+class DiffUpdate(BaseModel):
+    source_scan_id: Optional[int] = None  # Novější scan zdrojového datasetu
+    target_scan_id: Optional[int] = None  # Novější scan cílového datasetu
 
 class DiffResponse(BaseModel):
     id: int
@@ -23,11 +29,21 @@ class DiffResponse(BaseModel):
     created_at: datetime
     status: str
     error_message: Optional[str] = None
+    store_same: Optional[bool] = None
+    missing_count: Optional[int] = None
+    missing_size: Optional[int] = None
+    same_count: Optional[int] = None
+    same_size: Optional[int] = None
+    conflict_count: Optional[int] = None
+    conflict_size: Optional[int] = None
+    extra_count: Optional[int] = None
+    extra_size: Optional[int] = None
+    base_diff_id: Optional[int] = None
     
     model_config = {"from_attributes": True}
 
 class DiffItemResponse(BaseModel):
-    id: int
+    id: Optional[int] = None  # Shodné soubory počítané na vyžádání nemají ID
     diff_id: int
     full_rel_path: str
     source_size: Optional[int]
@@ -77,6 +93,7 @@ async def create_diff(diff_data: DiffCreate, _: None = Depends(check_safe_mode))
         diff = Diff(
             source_scan_id=diff_data.source_scan_id,
             target_scan_id=diff_data.target_scan_id,
+            store_same=diff_data.store_same,
             status="pending"
         )
         session.add(diff)
@@ -92,6 +109,63 @@ async def create_diff(diff_data: DiffCreate, _: None = Depends(check_safe_mode))
     finally:
         session.close()
 
+@router.post("/{diff_id}/update", response_model=DiffResponse)
+async def update_diff(diff_id: int, update: DiffUpdate, _: None = Depends(check_safe_mode)):
+    """
+    Aktualizovat diff po novém scanu jedné nebo obou stran - vznikne nový diff, který
+    převezme položky původního a znovu zařadí jen cesty změněné mezi starým a novým scanem
+    """
+    session = storage_service.get_session()
+    if not session:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    
+    try:
+        base_diff = session.query(Diff).filter(Diff.id == diff_id).first()
+        if not base_diff:
+            raise HTTPException(status_code=404, detail="Diff not found")
+        if base_diff.status != "completed":
+            raise HTTPException(status_code=400, detail="Only a completed diff can be updated")
+        
+        scan_ids = {}
+        for side, old_scan_id, new_scan_id in (
+            ("source", base_diff.source_scan_id, update.source_scan_id),
+            ("target", base_diff.target_scan_id, update.target_scan_id),
+        ):
+            scan_ids[side] = old_scan_id
+            if new_scan_id is None or new_scan_id == old_scan_id:
+                continue
+            old_scan = session.query(Scan).filter(Scan.id == old_scan_id).first()
+            new_scan = session.query(Scan).filter(Scan.id == new_scan_id).first()
+            if not old_scan or not new_scan:
+                raise HTTPException(status_code=404, detail="Scan not found")
+            if new_scan.dataset_id != old_scan.dataset_id:
+                raise HTTPException(status_code=400, detail=f"New {side} scan must belong to the same dataset")
+            if new_scan.status != "completed":
+                raise HTTPException(status_code=400, detail=f"New {side} scan is not completed")
+            scan_ids[side] = new_scan_id
+        
+        if scan_ids["source"] == base_diff.source_scan_id and scan_ids["target"] == base_diff.target_scan_id:
+            raise HTTPException(status_code=400, detail="No newer scan given")
+        
+        diff = Diff(
+            source_scan_id=scan_ids["source"],
+            target_scan_id=scan_ids["target"],
+            store_same=base_diff.store_same,
+            base_diff_id=base_diff.id,
+            status="pending"
+        )
+        session.add(diff)
+        session.commit()
+        session.refresh(diff)
+        
+        from backend.job_runner import job_runner
+        import asyncio
+        asyncio.create_task(job_runner.run_diff(diff.id))
+        
+        return DiffResponse.model_validate(diff)
+    finally:
+        session.close()
+
 @router.get("/", response_model=List[DiffResponse])
 async def list_diffs():
     """Seznam všech diffů"""
@@ -120,14 +194,68 @@ async def get_diff(diff_id: int):
     finally:
         session.close()
 
+@router.post("/{diff_id}/cancel", response_model=DiffResponse)
+async def cancel_diff(diff_id: int, _: None = Depends(check_safe_mode)):
+    """Zrušit běžící diff (už zapsané položky zůstanou, diff je neúplný)"""
+    return await _control_diff(diff_id, "cancel")
+
+@router.post("/{diff_id}/pause", response_model=DiffResponse)
+async def pause_diff(diff_id: int, _: None = Depends(check_safe_mode)):
+    """Pozastavit běžící diff"""
+    return await _control_diff(diff_id, "pause")
+
+@router.post("/{diff_id}/resume", response_model=DiffResponse)
+async def resume_diff(diff_id: int, _: None = Depends(check_safe_mode)):
+    """Pokračovat v pozastaveném diffu"""
+    return await _control_diff(diff_id, "resume")
+
+async def _control_diff(diff_id: int, action: str):
+    from backend.job_runner import job_runner
+    if not await job_runner.control_job("diff", diff_id, action):
+        raise HTTPException(status_code=400, detail="Diff is not running")
+    
+    session = storage_service.get_session()
+    if not session:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    try:
+        diff = session.query(Diff).filter(Diff.id == diff_id).first()
+        if not diff:
+            raise HTTPException(status_code=404, detail="Diff not found")
+        return DiffResponse.model_validate(diff)
+    finally:
+        session.close()
+
 @router.get("/{diff_id}/items", response_model=List[DiffItemResponse])
 async def get_diff_items(diff_id: int, skip: int = 0, limit: int = 100, category: Optional[str] = None):
-    """Položky diffu s volitelným filtrováním podle kategorie"""
+    """
+    Položky diffu s volitelným filtrováním podle kategorie. Bez uložených shodných souborů
+    (store_same=False) se category=same počítá na vyžádání z obou scanů.
+    """
     session = storage_service.get_session()
     if not session:
         raise HTTPException(status_code=503, detail="Database unavailable")
     
     try:
+        if category == "same":
+            diff = session.query(Diff).filter(Diff.id == diff_id).first()
+            if not diff:
+                raise HTTPException(status_code=404, detail="Diff not found")
+            if not diff.store_same:
+                conn = session.connection().connection.driver_connection
+                return [
+                    DiffItemResponse(
+                        diff_id=diff_id,
+                        full_rel_path=path,
+                        source_size=source_size,
+                        target_size=target_size,
+                        source_mtime=source_mtime,
+                        target_mtime=target_mtime,
+                        category="same"
+                    )
+                    for path, source_size, target_size, source_mtime, target_mtime
+                    in same_items(conn, diff.source_scan_id, diff.target_scan_id, skip, limit)
+                ]
+        
         query = session.query(DiffItem).filter(DiffItem.diff_id == diff_id)
         if category:
             query = query.filter(DiffItem.category == category)
@@ -138,45 +266,65 @@ async def get_diff_items(diff_id: int, skip: int = 0, limit: int = 100, category
 
 @router.get("/{diff_id}/summary", response_model=DiffSummary)
 async def get_diff_summary(diff_id: int):
-    """Shrnutí diffu"""
+    """Shrnutí diffu - součty uložené na Diff, u starších / neukončených diffů agregace položek"""
     session = storage_service.get_session()
     if not session:
         raise HTTPException(status_code=503, detail="Database unavailable")
     
     try:
-        items = session.query(DiffItem).filter(DiffItem.diff_id == diff_id).all()
-        
-        summary = DiffSummary(
-            total_files=len(items),
-            missing_count=0,
-            missing_size=0,
-            same_count=0,
-            same_size=0,
-            conflict_count=0,
-            conflict_size=0,
-            extra_count=0,
-            extra_size=0
-        )
+        diff = session.query(Diff).filter(Diff.id == diff_id).first()
+        if not diff:
+            raise HTTPException(status_code=404, detail="Diff not found")
+        
+        if diff.missing_count is None:
+            totals = _item_totals(session, diff)
+            if diff.status != "completed":
+                # Běžící / přerušený diff - průběžný stav, neukládá se
+                return _summary(totals)
+            store_totals(diff, totals)
+            session.commit()
         
-        for item in items:
-            size = item.source_size or item.target_size or 0
-            if item.category == "missing":
-                summary.missing_count += 1
-                summary.missing_size += size
-            elif item.category == "same":
-                summary.same_count += 1
-                summary.same_size += size
-            elif item.category == "conflict":
-                summary.conflict_count += 1
-                summary.conflict_size += size
-            elif item.category == "extra":
-                summary.extra_count += 1
-                summary.extra_size += size
-        
-        return summary
+        return _summary({
+            category: (getattr(diff, f"{category}_count") or 0, getattr(diff, f"{category}_size") or 0)
+            for category in DIFF_CATEGORIES
+        })
     finally:
         session.close()
 
+@router.post("/{diff_id}/summary/recompute", response_model=DiffSummary)
+async def recompute_diff_summary(diff_id: int, _: None = Depends(check_safe_mode)):
+    """Přepočítat uložené součty diffu z jeho položek (GROUP BY category)"""
+    session = storage_service.get_session()
+    if not session:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    
+    try:
+        diff = session.query(Diff).filter(Diff.id == diff_id).first()
+        if not diff:
+            raise HTTPException(status_code=404, detail="Diff not found")
+        if diff.status != "completed":
+            raise HTTPException(status_code=400, detail="Only a completed diff can be recomputed")
+        
+        totals = _item_totals(session, diff)
+        store_totals(diff, totals)
+        session.commit()
+        return _summary(totals)
+    finally:
+        session.close()
+
+def _item_totals(session, diff: Diff) -> dict:
+    """Součty kategorií z položek diffu; shodné soubory bez uložených položek z Diff"""
+    totals = category_totals(session.connection().connection.driver_connection, diff.id)
+    if not diff.store_same:
+        totals["same"] = (diff.same_count or 0, diff.same_size or 0)
+    return totals
+
+def _summary(totals: dict) -> DiffSummary:
+    fields = {}
+    for category in DIFF_CATEGORIES:
+        fields[f"{category}_count"], fields[f"{category}_size"] = totals.get(category, (0, 0))
+    return DiffSummary(total_files=sum(fields[f"{category}_count"] for category in DIFF_CATEGORIES), **fields)
+
 @router.delete("/{diff_id}")
 async def delete_diff(diff_id: int, _: None = Depends(check_safe_mode)):
     """Smazat diff a všechny jeho položky"""
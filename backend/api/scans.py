@@ -1,7 +1,8 @@
 """
 Scan API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
@@ -9,13 +10,17 @@ import csv
 import io
 
 from backend.storage_service import storage_service
-from backend.database import Scan, FileEntry, Dataset
+from backend.database import Scan, FileEntry, Dataset, ScanDir, ScanCheckpoint, ScanDirStat, PathDir
+from backend.path_dictionary import PATH_SQL, split_path
 from backend.mount_service import mount_service
 
 router = APIRouter()
 
+EXPORT_CHUNK_ROWS = 5000  # řádků na jeden chunk streamovaného CSV exportu
+
 class ScanCreate(BaseModel):
     dataset_id: int
+    incremental: bool = False  # převzít nezměněné adresáře z posledního scanu (jen lokální scan)
 
 class ScanResponse(BaseModel):
     id: int
@@ -25,6 +30,8 @@ class ScanResponse(BaseModel):
     total_files: int
     total_size: float
     error_message: Optional[str] = None
+    incremental: Optional[bool] = False
+    base_scan_id: Optional[int] = None
     
     model_config = {"from_attributes": True}
 
@@ -38,6 +45,31 @@ class FileEntryResponse(BaseModel):
     
     model_config = {"from_attributes": True}
 
+class DirStatResponse(BaseModel):
+    path: str
+    name: str
+    file_count: int  # soubory v celém podstromu
+    total_size: int  # bajty v celém podstromu
+    max_mtime: Optional[float] = None
+    own_file_count: int  # soubory přímo v adresáři
+    own_size: int
+
+class ScanTreeResponse(BaseModel):
+    scan_id: int
+    directory: DirStatResponse
+    children: List[DirStatResponse]
+
+def _dir_stat_response(stat: ScanDirStat) -> DirStatResponse:
+    return DirStatResponse(
+        path=stat.path,
+        name=split_path(stat.path)[1],
+        file_count=stat.file_count,
+        total_size=stat.total_size,
+        max_mtime=stat.max_mtime,
+        own_file_count=stat.own_file_count,
+        own_size=stat.own_size,
+    )
+
 async def check_safe_mode():
     """Dependency - kontroluje SAFE MODE"""
     mount_status = await mount_service.get_status()
@@ -63,7 +95,8 @@ async def create_scan(scan_data: ScanCreate, _: None = Depends(check_safe_mode))
         # Vytvoření scan záznamu
         scan = Scan(
             dataset_id=scan_data.dataset_id,
-            status="pending"
+            status="pending",
+            incremental=scan_data.incremental
         )
         session.add(scan)
         session.commit()
@@ -78,6 +111,66 @@ async def create_scan(scan_data: ScanCreate, _: None = Depends(check_safe_mode))
     finally:
         session.close()
 
+@router.post("/{scan_id}/cancel", response_model=ScanResponse)
+async def cancel_scan(scan_id: int, _: None = Depends(check_safe_mode)):
+    """Zrušit běžící scan - hotové adresáře zůstanou uložené a scan lze později dokončit přes resume"""
+    return await _control_scan(scan_id, "cancel")
+
+@router.post("/{scan_id}/pause", response_model=ScanResponse)
+async def pause_scan(scan_id: int, _: None = Depends(check_safe_mode)):
+    """Pozastavit běžící scan (uvolní I/O NAS, pokračuje se přes resume)"""
+    return await _control_scan(scan_id, "pause")
+
+async def _control_scan(scan_id: int, action: str):
+    from backend.job_runner import job_runner
+    if not await job_runner.control_job("scan", scan_id, action):
+        raise HTTPException(status_code=400, detail="Scan is not running")
+    
+    session = storage_service.get_session()
+    if not session:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    try:
+        scan = session.query(Scan).filter(Scan.id == scan_id).first()
+        if not scan:
+            raise HTTPException(status_code=404, detail="Scan not found")
+        return ScanResponse.model_validate(scan)
+    finally:
+        session.close()
+
+@router.post("/{scan_id}/resume", response_model=ScanResponse)
+async def resume_scan(scan_id: int, _: None = Depends(check_safe_mode)):
+    """Pokračovat v pozastaveném scanu, nebo v přerušeném (selhaném / zrušeném) scanu od posledních checkpointů"""
+    session = storage_service.get_session()
+    if not session:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    
+    try:
+        scan = session.query(Scan).filter(Scan.id == scan_id).first()
+        if not scan:
+            raise HTTPException(status_code=404, detail="Scan not found")
+        
+        from backend.job_runner import job_runner
+        control = job_runner.get_control("scan", scan_id)
+        if control is not None and control.paused:
+            await job_runner.resume_job("scan", scan_id)
+            session.refresh(scan)
+            return ScanResponse.model_validate(scan)
+        
+        if scan.status not in ("failed", "cancelled") or job_runner._is_job_alive(scan_id):
+            raise HTTPException(status_code=400, detail="Only paused, failed or cancelled scans can be resumed")
+        
+        scan.status = "pending"
+        scan.error_message = None
+        session.commit()
+        session.refresh(scan)
+        
+        import asyncio
+        asyncio.create_task(job_runner.run_scan(scan.id, scan.dataset_id, resume=True))
+        
+        return ScanResponse.model_validate(scan)
+    finally:
+        session.close()
+
 @router.get("/", response_model=List[ScanResponse])
 async def list_scans():
     """Seznam všech scanů"""
@@ -121,9 +214,10 @@ async def get_scan_files(scan_id: int, skip: int = 0, limit: int = 100):
     finally:
         session.close()
 
-@router.get("/{scan_id}/export")
-async def export_scan_csv(scan_id: int):
-    """Export scanu do CSV"""
+@router.get("/{scan_id}/tree", response_model=ScanTreeResponse)
+async def get_scan_tree(scan_id: int, path: str = ""):
+    """Souhrn adresáře scanu a jeho podadresářů (rekurzivní počet souborů, velikost, nejnovější mtime)"""
+    import unicodedata
     session = storage_service.get_session()
     if not session:
         raise HTTPException(status_code=503, detail="Database unavailable")
@@ -132,73 +226,129 @@ async def export_scan_csv(scan_id: int):
         scan = session.query(Scan).filter(Scan.id == scan_id).first()
         if not scan:
             raise HTTPException(status_code=404, detail="Scan not found")
+        if scan.status != "completed":
+            raise HTTPException(status_code=400, detail="Directory tree is available only for completed scans")
         
-        # Načíst všechny soubory ve scanu
-        try:
-            files = session.query(FileEntry).filter(
-                FileEntry.scan_id == scan_id
-            ).order_by(FileEntry.full_rel_path).all()
-        except Exception as query_error:
-            raise HTTPException(status_code=500, detail=f"Failed to load files: {str(query_error)}")
-        
-        # Vytvořit CSV v paměti s UTF-8 encoding
-        output = io.StringIO()
-        writer = csv.writer(output, quoting=csv.QUOTE_MINIMAL)
+        # Scany z doby před souhrny adresářů - spočítat jednou z file_entries
+        if not session.query(ScanDirStat.id).filter(ScanDirStat.scan_id == scan_id).first():
+            import asyncio
+            await asyncio.to_thread(_build_dir_stats, storage_service.db_path, scan_id)
         
-        # Hlavička
-        writer.writerow(['Cesta', 'Velikost (B)', 'Velikost (GB)', 'Datum změny'])
+        path = unicodedata.normalize("NFC", path.strip("/"))
+        node = session.query(ScanDirStat).join(PathDir, PathDir.id == ScanDirStat.dir_id).filter(
+            ScanDirStat.scan_id == scan_id,
+            PathDir.path == path
+        ).first()
+        if not node:
+            if path:
+                raise HTTPException(status_code=404, detail="Directory not found in scan")
+            # Prázdný scan
+            empty = DirStatResponse(path="", name="", file_count=0, total_size=0, own_file_count=0, own_size=0)
+            return ScanTreeResponse(scan_id=scan_id, directory=empty, children=[])
         
-        # Data
-        try:
-            for file in files:
+        children = session.query(ScanDirStat).filter(
+            ScanDirStat.scan_id == scan_id,
+            ScanDirStat.parent_dir_id == node.dir_id
+        ).order_by(ScanDirStat.path).all()
+        return ScanTreeResponse(
+            scan_id=scan_id,
+            directory=_dir_stat_response(node),
+            children=[_dir_stat_response(child) for child in children]
+        )
+    finally:
+        session.close()
+
+def _build_dir_stats(db_path: str, scan_id: int):
+    import sqlite3
+    from backend.scan_tree import load_dir_aggregates, write_dir_stats
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        write_dir_stats(conn, scan_id, load_dir_aggregates(conn, scan_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+@router.get("/{scan_id}/export")
+async def export_scan_csv(scan_id: int):
+    """Export scanu do CSV (streamovaný po dávkách - paměť nezávisí na velikosti scanu)"""
+    session = storage_service.get_session()
+    if not session:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    
+    try:
+        scan = session.query(Scan).filter(Scan.id == scan_id).first()
+        if not scan:
+            raise HTTPException(status_code=404, detail="Scan not found")
+    finally:
+        session.close()
+    
+    return StreamingResponse(
+        _iter_scan_csv(storage_service.db_path, scan_id),
+        media_type="text/csv; charset=utf-8",
+        headers={
+            "Content-Disposition": f"attachment; filename=scan_{scan_id}_export.csv"
+        }
+    )
+
+def _iter_scan_csv(db_path: str, scan_id: int):
+    """
+    Generátor CSV po dávkách EXPORT_CHUNK_ROWS řádků přes vlastní sqlite3 kurzor.
+    Cesty se skládají ze slovníku (path_dirs / path_names). Řazení podle (dir_id, name_id) jde
+    pořadím indexu ix_file_entries_scan_dir_name - první řádky odchází bez třídění celého scanu.
+    Synchronní generátor - StreamingResponse ho iteruje v threadpoolu.
+    """
+    import logging
+    import sqlite3
+    logger = logging.getLogger(__name__)
+    
+    output = io.StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_MINIMAL)
+    
+    # Hlavička (UTF-8 s BOM pro Excel)
+    writer.writerow(['Cesta', 'Velikost (B)', 'Velikost (GB)', 'Datum změny'])
+    yield output.getvalue().encode('utf-8-sig')
+    
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        cursor = conn.execute(
+            f"SELECT {PATH_SQL}, f.size, f.mtime_epoch FROM file_entries f "
+            "JOIN path_dirs d ON d.id = f.dir_id JOIN path_names n ON n.id = f.name_id "
+            "WHERE f.scan_id = ? ORDER BY f.dir_id, f.name_id",
+            (scan_id,)
+        )
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            output.seek(0)
+            output.truncate()
+            for full_rel_path, size, mtime_epoch in rows:
                 try:
-                    size_gb = (file.size / 1024 / 1024 / 1024) if file.size else 0
+                    size_gb = (size / 1024 / 1024 / 1024) if size else 0
                     mtime_str = ''
-                    if file.mtime_epoch:
+                    if mtime_epoch:
                         try:
-                            mtime_str = datetime.fromtimestamp(file.mtime_epoch).strftime('%Y-%m-%d %H:%M:%S')
+                            mtime_str = datetime.fromtimestamp(mtime_epoch).strftime('%Y-%m-%d %H:%M:%S')
                         except (ValueError, OSError):
-                            mtime_str = str(file.mtime_epoch)
+                            mtime_str = str(mtime_epoch)
                     
                     writer.writerow([
-                        file.full_rel_path or '',
-                        file.size or 0,
+                        full_rel_path or '',
+                        size or 0,
                         f"{size_gb:.6f}",
                         mtime_str
                     ])
                 except Exception as row_error:
                     # Přeskočit problematické řádky a pokračovat
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.warning(f"Failed to write row for file {file.id}: {row_error}")
+                    logger.warning(f"Failed to write row for file {full_rel_path}: {row_error}")
                     continue
-        except Exception as write_error:
-            output.close()
-            raise HTTPException(status_code=500, detail=f"Failed to generate CSV: {str(write_error)}")
-        
-        # Vrátit CSV jako response s UTF-8 encoding
-        csv_content = output.getvalue()
-        output.close()
-        
-        # Převést na bytes s UTF-8 encoding
-        csv_bytes = csv_content.encode('utf-8-sig')  # UTF-8 s BOM pro Excel
-        
-        return Response(
-            content=csv_bytes,
-            media_type="text/csv; charset=utf-8",
-            headers={
-                "Content-Disposition": f"attachment; filename=scan_{scan_id}_export.csv"
-            }
-        )
-    except HTTPException:
-        raise
+            yield output.getvalue().encode('utf-8')
     except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
+        # Hlavičky už jsou odeslané - chybu lze jen zalogovat, klient dostane useknutý soubor
         logger.error(f"Export scan CSV error: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+        raise
     finally:
-        session.close()
+        conn.close()
 
 @router.delete("/{scan_id}")
 async def delete_scan(scan_id: int, _: None = Depends(check_safe_mode)):
@@ -214,6 +364,11 @@ async def delete_scan(scan_id: int, _: None = Depends(check_safe_mode)):
         
         # Smazat všechny soubory ve scanu
         session.query(FileEntry).filter(FileEntry.scan_id == scan_id).delete()
+        session.query(ScanDir).filter(ScanDir.scan_id == scan_id).delete()
+        session.query(ScanCheckpoint).filter(ScanCheckpoint.scan_id == scan_id).delete()
+        session.query(ScanDirStat).filter(ScanDirStat.scan_id == scan_id).delete()
+        # Inkrementální scany odkazující na tento scan si ponechají své soubory, jen ztratí odkaz
+        session.query(Scan).filter(Scan.base_scan_id == scan_id).update({Scan.base_scan_id: None})
         
         # Smazat scan
         session.delete(scan)
@@ -0,0 +1,95 @@
+"""
+Hromadný zápis výsledků jobů (diff_items, batch_items, job_file_statuses) přes vlastní
+sqlite3 spojení - bloky s adaptivní velikostí, commit s opakováním, propustnost do logu.
+Stejný princip jako writer scanu, jen synchronně ve vlákně jobu.
+"""
+import sqlite3
+import time
+from typing import Callable, Iterable, Optional
+
+BULK_CHUNK_MIN = 1000           # adaptivní velikost bloku - dolní mez
+BULK_CHUNK_MAX = 50000          # horní mez
+BULK_COMMIT_TARGET = 0.5        # cílová doba jednoho commitu (s)
+BULK_ATTEMPTS = 3               # pokusů o zápis bloku (zamčená / zaneprázdněná DB)
+
+
+class BulkWriter:
+    """
+    insert() zapíše řádky přes executemany po blocích, write() provede libovolný zápis
+    (např. INSERT ... SELECT) jako jeden blok. Každý blok je vlastní transakce; při
+    OperationalError (database is locked, disk I/O) se odvolá a zopakuje. Velikost
+    dalšího bloku (chunk_size) se řídí dobou commitu - pomalý USB disk => menší bloky.
+    """
+
+    def __init__(self, db_path: str, label: str, log_cb: Optional[Callable[[str], None]] = None,
+                 chunk_min: int = BULK_CHUNK_MIN, chunk_max: int = BULK_CHUNK_MAX):
+        self.label = label
+        self.log_cb = log_cb
+        self.chunk_min = chunk_min
+        self.chunk_max = chunk_max
+        self.chunk_size = chunk_min
+        self.rows_written = 0
+        self.commits = 0
+        self.write_time = 0.0
+        self.started = time.monotonic()
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=10000")
+
+    def insert(self, sql: str, rows: Iterable[tuple]) -> int:
+        """Zapíše řádky po blocích; vrací počet zapsaných řádků"""
+        written = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                written += self.write(lambda conn, block=chunk: self._executemany(conn, sql, block), len(chunk))
+                chunk = []
+        if chunk:
+            written += self.write(lambda conn: self._executemany(conn, sql, chunk), len(chunk))
+        return written
+
+    def write(self, fn: Callable[[sqlite3.Connection], int], size: int) -> int:
+        """
+        Jeden blok v jedné transakci: fn(conn) vrací počet zapsaných řádků, size je objem
+        práce bloku pro přizpůsobení chunk_size. Po posledním neúspěšném pokusu vyhodí chybu.
+        """
+        for attempt in range(BULK_ATTEMPTS):
+            started = time.monotonic()
+            try:
+                written = fn(self.conn)
+                self.conn.commit()
+            except sqlite3.OperationalError as e:
+                self.conn.rollback()
+                if attempt == BULK_ATTEMPTS - 1:
+                    raise
+                if self.log_cb:
+                    self.log_cb(f"WARNING: {self.label} write attempt {attempt + 1} failed ({e}), retrying...")
+                time.sleep(0.5)
+                continue
+            duration = time.monotonic() - started
+            self.rows_written += written
+            self.commits += 1
+            self.write_time += duration
+            if duration < BULK_COMMIT_TARGET / 2 and size >= self.chunk_size:
+                self.chunk_size = min(self.chunk_size * 2, self.chunk_max)
+            elif duration > BULK_COMMIT_TARGET * 2:
+                self.chunk_size = max(self.chunk_size // 2, self.chunk_min)
+            return written
+        return 0
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self.started
+        return (
+            f"{self.label}: {self.rows_written} rows in {self.commits} commits "
+            f"({self.rows_written / elapsed if elapsed else 0:.0f} rows/s), "
+            f"write time {self.write_time:.1f}s, chunk size {self.chunk_size}"
+        )
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def _executemany(conn: sqlite3.Connection, sql: str, rows: list) -> int:
+        conn.executemany(sql, rows)
+        return len(rows)
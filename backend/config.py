@@ -1,6 +1,8 @@
 """
 Globální konfigurace aplikace
 """
+from functools import lru_cache
+
 # Výchozí výjimky - soubory, které se nebudou kopírovat
 DEFAULT_EXCLUDE_PATTERNS = [
     ".DS_Store",  # macOS
@@ -29,33 +31,69 @@ def match_exclude_pattern(path: str, patterns: list) -> bool:
     - "*.tmp" - soubory s příponou .tmp
     - ".DS_Store" - soubory s názvem .DS_Store kdekoli v cestě
     - "folder/.DS_Store" - přesná cesta
-    """
-    import fnmatch
-    import os
     
-    # Normalizace cesty
-    path_normalized = path.replace("\\", "/")
-    filename = os.path.basename(path_normalized)
+    Patterny se kompilují jednou (cache podle seznamu), viz ExcludeMatcher.
+    """
+    return compile_exclude_patterns(tuple(patterns or ())).matches(path)
+
+
+class ExcludeMatcher:
+    """
+    Exclude patterny zkompilované do dvou regexů - se stejnou sémantikou jako
+    původní smyčka přes patterny (přesná shoda názvu, fnmatch názvu, fnmatch
+    celé cesty, podřetězec cesty), ale jeden průchod místo 3x fnmatch na pattern.
+    """
     
-    for pattern in patterns:
-        if not pattern:
-            continue
+    def __init__(self, patterns):
+        import fnmatch
+        import re
         
-        # Přesná shoda názvu souboru
-        if filename == pattern:
-            return True
+        self.patterns = [p for p in dict.fromkeys(patterns or []) if p]
+        globs = [p for p in self.patterns if any(c in p for c in "*?[")]
         
-        # Glob pattern pro název souboru
-        if fnmatch.fnmatch(filename, pattern):
-            return True
-        
-        # Glob pattern pro celou cestu
-        if fnmatch.fnmatch(path_normalized, pattern):
+        # Podřetězec cesty (pokrývá i přesnou shodu názvu a cesty)
+        self._substring = re.compile("|".join(re.escape(p) for p in self.patterns)) if self.patterns else None
+        # fnmatch názvu souboru i celé cesty (translate() je ukotvený na konci)
+        self._glob = re.compile("|".join(fnmatch.translate(p) for p in globs)) if globs else None
+        # Glob končící "*" odpovídající "adresář/" odpovídá i všemu pod adresářem
+        dir_globs = [p for p in globs if p.endswith("*")]
+        self._dir_glob = re.compile("|".join(fnmatch.translate(p) for p in dir_globs)) if dir_globs else None
+    
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+    
+    def matches(self, path: str) -> bool:
+        """Je soubor (relativní cesta) vyloučen?"""
+        if self._substring is None:
+            return False
+        path_normalized = path.replace("\\", "/")
+        if self._substring.search(path_normalized):
             return True
-        
-        # Pattern může být relativní cesta
-        if pattern in path_normalized:
+        if self._glob is not None:
+            filename = path_normalized.rsplit("/", 1)[-1]
+            if self._glob.match(filename) or self._glob.match(path_normalized):
+                return True
+        return False
+    
+    def excludes_dir(self, rel_dir: str) -> bool:
+        """
+        Jsou vyloučené všechny soubory pod adresářem rel_dir? Pak ho scan
+        nemusí procházet (např. "@eaDir", ".git"). Adresář, ve kterém by
+        některý soubor prošel, se neořezává.
+        """
+        if self._substring is None or not rel_dir:
+            return False
+        prefix = rel_dir.replace("\\", "/").rstrip("/") + "/"
+        if self._substring.search(prefix):
             return True
+        return self._dir_glob is not None and self._dir_glob.match(prefix) is not None
     
-    return False
+    def literal_patterns(self) -> list:
+        """Patterny bez glob znaků (pro ořezání ve vzdáleném find)"""
+        return [p for p in self.patterns if not any(c in p for c in "*?[\\")]
+
 
+@lru_cache(maxsize=32)
+def compile_exclude_patterns(patterns: tuple) -> ExcludeMatcher:
+    """Zkompilovaný matcher pro daný seznam patternů (cache - kompiluje se jednou)"""
+    return ExcludeMatcher(patterns)
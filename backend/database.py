@@ -1,9 +1,9 @@
 """
 Database models a konfigurace
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, JSON, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, JSON, Boolean, Index, case, select
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, column_property
 from datetime import datetime
 import os
 
@@ -14,6 +14,34 @@ def get_db_path() -> str:
     db_path = os.getenv("DATABASE_PATH", "/mnt/usb/sync_orchestrator.db")
     return db_path
 
+# PathDir / PathName - globální slovník cest (adresář a název souboru uložené jednou)
+class PathDir(Base):
+    __tablename__ = "path_dirs"
+    
+    id = Column(Integer, primary_key=True)
+    path = Column(String, nullable=False, unique=True)  # Relativní cesta adresáře, "" = kořen
+
+class PathName(Base):
+    __tablename__ = "path_names"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
+def _path_property(dir_id, name_id):
+    """Celá cesta složená ze slovníku - jen pro čtení, zápis jde přes dir_id / name_id"""
+    d = PathDir.__table__.alias()
+    n = PathName.__table__.alias()
+    return column_property(
+        select(case((d.c.path == "", n.c.name), else_=d.c.path + "/" + n.c.name))
+        .where(d.c.id == dir_id, n.c.id == name_id)
+        .scalar_subquery()
+    )
+
+def _dir_path_property(dir_id):
+    """Cesta adresáře ze slovníku - jen pro čtení"""
+    d = PathDir.__table__.alias()
+    return column_property(select(d.c.path).where(d.c.id == dir_id).scalar_subquery())
+
 # Dataset - logická migrační jednotka
 class Dataset(Base):
     __tablename__ = "datasets"
@@ -35,10 +63,13 @@ class Scan(Base):
     id = Column(Integer, primary_key=True, index=True)
     dataset_id = Column(Integer, ForeignKey("datasets.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
-    status = Column(String, default="pending")  # pending/running/completed/failed
+    status = Column(String, default="pending")  # pending/running/paused/completed/failed/cancelled
     total_files = Column(Integer, default=0)
     total_size = Column(Float, default=0.0)
     error_message = Column(Text)  # Chybová zpráva při selhání
+    incremental = Column(Boolean, default=False)  # Převzít nezměněné adresáře z předchozího scanu
+    base_scan_id = Column(Integer, ForeignKey("scans.id"))  # Předchozí scan použitý pro inkrementální scan
+    exclude_patterns = Column(JSON)  # Výjimky použité při scanu (inkrementální scan je musí mít stejné)
     
     dataset = relationship("Dataset", backref="scans")
 
@@ -48,17 +79,97 @@ class FileEntry(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     scan_id = Column(Integer, ForeignKey("scans.id"), nullable=False)
-    full_rel_path = Column(String, nullable=False, index=True)
+    dir_id = Column(Integer, ForeignKey("path_dirs.id"), nullable=False)
+    name_id = Column(Integer, ForeignKey("path_names.id"), nullable=False)
+    full_rel_path = _path_property(dir_id, name_id)
     size = Column(Integer, nullable=False)
     mtime_epoch = Column(Float, nullable=False)
     root_rel_path = Column(String, nullable=False)
+    # Normalizovaná cesta bez root složky (NFC) - počítá se při scanu, páruje diff a copy
+    rel_dir_id = Column(Integer, ForeignKey("path_dirs.id"))
+    rel_name_id = Column(Integer, ForeignKey("path_names.id"))
+    rel_path = _path_property(rel_dir_id, rel_name_id)
+    fingerprint = Column(String)  # Otisk obsahu (fingerprint režim scanu), jinak NULL
+    # Identita inode jen u hardlinků (nlink > 1), jinak NULL
+    inode = Column(Integer)
+    dev = Column(Integer)
+    nlink = Column(Integer)
     
     scan = relationship("Scan", backref="file_entries")
     
     __table_args__ = (
+        Index("ix_file_entries_scan_dir_name", "scan_id", "dir_id", "name_id"),
+        Index("ix_file_entries_scan_rel", "scan_id", "rel_dir_id", "rel_name_id"),
         {"sqlite_autoincrement": True},
     )
 
+# ScanDir - stav adresáře ve scanu (pro inkrementální scan)
+class ScanDir(Base):
+    __tablename__ = "scan_dirs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    scan_id = Column(Integer, ForeignKey("scans.id"), nullable=False)
+    rel_path = Column(String, nullable=False)  # Relativní cesta adresáře (NFC), "" = base_path
+    mtime_epoch = Column(Float, nullable=False)
+    inode = Column(Integer, nullable=False)
+    child_count = Column(Integer, nullable=False)  # Počet položek v adresáři
+    fs_name = Column(String)  # Název na disku, pokud se liší od NFC tvaru
+    complete = Column(Boolean, default=True)  # False = adresář se nepodařilo celý vylistovat
+    
+    __table_args__ = (
+        Index("ix_scan_dirs_scan_path", "scan_id", "rel_path"),
+    )
+
+# ScanCheckpoint - průběh scanu po adresářích (pro pokračování přerušeného scanu)
+class ScanCheckpoint(Base):
+    __tablename__ = "scan_checkpoints"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    scan_id = Column(Integer, ForeignKey("scans.id"), nullable=False)
+    root_rel = Column(String, nullable=False)  # Root složka datasetu (jak je v Dataset.roots)
+    dir_path = Column(String, nullable=False)  # Cesta pro adapter (absolutní / vzdálená)
+    rel_path = Column(String, nullable=False)  # Relativní cesta adresáře (NFC)
+    done = Column(Integer, nullable=False, default=0)  # 0 = čeká, 1 = soubory adresáře zapsané, 2 = zapsaný celý podstrom
+    
+    __table_args__ = (
+        Index("ux_scan_checkpoints_scan_path", "scan_id", "rel_path", unique=True),
+    )
+
+# ScanDirStat - souhrny adresářů scanu (počítané během scanu, pro strom scanu)
+class ScanDirStat(Base):
+    __tablename__ = "scan_dir_stats"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    scan_id = Column(Integer, ForeignKey("scans.id"), nullable=False)
+    dir_id = Column(Integer, ForeignKey("path_dirs.id"), nullable=False)
+    parent_dir_id = Column(Integer, ForeignKey("path_dirs.id"))  # NULL = kořen scanu ("")
+    file_count = Column(Integer, nullable=False)  # Soubory v celém podstromu
+    total_size = Column(Integer, nullable=False)  # Bajty v celém podstromu (hardlink jednou)
+    max_mtime = Column(Float)  # Nejnovější mtime v podstromu
+    own_file_count = Column(Integer, nullable=False)  # Soubory přímo v adresáři
+    own_size = Column(Integer, nullable=False)
+    path = _dir_path_property(dir_id)
+    
+    __table_args__ = (
+        Index("ux_scan_dir_stats_scan_dir", "scan_id", "dir_id", unique=True),
+        Index("ix_scan_dir_stats_scan_parent", "scan_id", "parent_dir_id"),
+    )
+
+# FileHashCache - otisky souborů datasetu, platné pro danou velikost a mtime
+class FileHashCache(Base):
+    __tablename__ = "file_hash_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    dataset_id = Column(Integer, ForeignKey("datasets.id"), nullable=False)
+    path = Column(String, nullable=False)  # full_rel_path souboru
+    size = Column(Integer, nullable=False)
+    mtime_epoch = Column(Float, nullable=False)
+    fingerprint = Column(String, nullable=False)
+    
+    __table_args__ = (
+        Index("ux_file_hash_cache_dataset_path", "dataset_id", "path", unique=True),
+    )
+
 # Diff - porovnání dvou scanů
 class Diff(Base):
     __tablename__ = "diffs"
@@ -67,8 +178,19 @@ class Diff(Base):
     source_scan_id = Column(Integer, ForeignKey("scans.id"), nullable=False)
     target_scan_id = Column(Integer, ForeignKey("scans.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
-    status = Column(String, default="pending")  # pending/running/completed/failed
+    status = Column(String, default="pending")  # pending/running/paused/completed/failed/cancelled
     error_message = Column(Text)  # Chybová zpráva při selhání
+    store_same = Column(Boolean, default=False)  # Ukládat i shodné soubory jako DiffItem
+    # Součty kategorií (počet, velikost v bytech) - vyplní dokončený diff
+    missing_count = Column(Integer)
+    missing_size = Column(Integer)
+    same_count = Column(Integer)
+    same_size = Column(Integer)
+    conflict_count = Column(Integer)
+    conflict_size = Column(Integer)
+    extra_count = Column(Integer)
+    extra_size = Column(Integer)
+    base_diff_id = Column(Integer, ForeignKey("diffs.id"))  # Původní diff, ze kterého vznikla aktualizace
     
     source_scan = relationship("Scan", foreign_keys=[source_scan_id], backref="source_diffs")
     target_scan = relationship("Scan", foreign_keys=[target_scan_id], backref="target_diffs")
@@ -79,7 +201,9 @@ class DiffItem(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     diff_id = Column(Integer, ForeignKey("diffs.id"), nullable=False)
-    full_rel_path = Column(String, nullable=False, index=True)
+    dir_id = Column(Integer, ForeignKey("path_dirs.id"), nullable=False)
+    name_id = Column(Integer, ForeignKey("path_names.id"), nullable=False)
+    full_rel_path = _path_property(dir_id, name_id)
     source_size = Column(Integer)
     target_size = Column(Integer)
     source_mtime = Column(Float)
@@ -87,6 +211,10 @@ class DiffItem(Base):
     category = Column(String, nullable=False)  # missing/same/conflict
     
     diff = relationship("Diff", backref="items")
+    
+    __table_args__ = (
+        Index("ix_diff_items_diff_dir_name", "diff_id", "dir_id", "name_id"),
+    )
 
 # Batch - plán přenosu
 class Batch(Base):
@@ -99,7 +227,7 @@ class Batch(Base):
     include_conflicts = Column(Boolean, default=False)
     include_extra = Column(Boolean, default=False)
     exclude_patterns = Column(JSON, default=list)
-    status = Column(String, default="pending")  # pending/running/ready/failed/completed
+    status = Column(String, default="pending")  # pending/running/paused/ready/failed/completed/cancelled
     error_message = Column(Text)  # Chybová zpráva při selhání
     
     diff = relationship("Diff", backref="batches")
@@ -110,10 +238,13 @@ class BatchItem(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     batch_id = Column(Integer, ForeignKey("batches.id"), nullable=False)
-    full_rel_path = Column(String, nullable=False)
+    dir_id = Column(Integer, ForeignKey("path_dirs.id"), nullable=False)
+    name_id = Column(Integer, ForeignKey("path_names.id"), nullable=False)
+    full_rel_path = _path_property(dir_id, name_id)
     size = Column(Integer, nullable=False)
     category = Column(String, nullable=False)  # missing/conflict
     enabled = Column(Boolean, default=True)  # Zda je soubor povolen ke kopírování
+    hardlink_of = Column(String)  # Cesta jiné položky batche se stejným inode (data se přenáší jen jednou)
     
     batch = relationship("Batch", backref="items")
 
@@ -123,7 +254,7 @@ class JobRun(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     type = Column(String, nullable=False)  # scan/diff/batch/copy
-    status = Column(String, default="running")  # running/completed/failed
+    status = Column(String, default="running")  # running/paused/completed/failed/cancelled
     started_at = Column(DateTime, default=datetime.utcnow)
     finished_at = Column(DateTime)
     error_message = Column(Text)
@@ -138,7 +269,9 @@ class JobFileStatus(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     job_id = Column(Integer, ForeignKey("job_runs.id"), nullable=False)
-    file_path = Column(String, nullable=False)
+    dir_id = Column(Integer, ForeignKey("path_dirs.id"), nullable=False)
+    name_id = Column(Integer, ForeignKey("path_names.id"), nullable=False)
+    file_path = _path_property(dir_id, name_id)
     file_size = Column(Integer, nullable=False)
     status = Column(String, nullable=False)  # copied/failed/skipped
     error_message = Column(Text)  # Chybová zpráva pokud selhalo
@@ -0,0 +1,321 @@
+"""
+Diff dvou scanů v SQLite - položky diff_items vznikají dotazy INSERT ... SELECT nad
+indexem normalizované cesty (rel_dir_id, rel_name_id). Oba scany sdílí slovník cest,
+stejné ID = stejná cesta. Porovnává se po rozsazích ID adresářů, aby šel hlásit
+průběh, commitovat po blocích (BulkWriter) a job zrušit mezi nimi.
+
+Shodné soubory ('same') se standardně neukládají - diff drží jen jejich počet a
+velikost (Diff.same_count / same_size), položky se počítají až na vyžádání (same_items).
+
+Aktualizace diffu po novém scanu jedné ze stran (IncrementalDiff) převezme položky
+původního diffu a znovu zařadí jen cesty, které se mezi starým a novým scanem změnily.
+"""
+import sqlite3
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from backend.path_dictionary import PATH_SQL
+from backend.utils import IGNORED_PATH_SEGMENTS
+
+DIFF_CHUNK_MIN = 10000          # souborů obou scanů v jednom rozsahu adresářů (jeden commit) - dolní mez
+DIFF_CHUNK_MAX = 200000         # horní mez
+MTIME_TOLERANCE = 2.0           # s - hrubá granularita mtime (FAT/SMB)
+DIFF_CATEGORIES = ("missing", "same", "conflict", "extra")
+
+# Počty souborů po adresářích - jen průchod indexem ix_file_entries_scan_rel
+DIR_COUNTS_SQL = (
+    "SELECT rel_dir_id, COUNT(*) FROM file_entries WHERE scan_id IN (?, ?) "
+    "GROUP BY rel_dir_id ORDER BY rel_dir_id"
+)
+
+# Soubory scanu v rozsahu adresářů, duplicitní normalizovaná cesta jednou - hodnoty řádku
+# s nejmenším id (holé sloupce vedle MIN() bere SQLite z řádku s minimem)
+_SCAN_FILES = (
+    "SELECT rel_dir_id AS dir_id, rel_name_id AS name_id, size, mtime_epoch AS mtime, MIN(id) AS id "
+    "FROM file_entries WHERE scan_id = ? AND rel_dir_id BETWEEN ? AND ? GROUP BY rel_dir_id, rel_name_id"
+)
+
+# Ignorované cesty (.streams, :$DATA) - stejné jako utils.is_ignored_path
+_NOT_IGNORED = "NOT (" + " OR ".join(
+    [f"instr('/' || d.path || '/' || n.name || '/', '/{segment}/') > 0" for segment in IGNORED_PATH_SEGMENTS]
+    + ["instr(d.path || '/' || n.name, ':$DATA') > 0"]
+) + ")"
+
+# Soubory zdroje - chybějící v cíli, nebo shodné / konfliktní podle velikosti a mtime
+_SOURCE_ITEMS = (
+    "SELECT ? AS diff_id, s.dir_id AS dir_id, s.name_id AS name_id, "
+    "CASE WHEN t.id IS NULL THEN 'missing' "
+    "WHEN s.size IS NOT t.size THEN 'conflict' "
+    f"WHEN s.mtime AND t.mtime AND abs(s.mtime - t.mtime) > {MTIME_TOLERANCE} THEN 'conflict' "
+    "ELSE 'same' END AS category, "
+    "s.size AS source_size, t.size AS target_size, s.mtime AS source_mtime, t.mtime AS target_mtime "
+    f"FROM ({_SCAN_FILES}) s LEFT JOIN ({_SCAN_FILES}) t ON t.dir_id = s.dir_id AND t.name_id = s.name_id "
+    "JOIN path_dirs d ON d.id = s.dir_id JOIN path_names n ON n.id = s.name_id "
+    f"WHERE {_NOT_IGNORED}"
+)
+_INSERT_ITEMS = (
+    "INSERT INTO diff_items (diff_id, dir_id, name_id, category, source_size, target_size, source_mtime, target_mtime) "
+)
+SOURCE_ITEMS_SQL = _INSERT_ITEMS + _SOURCE_ITEMS
+# Bez shodných souborů (store_same=False)
+CHANGED_ITEMS_SQL = _INSERT_ITEMS + f"SELECT * FROM ({_SOURCE_ITEMS}) WHERE category != 'same'"
+
+# Soubory zdroje celkem (počet, velikost) - shodné = zdroj bez chybějících a konfliktních
+SOURCE_TOTALS_SQL = (
+    "SELECT COUNT(*), COALESCE(SUM(s.size), 0) "
+    f"FROM ({_SCAN_FILES}) s JOIN path_dirs d ON d.id = s.dir_id JOIN path_names n ON n.id = s.name_id "
+    f"WHERE {_NOT_IGNORED}"
+)
+CHANGED_SOURCE_TOTALS_SQL = (
+    "SELECT COUNT(*), COALESCE(SUM(source_size), 0) FROM diff_items "
+    "WHERE diff_id = ? AND category IN ('missing', 'conflict')"
+)
+STORED_SAME_TOTALS_SQL = (
+    "SELECT COUNT(*), COALESCE(SUM(source_size), 0) FROM diff_items WHERE diff_id = ? AND category = 'same'"
+)
+
+# Shodné soubory na vyžádání - průchod zdrojem v pořadí indexu ix_file_entries_scan_rel,
+# cíl dohledaný po cestě; duplicitní cesta jednou (řádek s nejmenším id jako v diffu)
+SAME_ITEMS_SQL = (
+    f"SELECT {PATH_SQL}, s.size, t.size, s.mtime_epoch, t.mtime_epoch "
+    "FROM file_entries s INDEXED BY ix_file_entries_scan_rel "
+    "JOIN file_entries t ON t.scan_id = ? AND t.rel_dir_id = s.rel_dir_id AND t.rel_name_id = s.rel_name_id "
+    "JOIN path_dirs d ON d.id = s.rel_dir_id JOIN path_names n ON n.id = s.rel_name_id "
+    "WHERE s.scan_id = ? AND s.rel_dir_id IS NOT NULL "
+    "AND s.id = (SELECT MIN(id) FROM file_entries WHERE scan_id = s.scan_id "
+    "AND rel_dir_id = s.rel_dir_id AND rel_name_id = s.rel_name_id) "
+    "AND t.id = (SELECT MIN(id) FROM file_entries WHERE scan_id = t.scan_id "
+    "AND rel_dir_id = t.rel_dir_id AND rel_name_id = t.rel_name_id) "
+    "AND s.size IS t.size "
+    f"AND NOT COALESCE(s.mtime_epoch AND t.mtime_epoch AND abs(s.mtime_epoch - t.mtime_epoch) > {MTIME_TOLERANCE}, 0) "
+    f"AND {_NOT_IGNORED} "
+    "ORDER BY s.rel_dir_id, s.rel_name_id LIMIT ? OFFSET ?"
+)
+
+# Soubory jen v cíli (anti join na zdroj)
+EXTRA_ITEMS_SQL = (
+    "INSERT INTO diff_items (diff_id, dir_id, name_id, category, source_size, target_size, source_mtime, target_mtime) "
+    "SELECT ?, t.dir_id, t.name_id, 'extra', NULL, t.size, NULL, t.mtime "
+    f"FROM ({_SCAN_FILES}) t JOIN path_dirs d ON d.id = t.dir_id JOIN path_names n ON n.id = t.name_id "
+    f"WHERE {_NOT_IGNORED} AND NOT EXISTS ("
+    "SELECT 1 FROM file_entries s WHERE s.scan_id = ? AND s.rel_dir_id = t.dir_id AND s.rel_name_id = t.name_id)"
+)
+
+# Počet a velikost položek po kategoriích - velikost zdroje, u extra (a nulové) velikost cíle
+CATEGORY_TOTALS_SQL = (
+    "SELECT category, COUNT(*), COALESCE(SUM(COALESCE(NULLIF(source_size, 0), target_size, 0)), 0) "
+    "FROM diff_items WHERE diff_id = ? GROUP BY category"
+)
+
+# --- Aktualizace diffu (IncrementalDiff) ---
+
+CHANGED_PATHS_TABLE_SQL = (
+    "CREATE TEMP TABLE IF NOT EXISTS diff_changed_paths (dir_id INTEGER, name_id INTEGER, PRIMARY KEY (dir_id, name_id))"
+)
+
+# Cesty změněné mezi starým a novým scanem strany - jen v jednom z nich, nebo jiná velikost /
+# mtime (jeden průchod indexem obou scanů, duplicitní cesta jednou jako v diffu)
+CHANGED_PATHS_SQL = (
+    "INSERT OR IGNORE INTO temp.diff_changed_paths (dir_id, name_id) SELECT dir_id, name_id FROM ("
+    "SELECT rel_dir_id AS dir_id, rel_name_id AS name_id, size, mtime_epoch AS mtime, MIN(id) "
+    "FROM file_entries WHERE scan_id IN (?, ?) AND rel_dir_id BETWEEN ? AND ? "
+    "GROUP BY scan_id, rel_dir_id, rel_name_id"
+    ") GROUP BY dir_id, name_id HAVING COUNT(*) = 1 OR MIN(size) != MAX(size) OR MIN(mtime) != MAX(mtime)"
+)
+
+# Položky původního diffu v rozsahu adresářů mimo změněné cesty
+COPY_BASE_ITEMS_SQL = (
+    _INSERT_ITEMS
+    + "SELECT ?, b.dir_id, b.name_id, b.category, b.source_size, b.target_size, b.source_mtime, b.target_mtime "
+    "FROM diff_items b WHERE b.diff_id = ? AND b.dir_id BETWEEN ? AND ? AND NOT EXISTS ("
+    "SELECT 1 FROM temp.diff_changed_paths c WHERE c.dir_id = b.dir_id AND c.name_id = b.name_id)"
+)
+
+# Soubor scanu na změněné cestě (duplicitní cesta - řádek s nejmenším id)
+_PATH_FILE = (
+    "file_entries {alias} ON {alias}.scan_id = ? AND {alias}.rel_dir_id = c.dir_id AND {alias}.rel_name_id = c.name_id "
+    "AND {alias}.id = (SELECT MIN(id) FROM file_entries WHERE scan_id = {alias}.scan_id "
+    "AND rel_dir_id = c.dir_id AND rel_name_id = c.name_id)"
+)
+
+# Zařazení změněných cest podle zdrojového a cílového scanu - stejná pravidla jako celý diff
+_CHANGED_PATH_ITEMS = (
+    "SELECT ? AS diff_id, c.dir_id AS dir_id, c.name_id AS name_id, "
+    "CASE WHEN s.id IS NULL THEN 'extra' "
+    "WHEN t.id IS NULL THEN 'missing' "
+    "WHEN s.size IS NOT t.size THEN 'conflict' "
+    f"WHEN s.mtime_epoch AND t.mtime_epoch AND abs(s.mtime_epoch - t.mtime_epoch) > {MTIME_TOLERANCE} THEN 'conflict' "
+    "ELSE 'same' END AS category, "
+    "s.size AS source_size, t.size AS target_size, s.mtime_epoch AS source_mtime, t.mtime_epoch AS target_mtime "
+    "FROM temp.diff_changed_paths c "
+    f"LEFT JOIN {_PATH_FILE.format(alias='s')} LEFT JOIN {_PATH_FILE.format(alias='t')} "
+    "JOIN path_dirs d ON d.id = c.dir_id JOIN path_names n ON n.id = c.name_id "
+    f"WHERE (s.id IS NOT NULL OR t.id IS NOT NULL) AND {_NOT_IGNORED}"
+)
+CHANGED_PATH_ITEMS_SQL = _INSERT_ITEMS + f"SELECT * FROM ({_CHANGED_PATH_ITEMS}) WHERE category != 'same' OR ?"
+
+# Shodné soubory mezi změněnými cestami (počet, velikost) - rozdíl oproti původnímu diffu
+CHANGED_PATH_SAME_SQL = (
+    f"SELECT COUNT(*), COALESCE(SUM(source_size), 0) FROM ({_CHANGED_PATH_ITEMS}) WHERE category = 'same'"
+)
+
+
+class SqlDiff:
+    """
+    Diff zdrojového a cílového scanu. load_dirs() načte počty souborů po adresářích,
+    chunks() z nich skládá rozsahy do velikosti, kterou určí volající (adaptivní blok
+    writeru), apply() zapíše položky jednoho rozsahu nad předaným spojením (bez commitu).
+    Shodné soubory zapisuje jen se store_same, jinak je sečte same_totals().
+    """
+
+    def __init__(self, diff_id: int, source_scan_id: int, target_scan_id: int, store_same: bool = False):
+        self.diff_id = diff_id
+        self.source_scan_id = source_scan_id
+        self.target_scan_id = target_scan_id
+        self.store_same = store_same
+        self._dir_counts: List[Tuple[int, int]] = []
+
+    def load_dirs(self, conn: sqlite3.Connection) -> int:
+        """Načte počty souborů po adresářích; vrací počet souborů obou scanů"""
+        self._dir_counts = [
+            (dir_id, count)
+            for dir_id, count in conn.execute(DIR_COUNTS_SQL, (self.source_scan_id, self.target_scan_id))
+            if dir_id is not None
+        ]
+        return sum(count for _, count in self._dir_counts)
+
+    def chunks(self, max_rows: Callable[[], int]) -> Iterator[Tuple[int, int, int]]:
+        """Rozsahy (první rel_dir_id, poslední rel_dir_id, souborů obou scanů); max_rows() se čte pro každý rozsah"""
+        first = None
+        rows = 0
+        limit = max_rows()
+        for dir_id, count in self._dir_counts:
+            if first is None:
+                first = dir_id
+            rows += count
+            if rows >= limit:
+                yield first, dir_id, rows
+                first = None
+                rows = 0
+                limit = max_rows()
+        if first is not None:
+            yield first, dir_id, rows
+
+    def apply(self, conn: sqlite3.Connection, first_dir_id: int, last_dir_id: int) -> int:
+        """Zapíše položky diffu pro adresáře v rozsahu; vrací počet položek"""
+        source = (self.source_scan_id, first_dir_id, last_dir_id)
+        target = (self.target_scan_id, first_dir_id, last_dir_id)
+        source_sql = SOURCE_ITEMS_SQL if self.store_same else CHANGED_ITEMS_SQL
+        inserted = conn.execute(source_sql, (self.diff_id,) + source + target).rowcount
+        inserted += conn.execute(EXTRA_ITEMS_SQL, (self.diff_id,) + target + (self.source_scan_id,)).rowcount
+        return inserted
+
+    def category_totals(self, conn: sqlite3.Connection) -> Dict[str, Tuple[int, int]]:
+        return category_totals(conn, self.diff_id)
+
+    def same_totals(self, conn: sqlite3.Connection) -> Tuple[int, int]:
+        """(počet, velikost) shodných souborů - po zapsání všech rozsahů"""
+        if self.store_same:
+            return tuple(conn.execute(STORED_SAME_TOTALS_SQL, (self.diff_id,)).fetchone())
+        if not self._dir_counts:
+            return 0, 0
+        source = (self.source_scan_id, self._dir_counts[0][0], self._dir_counts[-1][0])
+        source_count, source_size = conn.execute(SOURCE_TOTALS_SQL, source).fetchone()
+        changed_count, changed_size = conn.execute(CHANGED_SOURCE_TOTALS_SQL, (self.diff_id,)).fetchone()
+        return source_count - changed_count, source_size - changed_size
+
+
+class IncrementalDiff(SqlDiff):
+    """
+    Aktualizace diffu: nový diff ze staršího (base) a novějšího scanu jedné nebo obou
+    stran. Po rozsazích adresářů se porovná starý a nový scan změněné strany (index
+    ix_file_entries_scan_rel), položky base diffu mimo změněné cesty se zkopírují a
+    změněné cesty se zařadí znovu. Shodné soubory se počítají jako rozdíl oproti base.
+    """
+
+    def __init__(self, diff_id: int, base_diff_id: int, source_scan_id: int, target_scan_id: int,
+                 base_source_scan_id: int, base_target_scan_id: int, store_same: bool = False,
+                 base_same: Tuple[int, int] = (0, 0)):
+        super().__init__(diff_id, source_scan_id, target_scan_id, store_same)
+        self.base_diff_id = base_diff_id
+        self.base_source_scan_id = base_source_scan_id
+        self.base_target_scan_id = base_target_scan_id
+        self.base_same = base_same
+        # Změněné strany (starý scan, nový scan)
+        self.sides = [
+            (old, new) for old, new in ((base_source_scan_id, source_scan_id), (base_target_scan_id, target_scan_id))
+            if old != new
+        ]
+        # Výsledky rozsahů (změněných cest, rozdíl počtu a velikosti shodných) - opakovaný
+        # pokus o zápis rozsahu přepíše svůj záznam
+        self._ranges: Dict[Tuple[int, int], Tuple[int, int, int]] = {}
+
+    def load_dirs(self, conn: sqlite3.Connection) -> int:
+        """Počty řádků po adresářích - scany změněných stran a položky base diffu"""
+        conn.execute(CHANGED_PATHS_TABLE_SQL)
+        scan_ids = sorted({scan_id for side in self.sides for scan_id in side})
+        counts = conn.execute(
+            "SELECT dir_id, SUM(cnt) FROM ("
+            "SELECT rel_dir_id AS dir_id, COUNT(*) AS cnt FROM file_entries "
+            f"WHERE scan_id IN ({','.join('?' * len(scan_ids))}) GROUP BY rel_dir_id "
+            "UNION ALL SELECT dir_id, COUNT(*) FROM diff_items WHERE diff_id = ? GROUP BY dir_id"
+            ") GROUP BY dir_id ORDER BY dir_id",
+            scan_ids + [self.base_diff_id]
+        )
+        self._dir_counts = [(dir_id, count) for dir_id, count in counts if dir_id is not None]
+        return sum(count for _, count in self._dir_counts)
+
+    def apply(self, conn: sqlite3.Connection, first_dir_id: int, last_dir_id: int) -> int:
+        """Změněné cesty rozsahu do temp tabulky, převzetí položek base diffu a nové zařazení"""
+        conn.execute("DELETE FROM temp.diff_changed_paths")
+        for old_scan_id, new_scan_id in self.sides:
+            conn.execute(CHANGED_PATHS_SQL, (old_scan_id, new_scan_id, first_dir_id, last_dir_id))
+        changed = conn.execute("SELECT COUNT(*) FROM temp.diff_changed_paths").fetchone()[0]
+        
+        inserted = conn.execute(
+            COPY_BASE_ITEMS_SQL, (self.diff_id, self.base_diff_id, first_dir_id, last_dir_id)
+        ).rowcount
+        if not changed:
+            self._ranges[(first_dir_id, last_dir_id)] = (0, 0, 0)
+            return inserted
+        
+        scans = (self.source_scan_id, self.target_scan_id)
+        inserted += conn.execute(CHANGED_PATH_ITEMS_SQL, (self.diff_id,) + scans + (self.store_same,)).rowcount
+        new_count, new_size = conn.execute(CHANGED_PATH_SAME_SQL, (self.diff_id,) + scans).fetchone()
+        old_count, old_size = conn.execute(
+            CHANGED_PATH_SAME_SQL, (self.diff_id, self.base_source_scan_id, self.base_target_scan_id)
+        ).fetchone()
+        self._ranges[(first_dir_id, last_dir_id)] = (changed, new_count - old_count, new_size - old_size)
+        return inserted
+
+    def changed_paths(self) -> int:
+        return sum(changed for changed, _, _ in self._ranges.values())
+
+    def same_totals(self, conn: sqlite3.Connection) -> Tuple[int, int]:
+        if self.store_same:
+            return super().same_totals(conn)
+        return (
+            self.base_same[0] + sum(count for _, count, _ in self._ranges.values()),
+            self.base_same[1] + sum(size for _, _, size in self._ranges.values()),
+        )
+
+
+def category_totals(conn: sqlite3.Connection, diff_id: int) -> Dict[str, Tuple[int, int]]:
+    """{kategorie: (počet, velikost)} z uložených položek diffu - agregace v SQL"""
+    return {category: (count, size) for category, count, size in conn.execute(CATEGORY_TOTALS_SQL, (diff_id,))}
+
+
+def store_totals(diff, totals: Dict[str, Tuple[int, int]]):
+    """
+    Zapíše součty kategorií na Diff (<kategorie>_count / _size). Bez store_same musí
+    totals obsahovat i shodné soubory - v položkách nejsou.
+    """
+    for category in DIFF_CATEGORIES:
+        count, size = totals.get(category, (0, 0))
+        setattr(diff, f"{category}_count", count)
+        setattr(diff, f"{category}_size", size)
+
+
+def same_items(conn: sqlite3.Connection, source_scan_id: int, target_scan_id: int,
+               skip: int, limit: int) -> List[Tuple[str, int, int, float, float]]:
+    """Shodné soubory dvou scanů (cesta, velikosti, mtime) pro diff bez uložených 'same' položek"""
+    return conn.execute(SAME_ITEMS_SQL, (target_scan_id, source_scan_id, limit, skip)).fetchall()
@@ -0,0 +1,110 @@
+"""
+Kooperativní řízení běžících jobů - zrušení a pozastavení
+"""
+import logging
+import os
+import signal
+import subprocess
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PAUSE_POLL_INTERVAL = 1.0       # s - jak často pozastavený job kontroluje zrušení
+PROCESS_TERMINATE_TIMEOUT = 10  # s - po SIGTERM, pak SIGKILL
+
+
+class JobCancelled(Exception):
+    """Job zrušil uživatel - volající uloží dosavadní výsledky a skončí se stavem cancelled"""
+
+
+class JobControl:
+    """
+    Token jednoho běžícího jobu. Job (a adaptéry, kterým se předá) volá checkpoint()
+    v bezpečných bodech - mezi adresáři, bloky položek, dávkami. Pozastavený job
+    v checkpointu čeká, zrušený vyhodí JobCancelled. Připojený podproces (rsync)
+    se pozastaví signálem SIGSTOP, pokračuje SIGCONT a při zrušení se ukončí; signál jde
+    celé skupině procesů (rsync spuštěný se start_new_session i jeho ssh).
+    """
+
+    def __init__(self, kind: str, job_id: int):
+        self.kind = kind
+        self.job_id = job_id
+        self._cancelled = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._lock = threading.Lock()
+        self._process: Optional[subprocess.Popen] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._resumed.is_set()
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled.set()
+            # Probudit pozastavený job, aby zrušení zpracoval
+            self._resumed.set()
+            self._signal_process(signal.SIGCONT)
+            self._signal_process(signal.SIGTERM)
+
+    def pause(self):
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self._resumed.clear()
+            self._signal_process(signal.SIGSTOP)
+
+    def resume(self):
+        with self._lock:
+            self._resumed.set()
+            self._signal_process(signal.SIGCONT)
+
+    def checkpoint(self):
+        """Bezpečný bod jobu: při pauze čeká na pokračování, při zrušení vyhodí JobCancelled"""
+        while not self._resumed.wait(PAUSE_POLL_INTERVAL):
+            pass
+        if self._cancelled.is_set():
+            raise JobCancelled(f"{self.kind} {self.job_id} cancelled")
+
+    def attach_process(self, process: subprocess.Popen):
+        """Podproces jobu (rsync) - pauza a zrušení se na něj přenesou signálem"""
+        with self._lock:
+            self._process = process
+            if self._cancelled.is_set():
+                self._signal_process(signal.SIGTERM)
+            elif not self._resumed.is_set():
+                self._signal_process(signal.SIGSTOP)
+
+    def detach_process(self, process: subprocess.Popen):
+        with self._lock:
+            if self._process is process:
+                self._process = None
+
+    def wait_process(self, process: subprocess.Popen) -> int:
+        """wait() podprocesu; ukončený proces, který na SIGTERM nereaguje, se po timeoutu zabije"""
+        while True:
+            try:
+                return process.wait(timeout=PROCESS_TERMINATE_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                if self._cancelled.is_set():
+                    self._signal_process(signal.SIGKILL)
+
+    def _signal_process(self, sig):
+        process = self._process
+        if process is None or process.poll() is not None:
+            return
+        try:
+            # Vlastní skupina procesů (start_new_session) - signál dostanou i potomci
+            if os.getpgid(process.pid) == process.pid:
+                os.killpg(process.pid, sig)
+            else:
+                process.send_signal(sig)
+        except ProcessLookupError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to signal process {process.pid} of {self.kind} {self.job_id}: {e}")
@@ -2,21 +2,349 @@
 Background job runner pro asynchronní operace
 """
 import asyncio
+import queue
+import sqlite3
 import threading
-from typing import Dict, Optional, Callable
+import time
+from typing import Dict, Optional, Callable, Tuple
 from datetime import datetime
-from backend.database import JobRun, Scan, Diff, DiffItem, Batch, BatchItem, FileEntry as DBFileEntry, Dataset, JobFileStatus, JobFileStatus
+from backend.database import JobRun, Scan, Diff, DiffItem, Batch, BatchItem, FileEntry as DBFileEntry, Dataset, JobFileStatus, JobFileStatus, ScanDir
 from backend.storage_service import storage_service
 from backend.websocket_manager import websocket_manager
 from backend.adapters.factory import AdapterFactory
 from backend.adapters.base import FileEntry
+from backend.bulk_writer import BulkWriter
+from backend.diff_engine import DIFF_CHUNK_MAX, DIFF_CHUNK_MIN, IncrementalDiff, SqlDiff, store_totals
+from backend.file_records import FileRecords
+from backend.job_control import JobCancelled, JobControl
+from backend.scan_manifest import ScanManifest
+from backend.scan_tree import DirAggregator, load_dir_aggregates, write_dir_stats
 from backend.mount_service import mount_service
+from backend.path_dictionary import PathDictionary, join_path, register_path_functions
+from backend.utils import normalize_entry_path, normalize_root_rel_path
+
+# Scan pipeline - listing (vlákno scanu) -> omezená fronta -> writer vlákno (bulk INSERT do SQLite)
+SCAN_QUEUE_CHUNK = 256          # řádků v jedné zprávě fronty
+SCAN_QUEUE_MAX_CHUNKS = 64      # kapacita fronty (backpressure pro listing)
+SCAN_BATCH_MIN = 500            # adaptivní velikost commitu - dolní mez
+SCAN_BATCH_MAX = 20000          # horní mez
+SCAN_COMMIT_TARGET = 0.5        # cílová doba jednoho commitu (s)
+SCAN_FLUSH_INTERVAL = 2.0       # nejdelší doba mezi commity při pomalém listingu (s)
+PROGRESS_INTERVAL = 0.5         # min. interval mezi progress broadcasty (s)
+
+# Velikost scanu s hardlinky započítanými jednou (data jednoho inode jsou na disku jen jednou)
+SCAN_UNIQUE_SIZE_SQL = (
+    "SELECT COALESCE(SUM(size), 0) FROM ("
+    "SELECT size FROM file_entries WHERE scan_id = ? AND inode IS NULL "
+    "UNION ALL SELECT MAX(size) FROM file_entries WHERE scan_id = ? AND inode IS NOT NULL GROUP BY dev, inode)"
+)
+
+
+class _ScanWriter:
+    """
+    Writer vlákno scanu: z omezené fronty bere řádky file_entries / scan_dirs a
+    převzaté adresáře (inkrementální scan) a zapisuje je přes vlastní sqlite3
+    spojení. Velikost commitu se přizpůsobuje podle doby zápisu (USB disk).
+    """
+    
+    INSERT_SQL = (
+        "INSERT INTO file_entries (scan_id, dir_id, name_id, rel_dir_id, rel_name_id, size, mtime_epoch, root_rel_path, "
+        "fingerprint, inode, dev, nlink) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    DIR_INSERT_SQL = (
+        "INSERT INTO scan_dirs (scan_id, rel_path, mtime_epoch, inode, child_count, fs_name, complete) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)"
+    )
+    # Převzetí souborů přímo v adresáři z předchozího scanu - rozsah přes index (scan_id, dir_id, name_id)
+    REUSE_SQL = (
+        "INSERT INTO file_entries (scan_id, dir_id, name_id, rel_dir_id, rel_name_id, size, mtime_epoch, root_rel_path, "
+        "fingerprint, inode, dev, nlink) "
+        "SELECT ?, f.dir_id, f.name_id, f.rel_dir_id, f.rel_name_id, f.size, f.mtime_epoch, f.root_rel_path, "
+        "f.fingerprint, f.inode, f.dev, f.nlink "
+        "FROM file_entries f JOIN path_names n ON n.id = f.name_id "
+        "WHERE f.scan_id = ? AND f.dir_id = ? AND NOT is_excluded(?, n.name)"
+    )
+    
+    # Hotový adresář (1 = jeho soubory, 2 = celý podstrom) a jeho podadresáře jako čekající
+    CHECKPOINT_DONE_SQL = (
+        "INSERT INTO scan_checkpoints (scan_id, root_rel, dir_path, rel_path, done) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(scan_id, rel_path) DO UPDATE SET done = excluded.done"
+    )
+    CHECKPOINT_PENDING_SQL = "INSERT OR IGNORE INTO scan_checkpoints (scan_id, root_rel, dir_path, rel_path, done) VALUES (?, ?, ?, ?, 0)"
+    # Nově spočítané otisky do cache datasetu (fingerprint režim)
+    HASH_CACHE_SQL = (
+        "INSERT INTO file_hash_cache (dataset_id, path, size, mtime_epoch, fingerprint) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(dataset_id, path) DO UPDATE SET size = excluded.size, mtime_epoch = excluded.mtime_epoch, "
+        "fingerprint = excluded.fingerprint"
+    )
+    
+    def __init__(self, db_path: str, scan_id: int, base_scan_id: Optional[int], exclude,
+                 log_cb: Optional[Callable[[str], None]] = None, dataset_id: Optional[int] = None, fingerprinter=None,
+                 dataset_root: str = ""):
+        self.db_path = db_path
+        self.scan_id = scan_id
+        self.base_scan_id = base_scan_id
+        self.exclude = exclude
+        self.dataset_root = dataset_root  # normalizovaný první root datasetu (soubory bez root_rel_path)
+        self.log_cb = log_cb
+        self.dataset_id = dataset_id
+        self.fingerprinter = fingerprinter
+        self.paths = PathDictionary()
+        self.queue: "queue.Queue" = queue.Queue(maxsize=SCAN_QUEUE_MAX_CHUNKS)
+        self.batch_size = SCAN_BATCH_MIN
+        self.error: Optional[BaseException] = None
+        self._aborted = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Buffery na straně producenta (posílají se po SCAN_QUEUE_CHUNK)
+        self._files: list = []
+        self._dirs: list = []
+        self._reused: list = []
+        self._checkpoints: list = []
+        self.stats = {
+            "rows_written": 0,
+            "reused_rows": 0,
+            "dir_rows": 0,
+            "checkpoints": 0,
+            "cached_fingerprints": 0,
+            "commits": 0,
+            "commit_time": 0.0,
+            "max_batch": 0,
+            "records_lost": 0,
+            "commit_failures": 0,
+            "producer_blocked": 0.0,
+            "writer_idle": 0.0,
+            "started": 0.0,
+            "finished": 0.0,
+        }
+    
+    # --- producent (vlákno scanu) ---
+    
+    def start(self):
+        self.stats["started"] = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f"scan-writer-{self.scan_id}", daemon=True)
+        self._thread.start()
+    
+    def add_file(self, row: tuple):
+        self._files.append(row)
+        if len(self._files) >= SCAN_QUEUE_CHUNK:
+            self._send()
+    
+    def add_dir(self, row: tuple):
+        self._dirs.append(row)
+        if len(self._dirs) >= SCAN_QUEUE_CHUNK:
+            self._send()
+    
+    def add_reused_dir(self, rel_path: str):
+        self._reused.append(rel_path)
+        if len(self._reused) >= SCAN_QUEUE_CHUNK:
+            self._send()
+    
+    def add_checkpoint(self, root_rel: str, dir_path: str, rel_path: str, subdirs: list, subtree: bool):
+        """Adresář je hotový - zapíše se ve stejné transakci jako jeho soubory (nebo později)"""
+        self._checkpoints.append((root_rel, dir_path, rel_path, subdirs, subtree))
+        if len(self._checkpoints) >= SCAN_QUEUE_CHUNK:
+            self._send()
+    
+    def _send(self):
+        # Jedna zpráva nese všechny buffery - checkpoint nikdy nepředběhne soubory svého adresáře
+        if self._files or self._dirs or self._reused or self._checkpoints:
+            self._put((self._files, self._dirs, self._reused, self._checkpoints))
+            self._files, self._dirs, self._reused, self._checkpoints = [], [], [], []
+    
+    def close(self):
+        """Odešle zbytek bufferů, počká na dopsání a vyhodí chybu writeru, pokud nastala"""
+        self._send()
+        self._put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise Exception(f"Scan writer failed: {self.error}")
+    
+    def abort(self):
+        """Ukončí writer bez dopsání fronty (chyba scanu)"""
+        self._aborted.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+    
+    def _put(self, item):
+        # Blokující put = backpressure; writer, který spadl, nesmí producenta zablokovat navždy
+        started = time.monotonic()
+        while True:
+            if self.error is not None or not self._thread.is_alive():
+                raise Exception(f"Scan writer stopped: {self.error}")
+            try:
+                self.queue.put(item, timeout=1.0)
+                break
+            except queue.Full:
+                continue
+        self.stats["producer_blocked"] += time.monotonic() - started
+    
+    def summary(self) -> str:
+        st = self.stats
+        elapsed = (st["finished"] or time.monotonic()) - st["started"]
+        rows = st["rows_written"]
+        return (
+            f"Writer stage: {rows} rows in {st['commits']} commits "
+            f"({rows / elapsed if elapsed else 0:.0f} rows/s), "
+            f"commit time {st['commit_time']:.1f}s, max batch {st['max_batch']}, "
+            f"reused {st['reused_rows']}, dirs {st['dir_rows']}, idle {st['writer_idle']:.1f}s"
+        )
+    
+    # --- writer vlákno ---
+    
+    def _run(self):
+        conn = None
+        files: list = []
+        dirs: list = []
+        reused: list = []
+        checkpoints: list = []
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            # Převzaté soubory se filtrují aktuálními výjimkami (výjimky datasetu se mohly změnit)
+            exclude = self.exclude
+            conn.create_function("is_excluded", 2, lambda d, n: 1 if exclude.matches(join_path(d, n)) else 0, deterministic=True)
+            
+            last_flush = time.monotonic()
+            while not self._aborted.is_set():
+                waited = time.monotonic()
+                try:
+                    item = self.queue.get(timeout=0.5)
+                except queue.Empty:
+                    item = ()
+                self.stats["writer_idle"] += time.monotonic() - waited
+                
+                if item is None:
+                    self._flush(conn, files, dirs, reused, checkpoints, "Final batch committed")
+                    break
+                if item:
+                    files.extend(item[0])
+                    dirs.extend(item[1])
+                    reused.extend(item[2])
+                    checkpoints.extend(item[3])
+                
+                pending = files or dirs or reused or checkpoints
+                if (len(files) >= self.batch_size or len(dirs) >= self.batch_size or len(reused) >= 100
+                        or len(checkpoints) >= self.batch_size
+                        or (pending and time.monotonic() - last_flush >= SCAN_FLUSH_INTERVAL)):
+                    self._flush(conn, files, dirs, reused, checkpoints)
+                    files, dirs, reused, checkpoints = [], [], [], []
+                    last_flush = time.monotonic()
+        except Exception as e:
+            self.error = e
+            if self.log_cb:
+                self.log_cb(f"ERROR: Scan writer failed: {e}")
+        finally:
+            self.stats["finished"] = time.monotonic()
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+    
+    def _flush(self, conn, rows: list, dir_rows: list, reuse_dirs: list, checkpoints: list, final_msg: Optional[str] = None):
+        """Jeden commit s retry; velikost dalšího batche podle doby commitu"""
+        hash_rows = [(self.dataset_id,) + row for row in self.fingerprinter.drain()] if self.fingerprinter else []
+        if not rows and not dir_rows and not reuse_dirs and not checkpoints and not hash_rows:
+            return
+        for attempt in range(3):
+            started = time.monotonic()
+            try:
+                if rows:
+                    # Cesty na ID slovníku až ve writeru - listing vlákno tím nezdržuje; spolu s nimi
+                    # i normalizovaná cesta, podle které diff a copy soubory párují
+                    rel_paths = [normalize_entry_path(row[1], row[4], self.dataset_root) for row in rows]
+                    path_ids = self.paths.ids_many(conn, [row[1] for row in rows] + rel_paths)
+                    conn.executemany(self.INSERT_SQL, [
+                        (row[0],) + ids + rel_ids + row[2:]
+                        for row, ids, rel_ids in zip(rows, path_ids, path_ids[len(rows):])
+                    ])
+                if dir_rows:
+                    conn.executemany(self.DIR_INSERT_SQL, dir_rows)
+                reused_files = 0
+                for rel_dir in reuse_dirs:
+                    cur = conn.execute(self.REUSE_SQL, (self.scan_id, self.base_scan_id, self.paths.dir_id(conn, rel_dir), rel_dir))
+                    reused_files += max(cur.rowcount, 0)
+                if checkpoints:
+                    done_rows = []
+                    pending_rows = []
+                    for root_rel, dir_path, rel_path, subdirs, subtree in checkpoints:
+                        done_rows.append((self.scan_id, root_rel, dir_path, rel_path, 2 if subtree else 1))
+                        pending_rows.extend((self.scan_id, root_rel, child_path, child_rel) for child_path, child_rel in subdirs)
+                    conn.executemany(self.CHECKPOINT_DONE_SQL, done_rows)
+                    if pending_rows:
+                        conn.executemany(self.CHECKPOINT_PENDING_SQL, pending_rows)
+                if hash_rows:
+                    conn.executemany(self.HASH_CACHE_SQL, hash_rows)
+                conn.commit()
+            except Exception as e:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                self.paths.reset()
+                if attempt < 2:
+                    if self.log_cb:
+                        self.log_cb(f"WARNING: Batch insert attempt {attempt+1} failed ({e}), retrying...")
+                    time.sleep(0.5)
+                    continue
+                self.stats["commit_failures"] += 1
+                self.stats["records_lost"] += len(rows)
+                if self.log_cb:
+                    self.log_cb(f"ERROR: Batch insert failed after 3 attempts, {len(rows)} records LOST: {e}")
+                    if reuse_dirs:
+                        self.log_cb(f"ERROR: {len(reuse_dirs)} unchanged directories were not copied from scan {self.base_scan_id}")
+                return
+            
+            duration = time.monotonic() - started
+            st = self.stats
+            st["rows_written"] += len(rows)
+            st["reused_rows"] += reused_files
+            st["dir_rows"] += len(dir_rows)
+            st["checkpoints"] += len(checkpoints)
+            st["cached_fingerprints"] += len(hash_rows)
+            st["commits"] += 1
+            st["commit_time"] += duration
+            st["max_batch"] = max(st["max_batch"], len(rows))
+            
+            # Adaptivní batch - rychlý disk => větší commity, pomalý => menší (kratší blokování fronty)
+            if duration < SCAN_COMMIT_TARGET / 2 and len(rows) >= self.batch_size:
+                self.batch_size = min(self.batch_size * 2, SCAN_BATCH_MAX)
+            elif duration > SCAN_COMMIT_TARGET * 2:
+                self.batch_size = max(self.batch_size // 2, SCAN_BATCH_MIN)
+            
+            if self.log_cb:
+                written = st["rows_written"] + st["reused_rows"]
+                if final_msg:
+                    self.log_cb(f"{final_msg}, {written} files total")
+                elif st["commits"] % 20 == 0:
+                    self.log_cb(f"Committed {written} files so far (batch size {self.batch_size})...")
+            return
+
+
+# Hromadné zápisy výsledků jobů (BulkWriter)
+BATCH_ITEM_INSERT_SQL = (
+    "INSERT INTO batch_items (batch_id, dir_id, name_id, size, category, enabled, hardlink_of) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+JOB_FILE_STATUS_INSERT_SQL = (
+    "INSERT INTO job_file_statuses (job_id, dir_id, name_id, file_size, status, error_message, copied_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+# Tabulka se stavem jobu podle druhu (pauza / pokračování přepíná running <-> paused)
+JOB_STATUS_MODELS = {"scan": Scan, "diff": Diff, "batch": Batch, "copy": JobRun}
+
 
 class JobRunner:
     """Spouští background joby"""
     
     def __init__(self):
         self.running_jobs: Dict[int, threading.Thread] = {}
+        # Tokeny pro zrušení / pauzu běžících jobů - klíč (druh, id), ID různých druhů se překrývají
+        self._controls: Dict[Tuple[str, int], JobControl] = {}
         self._lock = threading.Lock()
     
     def _register_job(self, job_id: int, thread: threading.Thread):
@@ -32,8 +360,80 @@ class JobRunner:
             thread = self.running_jobs.get(job_id)
             return thread is not None and thread.is_alive()
     
-    async def run_scan(self, scan_id: int, dataset_id: int):
-        """Spustí scan job"""
+    def _create_control(self, kind: str, job_id: int) -> JobControl:
+        control = JobControl(kind, job_id)
+        with self._lock:
+            self._controls[(kind, job_id)] = control
+        return control
+    
+    def _drop_control(self, kind: str, job_id: int):
+        with self._lock:
+            self._controls.pop((kind, job_id), None)
+    
+    def get_control(self, kind: str, job_id: int) -> Optional[JobControl]:
+        with self._lock:
+            return self._controls.get((kind, job_id))
+    
+    def cancel_job(self, kind: str, job_id: int) -> bool:
+        """Požádá běžící job o zrušení (job uloží dosavadní výsledky). False = job neběží."""
+        control = self.get_control(kind, job_id)
+        if control is None:
+            return False
+        control.cancel()
+        return True
+    
+    async def pause_job(self, kind: str, job_id: int) -> bool:
+        """Pozastaví běžící job v nejbližším bezpečném bodě (rsync hned). False = job neběží."""
+        control = self.get_control(kind, job_id)
+        if control is None or control.cancelled:
+            return False
+        control.pause()
+        self._switch_status(kind, job_id, "running", "paused")
+        await websocket_manager.broadcast({
+            "type": "job.paused",
+            "data": {"job_id": job_id, "type": kind}
+        })
+        return True
+    
+    async def resume_job(self, kind: str, job_id: int) -> bool:
+        """Pozastavený job pokračuje. False = job neběží."""
+        control = self.get_control(kind, job_id)
+        if control is None:
+            return False
+        control.resume()
+        self._switch_status(kind, job_id, "paused", "running")
+        await websocket_manager.broadcast({
+            "type": "job.resumed",
+            "data": {"job_id": job_id, "type": kind}
+        })
+        return True
+    
+    async def control_job(self, kind: str, job_id: int, action: str) -> bool:
+        """cancel / pause / resume podle akce z API. False = job neběží."""
+        if action == "cancel":
+            return self.cancel_job(kind, job_id)
+        if action == "pause":
+            return await self.pause_job(kind, job_id)
+        return await self.resume_job(kind, job_id)
+    
+    def _switch_status(self, kind: str, job_id: int, from_status: str, to_status: str):
+        """Podmíněná změna stavu - job, který mezitím skončil, se nepřepíše"""
+        session = storage_service.get_session()
+        if not session:
+            return
+        model = JOB_STATUS_MODELS[kind]
+        try:
+            session.query(model).filter(model.id == job_id, model.status == from_status).update(
+                {model.status: to_status}, synchronize_session=False
+            )
+            session.commit()
+        except Exception:
+            session.rollback()
+        finally:
+            session.close()
+    
+    async def run_scan(self, scan_id: int, dataset_id: int, resume: bool = False):
+        """Spustí scan job (resume=True pokračuje přerušený scan od checkpointů)"""
         def scan_thread():
             session = storage_service.get_session()
             if not session:
@@ -82,10 +482,57 @@ class JobRunner:
                 # Vytvoření adapteru
                 adapter = AdapterFactory.create_scan_adapter(dataset, dataset.location)
                 
+                # Výchozí výjimky + výjimky datasetu, zkompilované jednou pro celý scan
+                from backend.config import DEFAULT_EXCLUDE_PATTERNS, compile_exclude_patterns
+                dataset_patterns = (dataset.scan_adapter_config or {}).get("exclude_patterns") or []
+                exclude = compile_exclude_patterns(tuple(DEFAULT_EXCLUDE_PATTERNS + list(dataset_patterns)))
+                
+                # Inkrementální scan - index adresářů z posledního dokončeného scanu datasetu
+                dir_index = None
+                base_scan_id = None
+                exclude_changed_scan_id = None
+                if scan.incremental and dataset.scan_adapter_type == "local":
+                    dir_index, base_scan_id = self._load_dir_index(session, scan_id, dataset_id)
+                    # Jiné výjimky než v předchozím scanu - plný scan
+                    if dir_index is not None and not dir_index.same_exclude(exclude):
+                        exclude_changed_scan_id = base_scan_id
+                        dir_index, base_scan_id = None, None
+                    scan.base_scan_id = base_scan_id
+                # Výjimky scanu - podle nich se pozná, zda z něj může vycházet inkrementální scan
+                scan.exclude_patterns = list(exclude.patterns)
+                try:
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                
+                # SSH agent - vzdálený skript vrátí jen změny proti poslednímu dokončenému scanu datasetu
+                agent_manifest = None
+                if (dataset.scan_adapter_type == "ssh" and not resume
+                        and (dataset.scan_adapter_config or {}).get("scan_mode") == "agent"):
+                    previous = session.query(Scan).filter(
+                        Scan.dataset_id == dataset_id,
+                        Scan.id != scan_id,
+                        Scan.status == "completed"
+                    ).order_by(Scan.created_at.desc()).first()
+                    if previous:
+                        agent_manifest = ScanManifest(storage_service.db_path, previous.id)
+                        scan.base_scan_id = previous.id
+                        try:
+                            session.commit()
+                        except Exception:
+                            session.rollback()
+                
                 # Callbacky – log_cb also accumulates messages for DB storage
                 scan_log_lines = []
 
+                # Progress se posílá nejvýš jednou za PROGRESS_INTERVAL - broadcast pro každý soubor brzdí listing
+                last_progress = [0.0]
+                
                 def progress_cb(count: int, path: str):
+                    now = time.monotonic()
+                    if now - last_progress[0] < PROGRESS_INTERVAL:
+                        return
+                    last_progress[0] = now
                     asyncio.run(websocket_manager.broadcast({
                         "type": "job.progress",
                         "data": {"job_id": scan_id, "type": "scan", "count": count, "path": path}
@@ -98,99 +545,192 @@ class JobRunner:
                         "data": {"job_id": scan_id, "type": "scan", "message": message}
                     }))
                 
-                # Spuštění scanu – dedicated sqlite3 connection for bulk inserts
+                # Spuštění scanu – listing (toto vlákno) a zápis do DB (writer vlákno) propojené omezenou frontou
                 import sqlite3
                 total_files = 0
                 total_size = 0.0
-                BATCH_SIZE = 500
-                batch_buffer = []
-                commit_failures = 0
-                records_lost = 0
                 iteration_completed = False
+                writer = None
+                fingerprinter = None
                 
                 if log_cb:
                     log_cb(f"Starting scan for dataset {dataset_id}, roots: {dataset.roots}")
+                    if scan.incremental:
+                        if base_scan_id:
+                            log_cb(f"Incremental scan based on scan {base_scan_id} ({len(dir_index.dirs)} directories indexed)")
+                        elif exclude_changed_scan_id:
+                            log_cb(f"Incremental scan: exclude patterns changed since scan {exclude_changed_scan_id}, running full scan")
+                        elif dataset.scan_adapter_type != "local":
+                            log_cb(f"Incremental scan is not supported for {dataset.scan_adapter_type} adapter, running full scan")
+                        else:
+                            log_cb("Incremental scan: no previous completed scan with directory index, running full scan")
+                    if agent_manifest is not None:
+                        log_cb(f"Remote agent scan based on scan {agent_manifest.base_scan_id}")
                 
                 db_path = storage_service.db_path
-                bulk_conn = sqlite3.connect(db_path, timeout=30)
-                bulk_conn.execute("PRAGMA journal_mode=WAL")
-                bulk_conn.execute("PRAGMA synchronous=NORMAL")
-                bulk_conn.execute("PRAGMA busy_timeout=10000")
-                INSERT_SQL = "INSERT INTO file_entries (scan_id, full_rel_path, size, mtime_epoch, root_rel_path) VALUES (?, ?, ?, ?, ?)"
-                
-                def _flush_batch(force_msg=None):
-                    """Flush batch_buffer to DB via dedicated sqlite3 connection with retry."""
-                    nonlocal batch_buffer, commit_failures, records_lost
-                    if not batch_buffer:
-                        return
-                    rows = batch_buffer
-                    batch_buffer = []
-                    for attempt in range(3):
-                        try:
-                            bulk_conn.executemany(INSERT_SQL, rows)
-                            bulk_conn.commit()
-                            if force_msg and log_cb:
-                                log_cb(force_msg)
-                            return
-                        except Exception as e:
-                            try:
-                                bulk_conn.rollback()
-                            except Exception:
-                                pass
-                            if attempt < 2:
-                                if log_cb:
-                                    log_cb(f"WARNING: Batch insert attempt {attempt+1} failed ({e}), retrying...")
-                                import time
-                                time.sleep(0.5)
-                            else:
-                                commit_failures += 1
-                                records_lost += len(rows)
-                                if log_cb:
-                                    log_cb(f"ERROR: Batch insert failed after 3 attempts, {len(rows)} records LOST: {e}")
+                
+                # Pokračování přerušeného scanu - ponechat soubory hotových adresářů, zbytek projít znovu
+                resume_plan = None
+                if resume:
+                    resume_plan, kept_files = self._prepare_resume(db_path, scan_id, log_cb)
+                    total_files = kept_files
+                
+                # Fingerprint režim - otisky obsahu s cache podle (cesta, velikost, mtime)
+                if (dataset.scan_adapter_config or {}).get("fingerprint"):
+                    from backend.adapters.fingerprint import FingerprintCache, Fingerprinter
+                    hash_cache = FingerprintCache(db_path, dataset_id)
+                    if log_cb:
+                        log_cb(f"Fingerprint mode: {hash_cache.count()} cached fingerprints")
+                    fingerprinter = Fingerprinter(hash_cache)
+                
+                writer = _ScanWriter(db_path, scan_id, base_scan_id, exclude, log_cb,
+                                     dataset_id=dataset_id, fingerprinter=fingerprinter,
+                                     dataset_root=normalize_root_rel_path(dataset.roots[0]) if dataset.roots else "")
+                writer.start()
+                
+                # Stav adresářů (scan_dirs) a nezměněné adresáře k převzetí z předchozího scanu
+                def dir_cb(state, reused: bool):
+                    writer.add_dir((
+                        scan_id,
+                        state.rel_path,
+                        state.mtime_epoch,
+                        state.inode,
+                        state.child_count,
+                        state.fs_name,
+                        state.complete,
+                    ))
+                    if reused:
+                        writer.add_reused_dir(state.rel_path)
                 
                 try:
-                    from backend.config import DEFAULT_EXCLUDE_PATTERNS, match_exclude_pattern
-                    exclude_patterns = DEFAULT_EXCLUDE_PATTERNS.copy()
+                    file_iterator = adapter.list_files(
+                        dataset.roots, progress_cb, log_cb,
+                        dir_cb=dir_cb, dir_index=dir_index, exclude=exclude,
+                        checkpoint_cb=writer.add_checkpoint, resume=resume_plan,
+                        fingerprinter=fingerprinter, manifest=agent_manifest, control=control
+                    )
                     
-                    file_iterator = adapter.list_files(dataset.roots, progress_cb, log_cb)
+                    # Souhrny adresářů za běhu - převzaté soubory (inkrementální scan, resume, agent) listingem
+                    # neprojdou, tam se souhrny spočítají na konci z DB
+                    dir_aggregates = DirAggregator() if not (base_scan_id or resume or agent_manifest) else None
                     
+                    listing_started = time.monotonic()
+                    listed_before = total_files
+                    seen_inodes = set()
+                    hardlinked_files = 0
+                    shared_size = 0
                     for file_entry in file_iterator:
-                        if match_exclude_pattern(file_entry.full_rel_path, exclude_patterns):
+                        if exclude.matches(file_entry.full_rel_path):
                             continue
                         
-                        batch_buffer.append((
+                        writer.add_file((
                             scan_id,
                             file_entry.full_rel_path,
                             file_entry.size,
                             file_entry.mtime_epoch,
                             file_entry.root_rel_path,
+                            file_entry.fingerprint,
+                            file_entry.inode,
+                            file_entry.dev,
+                            file_entry.nlink,
                         ))
                         total_files += 1
-                        total_size += file_entry.size
-                        
-                        if len(batch_buffer) >= BATCH_SIZE:
-                            _flush_batch(f"Committed {total_files} files so far...")
+                        counted_size = file_entry.size
+                        if file_entry.inode is not None:
+                            # Hardlink - velikost inode jen jednou
+                            link_key = (file_entry.dev, file_entry.inode)
+                            hardlinked_files += 1
+                            if link_key in seen_inodes:
+                                shared_size += file_entry.size
+                                counted_size = 0
+                            else:
+                                seen_inodes.add(link_key)
+                        total_size += counted_size
+                        if dir_aggregates is not None:
+                            dir_aggregates.add(file_entry.full_rel_path, counted_size, file_entry.mtime_epoch)
+                    listing_elapsed = time.monotonic() - listing_started
+                    if fingerprinter is not None:
+                        fingerprinter.close()
                     
-                    # Final batch
-                    _flush_batch(f"Final batch committed, {total_files} files total")
+                    # Dopsat zbytek fronty a počkat na writer
+                    writer.close()
                     
-                    iteration_completed = True
+                    if log_cb:
+                        listed = total_files - listed_before
+                        log_cb(
+                            f"Listing stage: {listed} files in {listing_elapsed:.1f}s "
+                            f"({listed / listing_elapsed if listing_elapsed else 0:.0f} files/s), "
+                            f"blocked by writer {writer.stats['producer_blocked']:.1f}s"
+                        )
+                        log_cb(writer.summary())
+                        if fingerprinter is not None:
+                            log_cb(fingerprinter.summary())
+                        if hardlinked_files:
+                            log_cb(
+                                f"Hardlinks: {hardlinked_files} files share {len(seen_inodes)} inodes, "
+                                f"{shared_size / (1024**3):.2f} GB counted once"
+                            )
                     
-                    # Close dedicated bulk connection
-                    try:
-                        bulk_conn.close()
-                    except Exception:
-                        pass
+                    # Soubory převzaté z předchozího scanu se počítají do celkového počtu
+                    total_files += writer.stats["reused_rows"]
+                    records_lost = writer.stats["records_lost"]
+                    commit_failures = writer.stats["commit_failures"]
                     
                     # Verify actual DB record count via fresh sqlite3 connection
                     verify_conn = sqlite3.connect(db_path, timeout=10)
-                    db_count = verify_conn.execute(
-                        "SELECT COUNT(*) FROM file_entries WHERE scan_id = ?", (scan_id,)
-                    ).fetchone()[0]
-                    verify_conn.close()
+                    try:
+                        if agent_manifest is not None:
+                            # Nezměněné soubory rootů, které agent prošel, z předchozího scanu. Bez nich
+                            # scan drží jen změny - chyba scan ukončí jako failed (resume rooty projde znovu)
+                            try:
+                                agent_copied = agent_manifest.apply(verify_conn, scan_id, exclude)
+                                verify_conn.commit()
+                            except Exception as apply_error:
+                                verify_conn.rollback()
+                                raise Exception(
+                                    f"Remote agent: taking unchanged files from scan {agent_manifest.base_scan_id} failed: {apply_error}"
+                                ) from apply_error
+                            total_files += agent_copied
+                            if log_cb:
+                                log_cb(
+                                    f"Remote agent: {agent_copied} unchanged files taken from scan {agent_manifest.base_scan_id}, "
+                                    f"{len(agent_manifest.removed)} removed"
+                                )
+                        db_count = verify_conn.execute(
+                            "SELECT COUNT(*) FROM file_entries WHERE scan_id = ?", (scan_id,)
+                        ).fetchone()[0]
+                        db_size = verify_conn.execute(SCAN_UNIQUE_SIZE_SQL, (scan_id, scan_id)).fetchone()[0]
+                        # Souhrny adresářů pro strom scanu
+                        if dir_aggregates is None:
+                            dir_aggregates = load_dir_aggregates(verify_conn, scan_id)
+                        dir_stats_count = write_dir_stats(verify_conn, scan_id, dir_aggregates)
+                        # Scan je kompletní - checkpointy už nejsou potřeba
+                        verify_conn.execute("DELETE FROM scan_checkpoints WHERE scan_id = ?", (scan_id,))
+                        if fingerprinter is not None:
+                            # Cache jen pro soubory, které v datasetu ještě existují
+                            register_path_functions(verify_conn)
+                            verify_conn.execute(
+                                "DELETE FROM file_hash_cache WHERE dataset_id = ? AND NOT EXISTS ("
+                                "SELECT 1 FROM file_entries f JOIN path_dirs d ON d.id = f.dir_id JOIN path_names n ON n.id = f.name_id "
+                                "WHERE f.scan_id = ? AND d.path = path_dir(file_hash_cache.path) AND n.name = path_name(file_hash_cache.path))",
+                                (dataset_id, scan_id)
+                            )
+                        verify_conn.commit()
+                    finally:
+                        verify_conn.close()
+                    
+                    # Scan je v DB kompletní až teď - chyba kteréhokoli kroku výše (souhrny adresářů,
+                    # převzetí souborů agentem, checkpointy, cache otisků) musí scan označit jako failed,
+                    # ne ho nechat "running"
+                    iteration_completed = True
+                    
+                    # Velikost převzatých adresářů a souborů z přerušeného běhu zná jen DB
+                    if base_scan_id or resume or agent_manifest is not None:
+                        total_size = float(db_size)
                     
                     if log_cb:
                         log_cb(f"DB verification: counter={total_files}, db_records={db_count}, lost={records_lost}, commit_failures={commit_failures}")
+                        log_cb(f"Directory aggregates: {dir_stats_count} directories")
                     
                     if db_count != total_files:
                         if log_cb:
@@ -263,11 +803,38 @@ class JobRunner:
                     except Exception as broadcast_error:
                         if log_cb:
                             log_cb(f"Failed to broadcast job.finished: {broadcast_error}")
-                except Exception as scan_error:
+                except JobCancelled:
+                    # Zrušení uživatelem - dopsat frontu (soubory i checkpointy hotových adresářů),
+                    # scan zůstane "cancelled" a lze ho dokončit přes resume
+                    if fingerprinter is not None:
+                        fingerprinter.close()
+                    writer.close()
+                    verify_conn = sqlite3.connect(db_path, timeout=10)
                     try:
-                        bulk_conn.close()
-                    except Exception:
-                        pass
+                        db_count = verify_conn.execute(
+                            "SELECT COUNT(*) FROM file_entries WHERE scan_id = ?", (scan_id,)
+                        ).fetchone()[0]
+                        db_size = verify_conn.execute(SCAN_UNIQUE_SIZE_SQL, (scan_id, scan_id)).fetchone()[0]
+                    finally:
+                        verify_conn.close()
+                    if log_cb:
+                        log_cb(f"Scan cancelled: {db_count} files saved, {writer.stats['checkpoints']} directories checkpointed")
+                    session.rollback()
+                    scan = session.query(Scan).filter(Scan.id == scan_id).first()
+                    scan.total_files = db_count
+                    scan.total_size = float(db_size)
+                    scan.status = "cancelled"
+                    scan.error_message = "\n".join(scan_log_lines[-500:])
+                    session.commit()
+                    asyncio.run(websocket_manager.broadcast({
+                        "type": "job.finished",
+                        "data": {"job_id": scan_id, "type": "scan", "status": "cancelled"}
+                    }))
+                except Exception as scan_error:
+                    if writer is not None:
+                        writer.abort()
+                    if fingerprinter is not None:
+                        fingerprinter.close()
                     if log_cb:
                         log_cb(f"Error during scan: {scan_error}")
                     if not iteration_completed:
@@ -275,7 +842,10 @@ class JobRunner:
                 
             except Exception as e:
                 try:
-                    bulk_conn.close()
+                    if writer is not None:
+                        writer.abort()
+                    if fingerprinter is not None:
+                        fingerprinter.close()
                 except Exception:
                     pass
                 try:
@@ -314,11 +884,129 @@ class JobRunner:
                 except:
                     pass
                 self._unregister_job(scan_id)
+                self._drop_control("scan", scan_id)
         
+        control = self._create_control("scan", scan_id)
         thread = threading.Thread(target=scan_thread, daemon=True)
         self._register_job(scan_id, thread)
         thread.start()
     
+    def _iter_batch_records(self, records: FileRecords, conn: sqlite3.Connection, scan_id: int, batch_id: int):
+        """FileRecords.load_batch() s čitelnou chybou při poškozené databázi"""
+        try:
+            yield from records.load_batch(conn, scan_id, batch_id)
+        except sqlite3.DatabaseError as query_error:
+            if "malformed" in str(query_error).lower() or "database disk image" in str(query_error).lower():
+                raise Exception(f"Databáze je poškozená - nelze načíst soubory ze scanu {scan_id}. "
+                                f"Zkontrolujte integritu databáze nebo obnovte ze zálohy.")
+            raise
+    
+    def _load_hardlinks(self, session, scan_id: int) -> Dict:
+        """Hardlinky scanu: {normalizovaná cesta (jako v DiffItem): (dev, inode)}"""
+        rows = session.query(DBFileEntry.rel_path, DBFileEntry.dev, DBFileEntry.inode).filter(
+            DBFileEntry.scan_id == scan_id,
+            DBFileEntry.inode.isnot(None)
+        )
+        return {path: (dev, inode) for path, dev, inode in rows}
+    
+    def _prepare_resume(self, db_path: str, scan_id: int, log_cb: Optional[Callable[[str], None]] = None):
+        """
+        Připraví pokračování přerušeného scanu z checkpointů. Platné jsou jen soubory
+        v hotových adresářích (done=1) nebo hotových podstromech (done=2), ostatní
+        (rozepsané adresáře) se smažou a projdou znovu.
+        Vrací ({root_rel: [(dir_path, rel_path), ...]}, počet ponechaných souborů).
+        """
+        from collections import defaultdict
+        
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            rows = conn.execute(
+                "SELECT root_rel, dir_path, rel_path, done FROM scan_checkpoints WHERE scan_id = ?", (scan_id,)
+            ).fetchall()
+            
+            done_dirs = set()
+            done_trees = set()
+            pending = defaultdict(list)
+            roots_seen = set()
+            for root_rel, dir_path, rel_path, done in rows:
+                roots_seen.add(root_rel)
+                if done == 2:
+                    done_trees.add(rel_path)
+                elif done == 1:
+                    done_dirs.add(rel_path)
+                else:
+                    pending[root_rel].append((dir_path, rel_path))
+            
+            def dir_completed(rel_dir: str) -> bool:
+                if rel_dir in done_dirs:
+                    return True
+                while True:
+                    if rel_dir in done_trees:
+                        return True
+                    if not rel_dir:
+                        return False
+                    rel_dir = rel_dir.rsplit("/", 1)[0] if "/" in rel_dir else ""
+            
+            stale_files = [
+                row_id for row_id, dir_path in conn.execute(
+                    "SELECT f.id, d.path FROM file_entries f JOIN path_dirs d ON d.id = f.dir_id WHERE f.scan_id = ?", (scan_id,)
+                )
+                if not dir_completed(dir_path)
+            ]
+            stale_dirs = [
+                row_id for row_id, rel_path in conn.execute(
+                    "SELECT id, rel_path FROM scan_dirs WHERE scan_id = ?", (scan_id,)
+                )
+                if not dir_completed(rel_path)
+            ]
+            for table, ids in (("file_entries", stale_files), ("scan_dirs", stale_dirs)):
+                for i in range(0, len(ids), 500):
+                    chunk = ids[i:i + 500]
+                    conn.execute(f"DELETE FROM {table} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            conn.commit()
+            
+            kept = conn.execute("SELECT COUNT(*) FROM file_entries WHERE scan_id = ?", (scan_id,)).fetchone()[0]
+        finally:
+            conn.close()
+        
+        # Root bez checkpointů se prochází celý, root bez čekajících adresářů je hotový
+        plan = {root_rel: pending.get(root_rel, []) for root_rel in roots_seen}
+        if log_cb:
+            log_cb(
+                f"Resume: kept {kept} files from {len(done_dirs) + len(done_trees)} completed directories, "
+                f"removed {len(stale_files)} rows of unfinished directories, "
+                f"{sum(len(v) for v in pending.values())} directories pending"
+            )
+        return plan, kept
+    
+    def _load_dir_index(self, session, scan_id: int, dataset_id: int):
+        """Načte index adresářů posledního dokončeného scanu datasetu. Vrací (DirIndex, scan_id) nebo (None, None)."""
+        import calendar
+        from backend.adapters.base import DirIndex, DirState
+        
+        previous_scans = session.query(Scan).filter(
+            Scan.dataset_id == dataset_id,
+            Scan.id != scan_id,
+            Scan.status == "completed"
+        ).order_by(Scan.created_at.desc()).all()
+        
+        for previous in previous_scans:
+            rows = session.query(
+                ScanDir.rel_path, ScanDir.mtime_epoch, ScanDir.inode, ScanDir.child_count, ScanDir.fs_name,
+                ScanDir.complete
+            ).filter(ScanDir.scan_id == previous.id).all()
+            if not rows:
+                continue
+            # created_at je UTC (datetime.utcnow) - začátek předchozího scanu
+            scanned_at = calendar.timegm(previous.created_at.utctimetuple()) if previous.created_at else 0
+            dirs = [
+                DirState(rel_path=r[0], mtime_epoch=r[1], inode=r[2], child_count=r[3], fs_name=r[4],
+                         complete=r[5] is None or bool(r[5]))
+                for r in rows
+            ]
+            return DirIndex(dirs, scanned_at, previous.exclude_patterns), previous.id
+        return None, None
+    
     async def run_diff(self, diff_id: int):
         """Spustí diff job"""
         def diff_thread():
@@ -352,194 +1040,75 @@ class JobRunner:
                 if not source_dataset or not target_dataset:
                     raise Exception("Source or target dataset not found")
                 
-                from backend.utils import normalize_path, normalize_root_rel_path, is_ignored_path
-                
-                # Načtení souborů s normalizovanými cestami
-                # Zkusit načíst soubory s ošetřením poškozené databáze
-                try:
-                    source_files_raw = session.query(DBFileEntry).filter(
-                        DBFileEntry.scan_id == diff.source_scan_id
-                    ).all()
-                except Exception as query_error:
-                    # Pokud selže query, může to být poškozená databáze
-                    if "malformed" in str(query_error).lower() or "database disk image" in str(query_error).lower():
-                        raise Exception(f"Databáze je poškozená - nelze načíst soubory ze scanu {diff.source_scan_id}. "
-                                      f"Zkontrolujte integritu databáze nebo obnovte ze zálohy.")
-                    raise
-                
-                try:
-                    target_files_raw = session.query(DBFileEntry).filter(
-                        DBFileEntry.scan_id == diff.target_scan_id
-                    ).all()
-                except Exception as query_error:
-                    # Pokud selže query, může to být poškozená databáze
-                    if "malformed" in str(query_error).lower() or "database disk image" in str(query_error).lower():
-                        raise Exception(f"Databáze je poškozená - nelze načíst soubory ze scanu {diff.target_scan_id}. "
-                                      f"Zkontrolujte integritu databáze nebo obnovte ze zálohy.")
-                    raise
-                
                 # Debug: Logování root složek pro diagnostiku
                 import logging
                 logger = logging.getLogger(__name__)
                 source_root = source_dataset.roots[0] if source_dataset.roots else ""
                 target_root = target_dataset.roots[0] if target_dataset.roots else ""
                 logger.info(f"Diff {diff_id}: Source dataset root: '{source_root}', Target dataset root: '{target_root}'")
-                logger.info(f"Diff {diff_id}: Source files count: {len(source_files_raw)}, Target files count: {len(target_files_raw)}")
                 
-                # Vytvoření mapy normalizovaných cest -> soubory
-                # Použijeme root_rel_path z každého souboru místo root z datasetu pro přesnější normalizaci
-                source_files = {}  # normalizovaná cesta -> soubor
-                source_files_by_original = {}  # původní cesta -> soubor (pro fallback)
-                normalization_issues = []  # Pro debug - ukládání problémů s normalizací
+                def log_cb(message: str):
+                    asyncio.run(websocket_manager.broadcast({
+                        "type": "job.log",
+                        "data": {"job_id": diff_id, "type": "diff", "message": message}
+                    }))
                 
-                for f in source_files_raw:
-                    if not f.full_rel_path or is_ignored_path(f.full_rel_path):
-                        continue
-                    file_root = normalize_root_rel_path(f.root_rel_path) if f.root_rel_path else ""
-                    if not file_root:
-                        file_root = normalize_root_rel_path(source_dataset.roots[0]) if source_dataset.roots else ""
-                    
-                    normalized = normalize_path(f.full_rel_path, file_root)
-                    if is_ignored_path(normalized):
-                        continue
-                    if normalized not in source_files:
-                        source_files[normalized] = f
-                    # Uložit také do mapy původních cest pro fallback
-                    source_files_by_original[f.full_rel_path] = f
-                    # Debug: Zkontrolovat, zda normalizace funguje správně
-                    if len(normalization_issues) < 5 and f.full_rel_path and file_root:
-                        # Uložit několik příkladů pro debug
-                        if not normalized or (normalized == f.full_rel_path and file_root):
-                            normalization_issues.append(f"Source: path='{f.full_rel_path}', root='{file_root}', normalized='{normalized}'")
-                
-                target_files = {}  # normalizovaná cesta -> soubor
-                target_files_by_original = {}  # původní cesta -> soubor (pro fallback)
-                for f in target_files_raw:
-                    if not f.full_rel_path or is_ignored_path(f.full_rel_path):
-                        continue
-                    file_root = normalize_root_rel_path(f.root_rel_path) if f.root_rel_path else ""
-                    if not file_root:
-                        file_root = normalize_root_rel_path(target_dataset.roots[0]) if target_dataset.roots else ""
+                base_diff = session.query(Diff).filter(Diff.id == diff.base_diff_id).first() if diff.base_diff_id else None
+                if diff.base_diff_id and (not base_diff or base_diff.status != "completed"):
+                    raise Exception(f"Base diff {diff.base_diff_id} not found or not completed")
+                
+                # Položky diffu počítá SQLite (INSERT ... SELECT nad indexem normalizované cesty),
+                # po rozsazích adresářů velikosti adaptivního bloku writeru - mezi nimi commit,
+                # progress a pauza / zrušení
+                writer = BulkWriter(storage_service.db_path, "Diff items", log_cb,
+                                    chunk_min=DIFF_CHUNK_MIN, chunk_max=DIFF_CHUNK_MAX)
+                if base_diff:
+                    # Aktualizace diffu - znovu se zařadí jen cesty změněné mezi starým a novým scanem
+                    sql_diff = IncrementalDiff(
+                        diff_id, base_diff.id, diff.source_scan_id, diff.target_scan_id,
+                        base_diff.source_scan_id, base_diff.target_scan_id,
+                        store_same=bool(diff.store_same),
+                        base_same=(base_diff.same_count or 0, base_diff.same_size or 0)
+                    )
+                else:
+                    sql_diff = SqlDiff(diff_id, diff.source_scan_id, diff.target_scan_id, store_same=bool(diff.store_same))
+                try:
+                    total_rows = sql_diff.load_dirs(writer.conn)
                     
-                    normalized = normalize_path(f.full_rel_path, file_root)
-                    if is_ignored_path(normalized):
-                        continue
-                    if normalized not in target_files:
-                        target_files[normalized] = f
-                    # Uložit také do mapy původních cest pro fallback
-                    target_files_by_original[f.full_rel_path] = f
-                    # Debug: Zkontrolovat, zda normalizace funguje správně
-                    if len(normalization_issues) < 10 and f.full_rel_path and file_root:
-                        # Uložit několik příkladů pro debug
-                        if not normalized or (normalized == f.full_rel_path and file_root):
-                            normalization_issues.append(f"Target: path='{f.full_rel_path}', root='{file_root}', normalized='{normalized}'")
-                
-                # Debug: Logovat problémy s normalizací
-                if normalization_issues:
-                    logger.warning(f"Diff {diff_id}: Potential normalization issues (showing first 10):")
-                    for issue in normalization_issues[:10]:
-                        logger.warning(f"  {issue}")
-                
-                logger.info(f"Diff {diff_id}: Normalized source files: {len(source_files)}, Normalized target files: {len(target_files)}")
-                
-                # Deterministické porovnání podle normalizovaných cest
-                all_paths = set(source_files.keys()) | set(target_files.keys())
-                total_paths = len(all_paths)
-                
-                # Debug: Zkontrolovat několik příkladů normalizovaných cest
-                if total_paths > 0:
-                    sample_paths = list(all_paths)[:5]
-                    logger.info(f"Diff {diff_id}: Sample normalized paths: {sample_paths}")
-                
-                # Progress feedback - start
-                asyncio.run(websocket_manager.broadcast({
-                    "type": "job.progress",
-                    "data": {"job_id": diff_id, "type": "diff", "count": 0, "total": total_paths, "message": f"Porovnávání {total_paths} souborů..."}
-                }))
-                
-                processed_count = 0
-                matched_by_fallback = 0  # Počítadlo pro debug
-                for normalized_path in all_paths:
-                    source_file = source_files.get(normalized_path)
-                    target_file = target_files.get(normalized_path)
+                    # Progress feedback - start
+                    asyncio.run(websocket_manager.broadcast({
+                        "type": "job.progress",
+                        "data": {"job_id": diff_id, "type": "diff", "count": 0, "total": total_rows, "message": f"Porovnávání {total_rows} souborů..."}
+                    }))
                     
-                    # Fallback: Pokud normalizace selhala, zkusit najít soubor pomocí alternativního porovnání
-                    if source_file and not target_file:
-                        # Zkusit najít soubor v target pomocí původní cesty nebo jiné normalizace
-                        # Toto může pomoci, pokud normalizace selhala kvůli rozdílným root složkám
-                        found_by_fallback = False
-                        if source_file.full_rel_path in target_files_by_original:
-                            target_file = target_files_by_original[source_file.full_rel_path]
-                            found_by_fallback = True
-                            matched_by_fallback += 1
-                            logger.debug(f"Diff {diff_id}: Found match by fallback for '{normalized_path}' (original: '{source_file.full_rel_path}')")
-                        elif normalized_path in target_files_by_original:
-                            # Zkusit najít pomocí normalizované cesty jako klíče v původních cestách
-                            target_file = target_files_by_original.get(normalized_path)
-                            if target_file:
-                                found_by_fallback = True
-                                matched_by_fallback += 1
+                    processed_rows = 0
+                    chunk_count = 0
+                    for first_dir_id, last_dir_id, chunk_rows in sql_diff.chunks(lambda: writer.chunk_size):
+                        writer.write(lambda conn: sql_diff.apply(conn, first_dir_id, last_dir_id), chunk_rows)
+                        processed_rows += chunk_rows
+                        chunk_count += 1
                         
-                        if not target_file:
-                            category = "missing"
-                        else:
-                            # Soubor byl nalezen pomocí fallback, pokračovat s porovnáním
-                            pass
-                    elif source_file and target_file:
-                        # Soubor byl nalezen normálně
-                        pass
-                    else:
-                        # Soubor existuje jen v target - označit jako "extra"
-                        pass
-                    
-                    if source_file and target_file:
-                        if source_file.size != target_file.size:
-                            category = "conflict"
-                        elif (source_file.mtime_epoch and target_file.mtime_epoch and
-                              abs(source_file.mtime_epoch - target_file.mtime_epoch) > 2):
-                            category = "conflict"
-                        else:
-                            category = "same"
-                    elif source_file and not target_file:
-                        category = "missing"
-                    else:
-                        category = "extra"
-                    
-                    diff_item = DiffItem(
-                        diff_id=diff_id,
-                        full_rel_path=normalized_path,
-                        source_size=source_file.size if source_file else None,
-                        target_size=target_file.size if target_file else None,
-                        source_mtime=source_file.mtime_epoch if source_file else None,
-                        target_mtime=target_file.mtime_epoch if target_file else None,
-                        category=category
-                    )
-                    session.add(diff_item)
-                    processed_count += 1
-                    
-                    # Progress feedback každých 100 souborů (častější feedback pro lepší UX)
-                    if processed_count % 100 == 0:
                         asyncio.run(websocket_manager.broadcast({
                             "type": "job.progress",
-                            "data": {"job_id": diff_id, "type": "diff", "count": processed_count, "total": total_paths, "message": f"Zpracováno {processed_count} / {total_paths} souborů..."}
+                            "data": {"job_id": diff_id, "type": "diff", "count": processed_rows, "total": total_rows, "message": f"Zpracováno {processed_rows} / {total_rows} souborů..."}
                         }))
+                        # Pauza / zrušení mezi rozsahy - rozsah je zapsaný, zámek DB se nedrží
+                        control.checkpoint()
                     
-                    # Batch commit každých 1000 záznamů pro lepší výkon (commit je dražší než progress feedback)
-                    if processed_count % 1000 == 0:
-                        try:
-                            session.commit()
-                        except Exception as commit_error:
-                            session.rollback()
-                            asyncio.run(websocket_manager.broadcast({
-                                "type": "job.log",
-                                "data": {"job_id": diff_id, "type": "diff", "message": f"Commit error: {commit_error}, retrying..."}
-                            }))
-                            session.commit()
-                
-                # Debug: Logovat výsledky fallback logiky
-                if matched_by_fallback > 0:
-                    logger.info(f"Diff {diff_id}: Matched {matched_by_fallback} files using fallback logic")
-                
+                    # Součty kategorií pro summary - shodné soubory bez uložených položek se dopočítají
+                    category_totals = sql_diff.category_totals(writer.conn)
+                    category_totals["same"] = sql_diff.same_totals(writer.conn)
+                finally:
+                    writer.close()
+                
+                summary = ", ".join(f"{category} {count}" for category, (count, _) in sorted(category_totals.items())) or "no items"
+                logger.info(f"Diff {diff_id}: {total_rows} scan rows in {chunk_count} chunks ({summary}); {writer.summary()}")
+                if base_diff:
+                    log_cb(f"Diff updated from diff {base_diff.id}: {sql_diff.changed_paths()} changed paths reclassified")
+                log_cb(f"Diff: {summary}")
+                log_cb(writer.summary())
+                
+                store_totals(diff, category_totals)
                 diff.status = "completed"
                 try:
                     session.commit()
@@ -556,6 +1125,20 @@ class JobRunner:
                     "data": {"job_id": diff_id, "type": "diff", "status": "completed"}
                 }))
                 
+            except JobCancelled:
+                # Zrušení uživatelem - zapsané bloky položek zůstanou, diff je neúplný
+                try:
+                    session.rollback()
+                    diff = session.query(Diff).filter(Diff.id == diff_id).first()
+                    if diff:
+                        diff.status = "cancelled"
+                        session.commit()
+                except Exception:
+                    session.rollback()
+                asyncio.run(websocket_manager.broadcast({
+                    "type": "job.finished",
+                    "data": {"job_id": diff_id, "type": "diff", "status": "cancelled"}
+                }))
             except Exception as e:
                 import traceback
                 from sqlalchemy.exc import DatabaseError
@@ -645,7 +1228,9 @@ class JobRunner:
             finally:
                 session.close()
                 self._unregister_job(diff_id)
+                self._drop_control("diff", diff_id)
         
+        control = self._create_control("diff", diff_id)
         thread = threading.Thread(target=diff_thread, daemon=True)
         self._register_job(diff_id, thread)
         thread.start()
@@ -682,12 +1267,14 @@ class JobRunner:
                     }))
                     return
                 
-                # Načtení diff items
+                # Načtení diff items (shodné soubory se nekopírují - ani u diffu se store_same)
                 diff_items = session.query(DiffItem).filter(
-                    DiffItem.diff_id == batch.diff_id
+                    DiffItem.diff_id == batch.diff_id,
+                    DiffItem.category != "same"
                 ).all()
                 
                 total_items = len(diff_items)
+                control.checkpoint()
                 
                 # Progress feedback - start
                 asyncio.run(websocket_manager.broadcast({
@@ -710,13 +1297,13 @@ class JobRunner:
                 }))
                 
                 # Filtrování podle exclude_patterns
-                from backend.config import match_exclude_pattern
-                exclude_patterns = batch.exclude_patterns or []
-                if exclude_patterns:
+                from backend.config import compile_exclude_patterns
+                exclude = compile_exclude_patterns(tuple(batch.exclude_patterns or []))
+                if exclude:
                     items_before_exclude = len(items_to_include)
                     items_to_include = [
                         item for item in items_to_include
-                        if not match_exclude_pattern(item.full_rel_path, exclude_patterns)
+                        if not exclude.matches(item.full_rel_path)
                     ]
                     # Progress feedback - po exclude patterns
                     asyncio.run(websocket_manager.broadcast({
@@ -724,6 +1311,8 @@ class JobRunner:
                         "data": {"job_id": batch_id, "type": "batch", "count": len(items_to_include), "total": total_items, "message": f"Filtrování podle výjimek: {len(items_to_include)} položek (odfiltrováno {items_before_exclude - len(items_to_include)})..."}
                     }))
                 
+                control.checkpoint()
+                
                 # Řazení od nejmenších
                 items_to_include.sort(key=lambda x: x.source_size or x.target_size or 0)
                 
@@ -742,25 +1331,49 @@ class JobRunner:
                 
                 # Vzít všechny soubory (bez limitu)
                 selected_items = items_to_include
-                total_size = sum(item.source_size or item.target_size or 0 for item in selected_items)
                 processed_count = len(selected_items)
                 
+                # Hardlinky ze zdrojového scanu - data inode se přenáší jen jednou (rsync -H), další cesty jsou odkazy
+                link_keys = self._load_hardlinks(session, diff.source_scan_id)
+                first_by_inode = {}
+                hardlink_of = {}
+                for item in selected_items:
+                    key = link_keys.get(item.full_rel_path) if item.category != "extra" else None
+                    if key is None:
+                        continue
+                    first = first_by_inode.setdefault(key, item.full_rel_path)
+                    if first != item.full_rel_path:
+                        hardlink_of[item.full_rel_path] = first
+                total_size = sum(
+                    item.source_size or item.target_size or 0
+                    for item in selected_items if item.full_rel_path not in hardlink_of
+                )
+                
+                control.checkpoint()
+                
                 # Progress feedback - před vytvářením batch items
                 asyncio.run(websocket_manager.broadcast({
                     "type": "job.progress",
                     "data": {"job_id": batch_id, "type": "batch", "count": len(selected_items), "total": len(items_to_include), "message": f"Vytváření plánu: {len(selected_items)} souborů..."}
                 }))
                 
-                # Vytvoření batch items
-                for item in selected_items:
-                    batch_item = BatchItem(
-                        batch_id=batch_id,
-                        full_rel_path=item.full_rel_path,
-                        size=item.source_size or item.target_size or 0,
-                        category=item.category,
-                        enabled=True  # Všechny soubory jsou ve výchozím stavu povolené
-                    )
-                    session.add(batch_item)
+                # Vytvoření batch items - hromadný zápis po blocích (všechny ve výchozím stavu povolené)
+                def log_cb(message: str):
+                    asyncio.run(websocket_manager.broadcast({
+                        "type": "job.log",
+                        "data": {"job_id": batch_id, "type": "batch", "message": message}
+                    }))
+                
+                writer = BulkWriter(storage_service.db_path, "Batch items", log_cb)
+                try:
+                    writer.insert(BATCH_ITEM_INSERT_SQL, (
+                        (batch_id, item.dir_id, item.name_id, item.source_size or item.target_size or 0,
+                         item.category, True, hardlink_of.get(item.full_rel_path))
+                        for item in selected_items
+                    ))
+                finally:
+                    writer.close()
+                log_cb(writer.summary())
                 
                 batch.status = "ready_to_phase_2"
                 session.commit()
@@ -771,6 +1384,21 @@ class JobRunner:
                     "data": {"job_id": batch_id, "type": "batch", "status": "ready"}
                 }))
                 
+            except JobCancelled:
+                # Rozpracovaný plán se nezapisuje
+                try:
+                    session.rollback()
+                    batch = session.query(Batch).filter(Batch.id == batch_id).first()
+                    if batch:
+                        batch.status = "cancelled"
+                        session.query(BatchItem).filter(BatchItem.batch_id == batch_id).delete()
+                        session.commit()
+                except Exception:
+                    session.rollback()
+                asyncio.run(websocket_manager.broadcast({
+                    "type": "job.finished",
+                    "data": {"job_id": batch_id, "type": "batch", "status": "cancelled"}
+                }))
             except Exception as e:
                 import traceback
                 error_msg = str(e)
@@ -782,6 +1410,8 @@ class JobRunner:
                     if batch:
                         batch.status = "failed"
                         batch.error_message = error_msg
+                        # Bloky položek zapsané před chybou - neúplný plán se nezachová
+                        session.query(BatchItem).filter(BatchItem.batch_id == batch_id).delete()
                         session.commit()
                 except:
                     pass
@@ -793,7 +1423,9 @@ class JobRunner:
             finally:
                 session.close()
                 self._unregister_job(batch_id)
+                self._drop_control("batch", batch_id)
         
+        control = self._create_control("batch", batch_id)
         thread = threading.Thread(target=batch_thread, daemon=True)
         self._register_job(batch_id, thread)
         thread.start()
@@ -859,13 +1491,11 @@ class JobRunner:
                     session.commit()
                     return
                 
-                from backend.utils import normalize_path, normalize_root_rel_path
-                
                 source_root = normalize_root_rel_path(source_dataset.roots[0]) if source_dataset.roots else ""
                 target_root = normalize_root_rel_path(target_dataset.roots[0]) if target_dataset.roots else ""
                 
-                # Načtení batch items (pouze povolené)
-                batch_items = session.query(BatchItem).filter(
+                # Načtení batch items (pouze povolené) - jen cesty, bez ORM objektů
+                batch_items = session.query(BatchItem.full_rel_path, BatchItem.dir_id, BatchItem.name_id).filter(
                     BatchItem.batch_id == batch_id,
                     BatchItem.enabled == True
                 ).all()
@@ -881,38 +1511,38 @@ class JobRunner:
                     }))
                     return
                 
-                # Načtení všech source file entries a vytvoření mapy normalizovaných cest -> soubory
-                source_files_raw = session.query(DBFileEntry).filter(
-                    DBFileEntry.scan_id == diff.source_scan_id
-                ).all()
-                
-                # Vytvoření mapy normalizovaných cest -> soubory (stejně jako v run_diff)
+                # Soubory zdrojového scanu jako kompaktní záznamy - jen položky batche, dohledané
+                # indexem normalizované cesty (ta samá, kterou páruje run_diff)
+                source_records = FileRecords()
                 source_files_map = {}
-                for f in source_files_raw:
-                    normalized = normalize_path(f.full_rel_path, source_root)
-                    if normalized not in source_files_map:
-                        source_files_map[normalized] = f
-                    # Pokud už existuje, použít první (může být duplicita)
+                records_conn = sqlite3.connect(storage_service.db_path, timeout=30)
+                try:
+                    for index, path_key in self._iter_batch_records(source_records, records_conn, diff.source_scan_id, batch_id):
+                        # Pokud už existuje, použít první (může být duplicita)
+                        source_files_map.setdefault(path_key, index)
+                finally:
+                    records_conn.close()
                 
                 # Konverze na FileEntry a výpočet celkové velikosti
                 file_entries = []
                 total_size = 0
                 missing_files = []
+                copied_inodes = set()
+                linked_copies = set()  # další cesty již přenášeného inode (rsync je vytvoří jako hardlink)
                 for item in batch_items:
-                    # item.full_rel_path je normalizovaná cesta (z DiffItem)
-                    # Najít source file entry pomocí normalizované cesty
-                    source_file = source_files_map.get(item.full_rel_path)
+                    # item.full_rel_path je normalizovaná cesta (z DiffItem, bez root složky) - použije se pro rsync
+                    source_index = source_files_map.get((item.dir_id, item.name_id))
                     
-                    if source_file:
-                        # Použít normalizovanou cestu (bez root) pro rsync
-                        # item.full_rel_path je už normalizovaná cesta (bez root složky)
-                        file_entries.append(FileEntry(
-                            full_rel_path=item.full_rel_path,  # Normalizovaná cesta bez root
-                            size=source_file.size,
-                            mtime_epoch=source_file.mtime_epoch,
-                            root_rel_path=source_file.root_rel_path
-                        ))
-                        total_size += source_file.size
+                    if source_index is not None:
+                        file_entries.append(source_records.entry(source_index, item.full_rel_path))
+                        # Hardlinky se stejným inode se přenáší jednou
+                        link_key = source_records.link_key(source_index)
+                        if link_key is None or link_key not in copied_inodes:
+                            total_size += source_records.size[source_index]
+                            if link_key is not None:
+                                copied_inodes.add(link_key)
+                        else:
+                            linked_copies.add(item.full_rel_path)
                     else:
                         missing_files.append(item.full_rel_path)
                 
@@ -1047,7 +1677,8 @@ class JobRunner:
                     copied_count = count
                     # Přidat velikost jen jednou pro každý soubor
                     if file_size > 0 and path not in processed_files:
-                        copied_size += file_size
+                        if path not in linked_copies:
+                            copied_size += file_size
                         processed_files.add(path)
                         # Uložit stav souboru
                         file_statuses.append({
@@ -1075,69 +1706,93 @@ class JobRunner:
                 # Spuštění kopírování
                 # Pro SSH adapter předáme source_is_remote parametr, pokud je potřeba
                 from backend.adapters.ssh_transfer import SshRsyncTransferAdapter
-                if isinstance(adapter, SshRsyncTransferAdapter) and direction == "nas1-usb":
-                    # SSH adapter pro nas1-usb - source je vzdálený
-                    result = adapter.send_batch(
-                        file_entries,
-                        source_base,
-                        target_base,
-                        dry_run=dry_run,
-                        progress_cb=progress_cb,
-                        log_cb=log_cb,
-                        source_is_remote=True
-                    )
-                elif isinstance(adapter, SshRsyncTransferAdapter) and direction == "usb-nas2":
-                    # SSH adapter pro usb-nas2 - target je vzdálený (source_is_remote=False je default)
-                    result = adapter.send_batch(
-                        file_entries,
-                        source_base,
-                        target_base,
-                        dry_run=dry_run,
-                        progress_cb=progress_cb,
-                        log_cb=log_cb,
-                        source_is_remote=False
-                    )
-                else:
-                    # Lokální adapter nebo default SSH chování
-                    result = adapter.send_batch(
-                        file_entries,
-                        source_base,
-                        target_base,
-                        dry_run=dry_run,
-                        progress_cb=progress_cb,
-                        log_cb=log_cb
-                    )
-                
-                # Uložit stav každého souboru do databáze
-                for file_status in file_statuses:
-                    file_status_record = JobFileStatus(
-                        job_id=job_id,
-                        file_path=file_status["file_path"],
-                        file_size=file_status["file_size"],
-                        status=file_status["status"],
-                        error_message=file_status.get("error_message"),
-                        copied_at=datetime.utcnow() if file_status["status"] == "copied" else None
-                    )
-                    session.add(file_status_record)
+                cancelled = False
+                try:
+                    control.checkpoint()
+                    if isinstance(adapter, SshRsyncTransferAdapter) and direction == "nas1-usb":
+                        # SSH adapter pro nas1-usb - source je vzdálený
+                        result = adapter.send_batch(
+                            file_entries,
+                            source_base,
+                            target_base,
+                            dry_run=dry_run,
+                            progress_cb=progress_cb,
+                            log_cb=log_cb,
+                            source_is_remote=True,
+                            control=control
+                        )
+                    elif isinstance(adapter, SshRsyncTransferAdapter) and direction == "usb-nas2":
+                        # SSH adapter pro usb-nas2 - target je vzdálený (source_is_remote=False je default)
+                        result = adapter.send_batch(
+                            file_entries,
+                            source_base,
+                            target_base,
+                            dry_run=dry_run,
+                            progress_cb=progress_cb,
+                            log_cb=log_cb,
+                            source_is_remote=False,
+                            control=control
+                        )
+                    else:
+                        # Lokální adapter nebo default SSH chování
+                        result = adapter.send_batch(
+                            file_entries,
+                            source_base,
+                            target_base,
+                            dry_run=dry_run,
+                            progress_cb=progress_cb,
+                            log_cb=log_cb,
+                            control=control
+                        )
+                except JobCancelled:
+                    # Zrušení uživatelem - stav už zkopírovaných souborů se uloží, batch zůstává ve své fázi
+                    cancelled = True
+                    log_cb(f"Copy cancelled after {copied_count} files")
+                    result = {"success": False, "files_copied": copied_count, "error": "Cancelled"}
+                
+                # Uložit stav každého souboru do databáze (hromadný zápis) - ID cest z položek batche,
+                # jinak přes slovník (nové položky slovníku se potvrdí před zápisem stavů)
+                item_path_ids = {item.full_rel_path: (item.dir_id, item.name_id) for item in batch_items}
+                writer = BulkWriter(storage_service.db_path, "File statuses", log_cb)
+                try:
+                    unknown_paths = [fs["file_path"] for fs in file_statuses if fs["file_path"] not in item_path_ids]
+                    if unknown_paths:
+                        item_path_ids.update(zip(unknown_paths, PathDictionary().ids_many(writer.conn, unknown_paths)))
+                        writer.conn.commit()
+                    copied_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")
+                    writer.insert(JOB_FILE_STATUS_INSERT_SQL, (
+                        (job_id,) + item_path_ids[file_status["file_path"]] + (
+                            file_status["file_size"],
+                            file_status["status"],
+                            file_status.get("error_message"),
+                            copied_at if file_status["status"] == "copied" else None,
+                        )
+                        for file_status in file_statuses
+                    ))
+                finally:
+                    writer.close()
+                if file_statuses:
+                    log_cb(writer.summary())
                 
                 # Aktualizace jobu
-                job.status = "completed" if result.get("success") else "failed"
+                job.status = "cancelled" if cancelled else "completed" if result.get("success") else "failed"
                 job.finished_at = datetime.utcnow()
-                if not result.get("success"):
+                if not result.get("success") and not cancelled:
                     job.error_message = result.get("error", "Unknown error")
                 # Uložit log zprávy
                 if log_messages:
                     job.job_log = "\n".join(log_messages)
                 
-                # Aktualizace batch statusu podle směru kopírování
-                if direction == "nas1-usb":
-                    # Po dokončení fáze 2 (NAS → USB) je batch ready pro fázi 3
-                    batch.status = "ready_to_phase_3" if result.get("success") else "failed"
-                elif direction == "usb-nas2":
-                    # Po dokončení fáze 3 (USB → NAS) je batch completed
-                    batch.status = "completed" if result.get("success") else "failed"
-                else:
-                    batch.status = "failed"
+                # Aktualizace batch statusu podle směru kopírování (zrušený job fázi batche nemění)
+                if not cancelled:
+                    if direction == "nas1-usb":
+                        # Po dokončení fáze 2 (NAS → USB) je batch ready pro fázi 3
+                        batch.status = "ready_to_phase_3" if result.get("success") else "failed"
+                    elif direction == "usb-nas2":
+                        # Po dokončení fáze 3 (USB → NAS) je batch completed
+                        batch.status = "completed" if result.get("success") else "failed"
+                    else:
+                        batch.status = "failed"
                 
                 try:
                     session.commit()
@@ -1184,7 +1839,9 @@ class JobRunner:
             finally:
                 session.close()
                 self._unregister_job(job_id)
+                self._drop_control("copy", job_id)
 
+        control = self._create_control("copy", job_id)
         thread = threading.Thread(target=copy_thread, daemon=True)
         self._register_job(job_id, thread)
         thread.start()
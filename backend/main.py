@@ -11,6 +11,7 @@ from backend.api import router as api_router
 from backend.websocket_manager import websocket_manager
 from backend.mount_service import mount_service
 from backend.storage_service import storage_service
+from backend.ssh_pool import ssh_pool
 
 # Pro FastAPI 0.104+ použijeme lifespan místo on_event
 from contextlib import asynccontextmanager
@@ -29,7 +30,7 @@ async def lifespan(app: FastAPI):
         logger.info("USB is available but database is not connected, attempting to connect...")
         await storage_service.handle_available()
     
-    # Zkontrolovat a označit uvízlé joby ve stavu "running" jako "failed"
+    # Zkontrolovat a označit uvízlé joby ve stavu "running" / "paused" jako "failed"
     # (mohly zůstat z předchozího běhu po restartu)
     try:
         session = storage_service.get_session()
@@ -39,20 +40,20 @@ async def lifespan(app: FastAPI):
             logger = logging.getLogger(__name__)
             
             # Zkontrolovat Scany
-            stuck_scans = session.query(Scan).filter(Scan.status == "running").all()
+            stuck_scans = session.query(Scan).filter(Scan.status.in_(("running", "paused"))).all()
             for scan in stuck_scans:
                 scan.status = "failed"
                 scan.error_message = "Job byl přerušen restartem aplikace"
                 logger.warning(f"Marking stuck scan {scan.id} as failed")
             
             # Zkontrolovat Diffy
-            stuck_diffs = session.query(Diff).filter(Diff.status == "running").all()
+            stuck_diffs = session.query(Diff).filter(Diff.status.in_(("running", "paused"))).all()
             for diff in stuck_diffs:
                 diff.status = "failed"
                 logger.warning(f"Marking stuck diff {diff.id} as failed")
             
             # Zkontrolovat Batches (Plány)
-            stuck_batches = session.query(Batch).filter(Batch.status == "running").all()
+            stuck_batches = session.query(Batch).filter(Batch.status.in_(("running", "paused"))).all()
             for batch in stuck_batches:
                 batch.status = "failed"
                 batch.error_message = "Job byl přerušen restartem aplikace"
@@ -60,7 +61,7 @@ async def lifespan(app: FastAPI):
             
             # Zkontrolovat Copy joby (JobRun)
             from backend.database import JobRun
-            stuck_jobs = session.query(JobRun).filter(JobRun.status == "running", JobRun.type == "copy").all()
+            stuck_jobs = session.query(JobRun).filter(JobRun.status.in_(("running", "paused")), JobRun.type == "copy").all()
             for job in stuck_jobs:
                 job.status = "failed"
                 job.error_message = "Job byl přerušen restartem aplikace"
@@ -80,6 +81,7 @@ async def lifespan(app: FastAPI):
     # Shutdown
     await mount_service.stop_monitoring()
     await storage_service.cleanup()
+    ssh_pool.close_all()
 
 app = FastAPI(title="Sync Orchestrator", version="1.0.0", lifespan=lifespan)
 
@@ -0,0 +1,85 @@
+"""
+Globální slovník cest - adresáře (path_dirs) a názvy souborů (path_names) uložené
+jednou, tabulky souborů na ně odkazují přes celočíselné (dir_id, name_id)
+"""
+from typing import Dict, Iterable, List, Tuple
+
+# Celá cesta ze slovníku v SQL (aliasy d = path_dirs, n = path_names); soubory v kořeni mají adresář ""
+PATH_SQL = "CASE WHEN d.path = '' THEN n.name ELSE d.path || '/' || n.name END"
+
+PATH_LOOKUP_CHUNK = 500         # hodnot v jednom SELECT ... IN (...) (limit parametrů SQLite)
+PATH_RESOLVE_CHUNK = 5000       # cest v jednom kroku ids_many
+PATH_CACHE_MAX = 200_000        # položek cache na tabulku, pak se cache zahodí
+
+
+def split_path(path: str) -> Tuple[str, str]:
+    """'a/b/c.txt' -> ('a/b', 'c.txt'), 'c.txt' -> ('', 'c.txt')"""
+    dir_path, _, name = path.rpartition("/")
+    return dir_path, name
+
+
+def join_path(dir_path: str, name: str) -> str:
+    return f"{dir_path}/{name}" if dir_path else name
+
+
+def register_path_functions(conn):
+    """SQL funkce path_dir(p) / path_name(p) pro migrace a dotazy nad textovými cestami"""
+    conn.create_function("path_dir", 1, lambda p: None if p is None else split_path(p)[0], deterministic=True)
+    conn.create_function("path_name", 1, lambda p: None if p is None else split_path(p)[1], deterministic=True)
+
+
+class PathDictionary:
+    """
+    Převod cest na (dir_id, name_id) nad sqlite3 spojením volajícího - nové položky
+    slovníku jsou součástí jeho transakce. Cache ID v paměti je platná jen pro
+    potvrzená data, po rollbacku se musí zahodit (reset).
+    """
+
+    def __init__(self):
+        self._dirs: Dict[str, int] = {}
+        self._names: Dict[str, int] = {}
+
+    def ids(self, conn, path: str) -> Tuple[int, int]:
+        return self.ids_many(conn, [path])[0]
+
+    def ids_many(self, conn, paths: List[str]) -> List[Tuple[int, int]]:
+        """(dir_id, name_id) pro každou cestu, chybějící položky slovníku se založí"""
+        result = []
+        for start in range(0, len(paths), PATH_RESOLVE_CHUNK):
+            parts = [split_path(p) for p in paths[start:start + PATH_RESOLVE_CHUNK]]
+            self._resolve(conn, "path_dirs", "path", self._dirs, {d for d, _ in parts})
+            self._resolve(conn, "path_names", "name", self._names, {n for _, n in parts})
+            result.extend((self._dirs[d], self._names[n]) for d, n in parts)
+        return result
+
+    def dir_id(self, conn, dir_path: str) -> int:
+        return self.dir_ids_many(conn, [dir_path])[0]
+
+    def dir_ids_many(self, conn, dir_paths: List[str]) -> List[int]:
+        """ID adresářů (bez názvu souboru), chybějící se založí"""
+        result = []
+        for start in range(0, len(dir_paths), PATH_RESOLVE_CHUNK):
+            chunk = dir_paths[start:start + PATH_RESOLVE_CHUNK]
+            self._resolve(conn, "path_dirs", "path", self._dirs, set(chunk))
+            result.extend(self._dirs[d] for d in chunk)
+        return result
+
+    def reset(self):
+        self._dirs.clear()
+        self._names.clear()
+
+    @staticmethod
+    def _resolve(conn, table: str, column: str, cache: Dict[str, int], values: Iterable[str]):
+        missing = [v for v in values if v not in cache]
+        if not missing:
+            return
+        if len(cache) + len(missing) > PATH_CACHE_MAX:
+            # Po zahození cache se musí načíst celý blok, i dříve cachované hodnoty
+            cache.clear()
+            missing = list(values)
+        conn.executemany(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)", [(v,) for v in missing])
+        for i in range(0, len(missing), PATH_LOOKUP_CHUNK):
+            chunk = missing[i:i + PATH_LOOKUP_CHUNK]
+            cache.update(conn.execute(
+                f"SELECT {column}, id FROM {table} WHERE {column} IN ({','.join('?' * len(chunk))})", chunk
+            ))
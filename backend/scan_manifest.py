@@ -0,0 +1,115 @@
+"""
+Manifest předchozího scanu pro vzdáleného scan agenta (SSH scan_mode "agent")
+a rekonstrukce nového scanu z jeho změn
+"""
+import sqlite3
+import zlib
+from typing import BinaryIO, List, Tuple
+
+from backend.path_dictionary import PATH_SQL, PathDictionary, join_path
+
+MANIFEST_MAGIC = b"SOMANIFEST1\n"   # musí odpovídat backend/adapters/scan_agent.py
+MANIFEST_FETCH_ROWS = 10000
+
+# Soubory jednoho rootu v pořadí procházení agenta - komponenty cesty bajtově, oddělovač před vším
+MANIFEST_SQL = (
+    f"SELECT {PATH_SQL}, f.size, f.mtime_epoch, COALESCE(f.nlink, 1) "
+    "FROM file_entries f JOIN path_dirs d ON d.id = f.dir_id JOIN path_names n ON n.id = f.name_id "
+    "WHERE f.scan_id = ? AND COALESCE(f.root_rel_path, '') = ? "
+    f"ORDER BY replace({PATH_SQL}, '/', char(1))"
+)
+
+# Nezměněné soubory potvrzeného rootu z předchozího scanu - vše kromě odebraných a změněných
+# (změněné už v novém scanu jsou); převzaté soubory se filtrují aktuálními výjimkami
+COPY_UNCHANGED_SQL = (
+    "INSERT INTO file_entries (scan_id, dir_id, name_id, rel_dir_id, rel_name_id, size, mtime_epoch, root_rel_path, "
+    "fingerprint, inode, dev, nlink) "
+    "SELECT ?, f.dir_id, f.name_id, f.rel_dir_id, f.rel_name_id, f.size, f.mtime_epoch, f.root_rel_path, "
+    "f.fingerprint, f.inode, f.dev, f.nlink "
+    "FROM file_entries f JOIN path_dirs d ON d.id = f.dir_id JOIN path_names n ON n.id = f.name_id "
+    "WHERE f.scan_id = ? AND COALESCE(f.root_rel_path, '') = ? "
+    "AND (? = '' OR d.path = ? OR substr(d.path, 1, ?) = ?) "
+    "AND NOT EXISTS (SELECT 1 FROM file_entries x WHERE x.scan_id = ? AND x.dir_id = f.dir_id AND x.name_id = f.name_id) "
+    "AND NOT EXISTS (SELECT 1 FROM temp.agent_removed r WHERE r.dir_id = f.dir_id AND r.name_id = f.name_id) "
+    "AND NOT is_excluded(d.path, n.name)"
+)
+
+
+class ScanManifest:
+    """
+    Předchozí dokončený scan datasetu jako podklad pro agenta. Adaptér pro každý root
+    zapíše manifest (write), nahlásí odebrané soubory (mark_removed) a po úplném
+    výstupu agenta root potvrdí (mark_root). Změněné a nové soubory jdou do scanu
+    běžnou cestou, nezměněné doplní apply() z předchozího scanu.
+    """
+
+    def __init__(self, db_path: str, base_scan_id: int):
+        self.db_path = db_path
+        self.base_scan_id = base_scan_id
+        self.removed: List[str] = []
+        self.roots: List[Tuple[str, str]] = []  # (root_rel_path, prefix cest rootu)
+
+    def write(self, out: BinaryIO, root_rel: str, prefix: str) -> int:
+        """Zkomprimovaný manifest souborů rootu (cesty relativně k prefixu). Vrací počet souborů."""
+        compressor = zlib.compressobj(6)
+        out.write(compressor.compress(MANIFEST_MAGIC))
+        strip = len(prefix) + 1 if prefix else 0
+        previous = b""
+        count = 0
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            cursor = conn.execute(MANIFEST_SQL, (self.base_scan_id, root_rel))
+            while True:
+                rows = cursor.fetchmany(MANIFEST_FETCH_ROWS)
+                if not rows:
+                    break
+                records = []
+                for path, size, mtime, nlink in rows:
+                    if prefix and not path.startswith(prefix + "/"):
+                        continue
+                    raw = path[strip:].encode("utf-8", errors="surrogateescape")
+                    # Front coding - seřazené cesty sdílejí dlouhé prefixy
+                    shared = 0
+                    limit = min(len(raw), len(previous))
+                    while shared < limit and raw[shared] == previous[shared]:
+                        shared += 1
+                    records.append(b"%d\t%d\t%r\t%d\t" % (shared, size or 0, float(mtime or 0.0), nlink) + raw[shared:] + b"\0")
+                    previous = raw
+                    count += 1
+                out.write(compressor.compress(b"".join(records)))
+        finally:
+            conn.close()
+        out.write(compressor.flush())
+        return count
+
+    def mark_removed(self, full_rel_path: str):
+        self.removed.append(full_rel_path)
+
+    def mark_root(self, root_rel: str, prefix: str):
+        """Agent prošel celý root - jeho nezměněné soubory se převezmou z předchozího scanu"""
+        self.roots.append((root_rel, prefix))
+
+    def apply(self, conn: sqlite3.Connection, scan_id: int, exclude) -> int:
+        """Doplní nezměněné soubory potvrzených rootů do scanu (commit dělá volající). Vrací počet."""
+        conn.create_function(
+            "is_excluded", 2, lambda d, n: 1 if exclude.matches(join_path(d, n)) else 0, deterministic=True
+        )
+        conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS agent_removed (dir_id INTEGER, name_id INTEGER, "
+            "PRIMARY KEY (dir_id, name_id)) WITHOUT ROWID"
+        )
+        conn.execute("DELETE FROM temp.agent_removed")
+        if self.removed:
+            conn.executemany(
+                "INSERT OR IGNORE INTO temp.agent_removed (dir_id, name_id) VALUES (?, ?)",
+                PathDictionary().ids_many(conn, self.removed)
+            )
+        copied = 0
+        for root_rel, prefix in self.roots:
+            cur = conn.execute(COPY_UNCHANGED_SQL, (
+                scan_id, self.base_scan_id, root_rel,
+                prefix, prefix, len(prefix) + 1, prefix + "/", scan_id,
+            ))
+            copied += max(cur.rowcount, 0)
+        conn.execute("DROP TABLE temp.agent_removed")
+        return copied
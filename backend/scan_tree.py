@@ -0,0 +1,112 @@
+"""
+Souhrny adresářů scanu (strom scanu) - rekurzivní počet souborů, velikost a nejnovější mtime
+"""
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from backend.path_dictionary import PathDictionary, split_path
+
+DIR_STATS_INSERT_SQL = (
+    "INSERT INTO scan_dir_stats (scan_id, dir_id, parent_dir_id, file_count, total_size, max_mtime, "
+    "own_file_count, own_size) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def parent_dir(dir_path: str) -> Optional[str]:
+    """Nadřazený adresář ('a/b' -> 'a', 'a' -> ''), kořen '' nemá rodiče"""
+    if not dir_path:
+        return None
+    return split_path(dir_path)[0]
+
+
+class DirAggregator:
+    """
+    Přímé součty souborů po adresářích (přičítá se za běhu scanu, O(1) na soubor);
+    rekurzivní součty předků se dopočítají jednou na konci v rows().
+    """
+
+    __slots__ = ("_dirs",)
+
+    def __init__(self):
+        self._dirs: Dict[str, List] = {}  # adresář -> [počet, velikost, max mtime]
+
+    def __len__(self) -> int:
+        return len(self._dirs)
+
+    def add(self, full_rel_path: str, size: int, mtime_epoch: float):
+        self.add_dir(split_path(full_rel_path)[0], 1, size, mtime_epoch)
+
+    def add_dir(self, dir_path: str, count: int, size: int, max_mtime: Optional[float]):
+        stats = self._dirs.get(dir_path)
+        if stats is None:
+            self._dirs[dir_path] = [count, size, max_mtime]
+            return
+        stats[0] += count
+        stats[1] += size
+        if max_mtime is not None and (stats[2] is None or max_mtime > stats[2]):
+            stats[2] = max_mtime
+
+    def rows(self) -> List[Tuple[str, Optional[str], int, int, Optional[float], int, int]]:
+        """(adresář, rodič, soubory, velikost, max mtime, vlastní soubory, vlastní velikost) včetně všech předků"""
+        own = self._dirs
+        totals = {d: list(stats) for d, stats in own.items()}
+        for dir_path in list(totals):
+            parent = parent_dir(dir_path)
+            while parent is not None and parent not in totals:
+                totals[parent] = [0, 0, None]
+                parent = parent_dir(parent)
+        # Od nejhlubších adresářů k rodičům - každý adresář předá součet celého podstromu jednou
+        for dir_path in sorted(totals, key=lambda d: d.count("/") if d else -1, reverse=True):
+            parent = parent_dir(dir_path)
+            if parent is None:
+                continue
+            count, size, max_mtime = totals[dir_path]
+            stats = totals[parent]
+            stats[0] += count
+            stats[1] += size
+            if max_mtime is not None and (stats[2] is None or max_mtime > stats[2]):
+                stats[2] = max_mtime
+        return [
+            (d, parent_dir(d), count, size, max_mtime, *(own[d][:2] if d in own else (0, 0)))
+            for d, (count, size, max_mtime) in totals.items()
+        ]
+
+
+def load_dir_aggregates(conn: sqlite3.Connection, scan_id: int) -> DirAggregator:
+    """
+    Přímé součty z file_entries (soubory převzaté inkrementálním scanem nebo z přerušeného
+    běhu listingem neprojdou). Hardlinky stejně jako velikost scanu - data inode jednou.
+    """
+    aggregates = DirAggregator()
+    for dir_path, count, size, max_mtime in conn.execute(
+        "SELECT d.path, COUNT(*), SUM(CASE WHEN f.inode IS NULL THEN f.size ELSE 0 END), MAX(f.mtime_epoch) "
+        "FROM file_entries f JOIN path_dirs d ON d.id = f.dir_id WHERE f.scan_id = ? GROUP BY f.dir_id",
+        (scan_id,)
+    ):
+        aggregates.add_dir(dir_path, count, size or 0, max_mtime)
+    seen_inodes = set()
+    for dir_path, dev, inode, size in conn.execute(
+        "SELECT d.path, f.dev, f.inode, f.size FROM file_entries f JOIN path_dirs d ON d.id = f.dir_id "
+        "WHERE f.scan_id = ? AND f.inode IS NOT NULL ORDER BY f.id",
+        (scan_id,)
+    ):
+        if (dev, inode) not in seen_inodes:
+            seen_inodes.add((dev, inode))
+            aggregates.add_dir(dir_path, 0, size, None)
+    return aggregates
+
+
+def write_dir_stats(conn: sqlite3.Connection, scan_id: int, aggregates: DirAggregator) -> int:
+    """Nahradí souhrny adresářů scanu (commit dělá volající). Vrací počet adresářů."""
+    rows = aggregates.rows()
+    paths = PathDictionary()
+    dir_ids = dict(zip(
+        (row[0] for row in rows),
+        paths.dir_ids_many(conn, [row[0] for row in rows])
+    ))
+    conn.execute("DELETE FROM scan_dir_stats WHERE scan_id = ?", (scan_id,))
+    conn.executemany(DIR_STATS_INSERT_SQL, [
+        (scan_id, dir_ids[d], dir_ids[parent] if parent is not None else None, count, size, max_mtime, own_count, own_size)
+        for d, parent, count, size, max_mtime, own_count, own_size in rows
+    ])
+    return len(rows)
@@ -0,0 +1,226 @@
+"""
+SSH connection pool - sdílená SSH/SFTP spojení pro scan, procházení a test připojení
+"""
+import hashlib
+import logging
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import paramiko
+
+logger = logging.getLogger(__name__)
+
+# Výchozí limity poolu
+POOL_MAX_SIZE = 8            # max. počet nečinných spojení v poolu (všechny klíče dohromady)
+POOL_IDLE_TIMEOUT = 300      # nečinné spojení se zavře po 5 minutách
+POOL_KEEPALIVE = 15          # SSH keepalive interval (s)
+POOL_HEALTH_CHECK_AFTER = 30 # spojení nečinné déle než 30 s se před půjčením ověří
+POOL_REAPER_INTERVAL = 60    # jak často úklidové vlákno kontroluje nečinná spojení
+
+PoolKey = Tuple[str, int, str, str, str]
+
+
+class PooledConnection:
+    """Jedno SSH spojení v poolu (SSHClient + líně otevřený SFTP kanál)"""
+
+    def __init__(self, key: PoolKey, client: paramiko.SSHClient):
+        self.key = key
+        self.client = client
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self._sftp: Optional[paramiko.SFTPClient] = None
+
+    def sftp(self) -> paramiko.SFTPClient:
+        """Sdílený SFTP kanál spojení - volající ho nezavírá"""
+        if self._sftp is None or self._sftp.get_channel() is None or self._sftp.get_channel().closed:
+            self._sftp = self.client.open_sftp()
+            self._sftp.get_channel().settimeout(60)
+        return self._sftp
+
+    def is_active(self) -> bool:
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def close(self):
+        if self._sftp is not None:
+            try:
+                self._sftp.close()
+            except Exception:
+                pass
+            self._sftp = None
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+
+class SshConnectionPool:
+    """
+    Pool SSH spojení klíčovaný podle (host, port, user, key_file, hash hesla).
+    Spojení se půjčuje výhradně jednomu volajícímu; po vrácení zůstane otevřené
+    (keepalive) a další požadavek na stejný server ušetří TCP + key exchange + auth.
+    """
+
+    def __init__(self, max_size: int = POOL_MAX_SIZE, idle_timeout: float = POOL_IDLE_TIMEOUT):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle: Dict[PoolKey, List[PooledConnection]] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+        self._closed = False
+
+    @staticmethod
+    def make_key(host: str, port: int, username: str,
+                 password: Optional[str] = None, key_file: Optional[str] = None) -> PoolKey:
+        # Heslo je součástí klíče (jako hash) - změněné/špatné heslo nesmí dostat spojení ověřené jiným
+        secret = hashlib.sha256((password or "").encode("utf-8")).hexdigest()
+        return (host, int(port or 22), username, key_file or "", secret)
+
+    def acquire(self, host: str, port: int = 22, username: str = "",
+                password: Optional[str] = None, key_file: Optional[str] = None,
+                timeout: float = 30) -> PooledConnection:
+        """Půjčí spojení z poolu, případně otevře nové"""
+        key = self.make_key(host, port, username, password, key_file)
+        self._ensure_reaper()
+
+        while True:
+            with self._lock:
+                candidates = self._idle.get(key)
+                conn = candidates.pop() if candidates else None
+                if candidates is not None and not candidates:
+                    del self._idle[key]
+            if conn is None:
+                break
+            if self._healthy(conn):
+                conn.last_used = time.monotonic()
+                return conn
+            logger.info(f"SSH pool: dropping dead connection to {host}:{port}")
+            conn.close()
+
+        return self._open(key, host, port, username, password, key_file, timeout)
+
+    def release(self, conn: PooledConnection, broken: bool = False):
+        """Vrátí spojení do poolu (rozbité nebo nadbytečné se zavře)"""
+        if broken or self._closed or not conn.is_active():
+            conn.close()
+            return
+
+        conn.last_used = time.monotonic()
+        evicted = []
+        with self._lock:
+            self._idle.setdefault(conn.key, []).append(conn)
+            # Nad limit - zavřít nejdéle nepoužitá spojení
+            total = sum(len(v) for v in self._idle.values())
+            while total > self.max_size:
+                oldest_key = min(self._idle, key=lambda k: self._idle[k][0].last_used)
+                evicted.append(self._idle[oldest_key].pop(0))
+                if not self._idle[oldest_key]:
+                    del self._idle[oldest_key]
+                total -= 1
+        for old in evicted:
+            old.close()
+
+    @contextmanager
+    def connection(self, host: str, port: int = 22, username: str = "",
+                   password: Optional[str] = None, key_file: Optional[str] = None,
+                   timeout: float = 30) -> Iterator[PooledConnection]:
+        """Context manager - půjčí spojení a po skončení ho vrátí do poolu"""
+        conn = self.acquire(host, port, username, password, key_file, timeout)
+        broken = False
+        try:
+            yield conn
+        except (paramiko.SSHException, EOFError, socket.timeout):
+            # Chyby cest (FileNotFoundError apod.) spojení nerozbijí - release ověří is_active()
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def evict_idle(self):
+        """Zavře spojení nečinná déle než idle_timeout"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for key in list(self._idle):
+                keep = []
+                for conn in self._idle[key]:
+                    (expired if now - conn.last_used > self.idle_timeout else keep).append(conn)
+                if keep:
+                    self._idle[key] = keep
+                else:
+                    del self._idle[key]
+        for conn in expired:
+            conn.close()
+        if expired:
+            logger.debug(f"SSH pool: closed {len(expired)} idle connections")
+
+    def close_all(self):
+        """Zavře všechna nečinná spojení (při ukončení aplikace)"""
+        self._closed = True
+        with self._lock:
+            conns = [c for v in self._idle.values() for c in v]
+            self._idle.clear()
+        for conn in conns:
+            conn.close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "idle_connections": sum(len(v) for v in self._idle.values()),
+                "hosts": sorted({f"{k[2]}@{k[0]}:{k[1]}" for k in self._idle}),
+                "max_size": self.max_size,
+            }
+
+    def _open(self, key: PoolKey, host: str, port: int, username: str,
+              password: Optional[str], key_file: Optional[str], timeout: float) -> PooledConnection:
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        kw = dict(hostname=host, port=int(port or 22), username=username,
+                  timeout=timeout, banner_timeout=timeout)
+        if key_file:
+            kw["key_filename"] = key_file
+        else:
+            kw["password"] = password
+        try:
+            client.connect(**kw)
+        except Exception:
+            client.close()
+            raise
+        transport = client.get_transport()
+        if transport:
+            transport.set_keepalive(POOL_KEEPALIVE)
+        logger.info(f"SSH pool: opened connection to {username}@{host}:{port}")
+        return PooledConnection(key, client)
+
+    def _healthy(self, conn: PooledConnection) -> bool:
+        if not conn.is_active():
+            return False
+        if time.monotonic() - conn.last_used < POOL_HEALTH_CHECK_AFTER:
+            return True
+        # Dlouho nečinné spojení mohl zahodit firewall/NAT - ověřit jedním round tripem
+        try:
+            conn.sftp().stat(".")
+            return True
+        except Exception:
+            return False
+
+    def _ensure_reaper(self):
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._closed = False
+        self._reaper = threading.Thread(target=self._reap_loop, name="ssh-pool-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        while not self._closed:
+            time.sleep(POOL_REAPER_INTERVAL)
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.warning(f"SSH pool reaper error: {e}")
+
+
+ssh_pool = SshConnectionPool()
@@ -1,6 +1,7 @@
 """
 Storage service - spravuje životní cyklus SQLite DB na USB
 """
+import json
 import os
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
@@ -135,6 +136,60 @@ class StorageService:
             except Exception as e:
                 logger.warning(f"Migration _migrate_diffs_error_message failed: {e}", exc_info=True)
             
+            # Migrace - shodné soubory diffu jen jako počet a velikost (store_same, same_count, same_size)
+            try:
+                await self._migrate_diffs_same_totals()
+            except Exception as e:
+                logger.warning(f"Migration _migrate_diffs_same_totals failed: {e}", exc_info=True)
+            
+            # Migrace - uložené součty kategorií diffu (missing / conflict / extra _count, _size)
+            try:
+                await self._migrate_diffs_category_totals()
+            except Exception as e:
+                logger.warning(f"Migration _migrate_diffs_category_totals failed: {e}", exc_info=True)
+            
+            # Migrace - odkaz aktualizovaného diffu na původní diff
+            try:
+                await self._migrate_diffs_base_diff()
+            except Exception as e:
+                logger.warning(f"Migration _migrate_diffs_base_diff failed: {e}", exc_info=True)
+            
+            # Migrace - sloupce pro inkrementální scan
+            try:
+                await self._migrate_scans_incremental()
+            except Exception as e:
+                logger.warning(f"Migration _migrate_scans_incremental failed: {e}", exc_info=True)
+            
+            # Migrace - fingerprint sloupec do file_entries
+            try:
+                await self._migrate_file_entries_fingerprint()
+            except Exception as e:
+                logger.warning(f"Migration _migrate_file_entries_fingerprint failed: {e}", exc_info=True)
+            
+            # Migrace - hardlink sloupce (inode, dev, nlink, hardlink_of)
+            try:
+                await self._migrate_hardlinks()
+            except Exception as e:
+                logger.warning(f"Migration _migrate_hardlinks failed: {e}", exc_info=True)
+            
+            # Migrace - textové cesty na globální slovník cest (path_dirs / path_names)
+            try:
+                await self._migrate_path_dictionary()
+            except Exception as e:
+                logger.warning(f"Migration _migrate_path_dictionary failed: {e}", exc_info=True)
+            
+            # Migrace - normalizovaná cesta souborů (rel_dir_id / rel_name_id) pro existující scany
+            try:
+                await self._migrate_file_entries_rel_path()
+            except Exception as e:
+                logger.warning(f"Migration _migrate_file_entries_rel_path failed: {e}", exc_info=True)
+            
+            # Migrace - úplnost adresářů (scan_dirs.complete) a výjimky scanu pro inkrementální scan
+            try:
+                await self._migrate_incremental_scan_state()
+            except Exception as e:
+                logger.warning(f"Migration _migrate_incremental_scan_state failed: {e}", exc_info=True)
+            
             logger.info("Migrations completed")
             
             self.available = True
@@ -274,7 +329,8 @@ class StorageService:
                         CREATE TABLE job_file_statuses (
                             id INTEGER PRIMARY KEY AUTOINCREMENT,
                             job_id INTEGER NOT NULL,
-                            file_path TEXT NOT NULL,
+                            dir_id INTEGER NOT NULL,
+                            name_id INTEGER NOT NULL,
                             file_size INTEGER NOT NULL,
                             status TEXT NOT NULL,
                             error_message TEXT,
@@ -332,6 +388,282 @@ class StorageService:
             import traceback
             traceback.print_exc()
     
+    async def _migrate_scans_incremental(self):
+        """Migrace: přidá incremental a base_scan_id sloupce do scans tabulky pokud neexistují"""
+        try:
+            from sqlalchemy import text
+            with self.engine.begin() as conn:
+                for column, ddl in (
+                    ("incremental", "ALTER TABLE scans ADD COLUMN incremental BOOLEAN DEFAULT 0"),
+                    ("base_scan_id", "ALTER TABLE scans ADD COLUMN base_scan_id INTEGER REFERENCES scans(id)"),
+                ):
+                    result = conn.execute(text(
+                        f"SELECT COUNT(*) FROM pragma_table_info('scans') WHERE name='{column}'"
+                    ))
+                    if result.scalar() == 0:
+                        conn.execute(text(ddl))
+                        print(f"Migration: Added {column} column to scans table")
+                    else:
+                        print(f"Migration: {column} column already exists in scans table")
+        except Exception as e:
+            print(f"Migration error: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    async def _migrate_file_entries_fingerprint(self):
+        """Migrace: přidá fingerprint sloupec do file_entries tabulky pokud neexistuje"""
+        try:
+            from sqlalchemy import text
+            with self.engine.begin() as conn:
+                result = conn.execute(text(
+                    "SELECT COUNT(*) FROM pragma_table_info('file_entries') WHERE name='fingerprint'"
+                ))
+                if result.scalar() == 0:
+                    conn.execute(text("ALTER TABLE file_entries ADD COLUMN fingerprint TEXT"))
+                    print("Migration: Added fingerprint column to file_entries table")
+                else:
+                    print("Migration: fingerprint column already exists in file_entries table")
+        except Exception as e:
+            print(f"Migration error: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    async def _migrate_hardlinks(self):
+        """Migrace: přidá inode/dev/nlink do file_entries a hardlink_of do batch_items pokud neexistují"""
+        try:
+            from sqlalchemy import text
+            with self.engine.begin() as conn:
+                for table, column, ddl in (
+                    ("file_entries", "inode", "ALTER TABLE file_entries ADD COLUMN inode INTEGER"),
+                    ("file_entries", "dev", "ALTER TABLE file_entries ADD COLUMN dev INTEGER"),
+                    ("file_entries", "nlink", "ALTER TABLE file_entries ADD COLUMN nlink INTEGER"),
+                    ("batch_items", "hardlink_of", "ALTER TABLE batch_items ADD COLUMN hardlink_of TEXT"),
+                ):
+                    result = conn.execute(text(
+                        f"SELECT COUNT(*) FROM pragma_table_info('{table}') WHERE name='{column}'"
+                    ))
+                    if result.scalar() == 0:
+                        conn.execute(text(ddl))
+                        print(f"Migration: Added {column} column to {table} table")
+                    else:
+                        print(f"Migration: {column} column already exists in {table} table")
+        except Exception as e:
+            print(f"Migration error: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    async def _migrate_path_dictionary(self):
+        """
+        Migrace: cesty v file_entries, diff_items, batch_items a job_file_statuses převede
+        na (dir_id, name_id) do slovníku path_dirs / path_names a textový sloupec odstraní.
+        Jedna transakce - při chybě zůstane databáze v původním stavu.
+        """
+        try:
+            from sqlalchemy import text
+            from backend.path_dictionary import register_path_functions
+            with self.engine.begin() as conn:
+                register_path_functions(conn.connection.driver_connection)
+                for table, column in (
+                    ("file_entries", "full_rel_path"),
+                    ("diff_items", "full_rel_path"),
+                    ("batch_items", "full_rel_path"),
+                    ("job_file_statuses", "file_path"),
+                ):
+                    result = conn.execute(text(
+                        f"SELECT COUNT(*) FROM pragma_table_info('{table}') WHERE name='{column}'"
+                    ))
+                    if result.scalar() == 0:
+                        print(f"Migration: {table} already uses path dictionary")
+                        continue
+                    for id_column in ("dir_id", "name_id"):
+                        result = conn.execute(text(
+                            f"SELECT COUNT(*) FROM pragma_table_info('{table}') WHERE name='{id_column}'"
+                        ))
+                        if result.scalar() == 0:
+                            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {id_column} INTEGER"))
+                    conn.execute(text(f"INSERT OR IGNORE INTO path_dirs (path) SELECT DISTINCT path_dir({column}) FROM {table}"))
+                    conn.execute(text(f"INSERT OR IGNORE INTO path_names (name) SELECT DISTINCT path_name({column}) FROM {table}"))
+                    conn.execute(text(
+                        f"UPDATE {table} SET "
+                        f"dir_id = (SELECT id FROM path_dirs WHERE path = path_dir({table}.{column})), "
+                        f"name_id = (SELECT id FROM path_names WHERE name = path_name({table}.{column}))"
+                    ))
+                    # Indexy nad textovou cestou brání DROP COLUMN
+                    index_names = conn.execute(text(
+                        f"SELECT DISTINCT il.name FROM pragma_index_list('{table}') il "
+                        f"JOIN pragma_index_info(il.name) ii WHERE ii.name = '{column}' AND il.origin = 'c'"
+                    )).scalars().all()
+                    for index_name in index_names:
+                        conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+                    conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+                    print(f"Migration: Moved {table}.{column} to path dictionary (dropped indexes: {', '.join(index_names) or 'none'})")
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_file_entries_scan_dir_name ON file_entries (scan_id, dir_id, name_id)"
+                ))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_diff_items_diff_dir_name ON diff_items (diff_id, dir_id, name_id)"
+                ))
+        except Exception as e:
+            print(f"Migration error: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    async def _migrate_diffs_same_totals(self):
+        """
+        Migrace: přidá do diffs store_same, same_count a same_size. Starší diffy mají shodné
+        soubory uložené jako DiffItem - dostanou store_same=1 a součty z jejich položek.
+        """
+        try:
+            from sqlalchemy import text
+            with self.engine.begin() as conn:
+                result = conn.execute(text("""
+                    SELECT COUNT(*) FROM pragma_table_info('diffs') WHERE name='store_same'
+                """))
+                if result.scalar() == 0:
+                    conn.execute(text("ALTER TABLE diffs ADD COLUMN store_same BOOLEAN DEFAULT 0"))
+                    conn.execute(text("ALTER TABLE diffs ADD COLUMN same_count INTEGER"))
+                    conn.execute(text("ALTER TABLE diffs ADD COLUMN same_size INTEGER"))
+                    conn.execute(text("""
+                        UPDATE diffs SET store_same = 1,
+                            same_count = (SELECT COUNT(*) FROM diff_items i WHERE i.diff_id = diffs.id AND i.category = 'same'),
+                            same_size = (SELECT COALESCE(SUM(i.source_size), 0) FROM diff_items i WHERE i.diff_id = diffs.id AND i.category = 'same')
+                    """))
+                    print("Migration: Added store_same, same_count, same_size columns to diffs table")
+                else:
+                    print("Migration: store_same column already exists in diffs table")
+        except Exception as e:
+            print(f"Migration error: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    async def _migrate_diffs_category_totals(self):
+        """
+        Migrace: přidá do diffs součty kategorií missing / conflict / extra (počet a velikost).
+        Starší diffy je nemají - summary je spočítá agregací položek a uloží při prvním dotazu.
+        """
+        try:
+            from sqlalchemy import text
+            with self.engine.begin() as conn:
+                added = []
+                for category in ("missing", "conflict", "extra"):
+                    for suffix in ("count", "size"):
+                        column = f"{category}_{suffix}"
+                        result = conn.execute(text(
+                            f"SELECT COUNT(*) FROM pragma_table_info('diffs') WHERE name='{column}'"
+                        ))
+                        if result.scalar() == 0:
+                            conn.execute(text(f"ALTER TABLE diffs ADD COLUMN {column} INTEGER"))
+                            added.append(column)
+                if added:
+                    print(f"Migration: Added {', '.join(added)} columns to diffs table")
+                else:
+                    print("Migration: category total columns already exist in diffs table")
+        except Exception as e:
+            print(f"Migration error: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    async def _migrate_diffs_base_diff(self):
+        """Migrace: přidá base_diff_id sloupec do diffs tabulky pokud neexistuje"""
+        try:
+            from sqlalchemy import text
+            with self.engine.begin() as conn:
+                result = conn.execute(text("""
+                    SELECT COUNT(*) FROM pragma_table_info('diffs') WHERE name='base_diff_id'
+                """))
+                if result.scalar() == 0:
+                    conn.execute(text("ALTER TABLE diffs ADD COLUMN base_diff_id INTEGER REFERENCES diffs(id)"))
+                    print("Migration: Added base_diff_id column to diffs table")
+                else:
+                    print("Migration: base_diff_id column already exists in diffs table")
+        except Exception as e:
+            print(f"Migration error: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    async def _migrate_incremental_scan_state(self):
+        """
+        Migrace: přidá scan_dirs.complete a scans.exclude_patterns. Starší adresáře se berou
+        jako úplné, starší scany nemají výjimky uložené - první inkrementální scan bude plný.
+        """
+        try:
+            from sqlalchemy import text
+            with self.engine.begin() as conn:
+                for table, column, ddl in (
+                    ("scan_dirs", "complete", "ALTER TABLE scan_dirs ADD COLUMN complete BOOLEAN DEFAULT 1"),
+                    ("scans", "exclude_patterns", "ALTER TABLE scans ADD COLUMN exclude_patterns JSON"),
+                ):
+                    result = conn.execute(text(
+                        f"SELECT COUNT(*) FROM pragma_table_info('{table}') WHERE name='{column}'"
+                    ))
+                    if result.scalar() == 0:
+                        conn.execute(text(ddl))
+                        print(f"Migration: Added {column} column to {table} table")
+                    else:
+                        print(f"Migration: {column} column already exists in {table} table")
+        except Exception as e:
+            print(f"Migration error: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    async def _migrate_file_entries_rel_path(self):
+        """
+        Migrace: přidá do file_entries normalizovanou cestu (rel_dir_id, rel_name_id) a dopočítá
+        ji pro soubory starších scanů - stejně jako writer scanu (root složka souboru, jinak
+        první root datasetu). Po blocích podle id, jedna transakce.
+        """
+        try:
+            from sqlalchemy import text
+            from backend.path_dictionary import PATH_SQL, PathDictionary
+            from backend.utils import normalize_entry_path, normalize_root_rel_path
+            with self.engine.begin() as conn:
+                for column in ("rel_dir_id", "rel_name_id"):
+                    result = conn.execute(text(
+                        f"SELECT COUNT(*) FROM pragma_table_info('file_entries') WHERE name='{column}'"
+                    ))
+                    if result.scalar() == 0:
+                        conn.execute(text(f"ALTER TABLE file_entries ADD COLUMN {column} INTEGER"))
+                        print(f"Migration: Added {column} column to file_entries table")
+                
+                raw = conn.connection.driver_connection
+                dataset_roots = {}
+                for scan_id, roots in raw.execute("SELECT s.id, d.roots FROM scans s JOIN datasets d ON d.id = s.dataset_id"):
+                    roots = json.loads(roots) if isinstance(roots, str) else roots
+                    dataset_roots[scan_id] = normalize_root_rel_path(roots[0]) if roots else ""
+                
+                paths = PathDictionary()
+                backfilled = 0
+                last_id = 0
+                while True:
+                    rows = raw.execute(
+                        f"SELECT f.id, f.scan_id, {PATH_SQL}, f.root_rel_path "
+                        "FROM file_entries f JOIN path_dirs d ON d.id = f.dir_id JOIN path_names n ON n.id = f.name_id "
+                        "WHERE f.id > ? AND f.rel_dir_id IS NULL ORDER BY f.id LIMIT 10000",
+                        (last_id,)
+                    ).fetchall()
+                    if not rows:
+                        break
+                    last_id = rows[-1][0]
+                    rel_ids = paths.ids_many(raw, [
+                        normalize_entry_path(path, root, dataset_roots.get(scan_id, "")) for _, scan_id, path, root in rows
+                    ])
+                    raw.executemany(
+                        "UPDATE file_entries SET rel_dir_id = ?, rel_name_id = ? WHERE id = ?",
+                        [ids + (row[0],) for row, ids in zip(rows, rel_ids)]
+                    )
+                    backfilled += len(rows)
+                if backfilled:
+                    print(f"Migration: Computed normalized path for {backfilled} file_entries rows")
+                else:
+                    print("Migration: file_entries normalized paths already computed")
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_file_entries_scan_rel ON file_entries (scan_id, rel_dir_id, rel_name_id)"
+                ))
+        except Exception as e:
+            print(f"Migration error: {e}")
+            import traceback
+            traceback.print_exc()
+    
     async def _disconnect(self):
         """Odpojí se od databáze"""
         if self.engine:
@@ -61,6 +61,16 @@ def normalize_path(path: str, root: str) -> str:
     return unicodedata.normalize("NFC", result)
 
 
+def normalize_entry_path(path: str, root_rel_path: str, dataset_root: str) -> str:
+    """Normalized path of a scanned file, as stored in file_entries and compared by diff and copy.
+
+    The file's own root folder wins; files without one are relative to the dataset root
+    (already passed through normalize_root_rel_path).
+    """
+    file_root = normalize_root_rel_path(root_rel_path) if root_rel_path else ""
+    return normalize_path(path, file_root or dataset_root)
+
+
 def is_ignored_path(path: str) -> bool:
     """Check if a path should be ignored (e.g. macOS/NTFS metadata streams)."""
     for segment in IGNORED_PATH_SEGMENTS:
@@ -0,0 +1 @@
+# Scan benchmarks
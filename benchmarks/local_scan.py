@@ -0,0 +1,128 @@
+"""
+Before/after benchmark for LocalScanAdapter.list_files.
+
+Builds a synthetic tree in a temporary directory and compares files/sec of the
+previous os.walk + per-file os.stat/abspath/commonpath/relpath implementation
+with the current os.scandir based walker. Both must produce the same entries.
+
+Usage (from the repository root):
+    python -m benchmarks.local_scan --files 200000 --fanout 20 --depth 3
+    python -m benchmarks.local_scan --path /mnt/nas1 --root Filmy
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import unicodedata
+from typing import Iterator, List
+
+from backend.adapters.base import FileEntry
+from backend.adapters.local_scan import LocalScanAdapter
+
+
+def legacy_list_files(base_path: str, roots: List[str]) -> Iterator[FileEntry]:
+    """The os.walk based implementation that LocalScanAdapter used before the scandir rewrite."""
+    base_path_abs = os.path.abspath(os.path.normpath(base_path))
+    for root_rel in roots:
+        root_rel_clean = root_rel.strip("/")
+        root_abs = os.path.join(base_path, root_rel_clean) if root_rel_clean else base_path
+        root_abs = os.path.abspath(os.path.normpath(root_abs))
+        if not os.path.isdir(root_abs):
+            continue
+        for dirpath, dirnames, filenames in os.walk(root_abs):
+            dirpath_abs = os.path.abspath(os.path.normpath(dirpath))
+            if os.path.commonpath([base_path_abs, dirpath_abs]) != base_path_abs:
+                dirnames[:] = []
+                continue
+            for filename in filenames:
+                file_path = os.path.join(dirpath, filename)
+                file_path_abs = os.path.abspath(os.path.normpath(file_path))
+                if os.path.commonpath([base_path_abs, file_path_abs]) != base_path_abs:
+                    continue
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                rel_path = os.path.relpath(file_path_abs, base_path_abs).replace("\\", "/")
+                rel_path = unicodedata.normalize("NFC", rel_path)
+                root_rel_path = root_rel_clean if root_rel_clean else "/"
+                if root_rel_clean and not rel_path.startswith(root_rel_clean + "/") and rel_path != root_rel_clean:
+                    for r in roots:
+                        r_clean = r.strip("/")
+                        if r_clean and (rel_path.startswith(r_clean + "/") or rel_path == r_clean):
+                            root_rel_path = r_clean
+                            break
+                yield FileEntry(
+                    full_rel_path=rel_path,
+                    size=stat.st_size,
+                    mtime_epoch=stat.st_mtime,
+                    root_rel_path=root_rel_path,
+                )
+
+
+def build_tree(base: str, root: str, files: int, fanout: int, depth: int) -> int:
+    """Create `files` empty-ish files spread over a fanout^depth directory tree."""
+    leaves = [os.path.join(base, root)]
+    for level in range(depth):
+        leaves = [os.path.join(d, f"dir_{level}_{i:03d}") for d in leaves for i in range(fanout)]
+    for leaf in leaves:
+        os.makedirs(leaf, exist_ok=True)
+    per_leaf = max(1, files // len(leaves))
+    created = 0
+    for leaf in leaves:
+        for i in range(per_leaf):
+            with open(os.path.join(leaf, f"file_{i:05d}.bin"), "wb") as f:
+                f.write(b"x" * (i % 7))
+            created += 1
+    return created
+
+
+def _measure(label: str, iterator_factory, repeat: int) -> tuple:
+    best = None
+    entries = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        entries = list(iterator_factory())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    rate = len(entries) / best if best else 0.0
+    print(f"{label:<10} {len(entries):>10} files  {best:8.3f} s  {rate:>12,.0f} files/s")
+    return entries, rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LocalScanAdapter before/after benchmark")
+    parser.add_argument("--path", help="Existing base path to scan (default: generate a synthetic tree)")
+    parser.add_argument("--root", default="data", help="Root folder under base path")
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per implementation, best time is reported")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    base = args.path
+    if not base:
+        tmp_dir = tempfile.mkdtemp(prefix="scan-bench-")
+        base = tmp_dir
+        created = build_tree(base, args.root, args.files, args.fanout, args.depth)
+        print(f"Generated {created} files under {base}")
+
+    try:
+        roots = [args.root]
+        before, before_rate = _measure("os.walk", lambda: legacy_list_files(base, roots), args.repeat)
+        after, after_rate = _measure("scandir", lambda: LocalScanAdapter(base).list_files(roots), args.repeat)
+
+        key = lambda e: e.full_rel_path
+        if sorted(before, key=key) != sorted(after, key=key):
+            print("WARNING: implementations produced different entries")
+        if before_rate:
+            print(f"speedup    {after_rate / before_rate:.2f}x")
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
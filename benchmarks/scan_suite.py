@@ -0,0 +1,322 @@
+"""
+Scan throughput benchmark suite.
+
+Generates a synthetic tree (benchmarks.tree) and lists it with LocalScanAdapter
+and with SshScanAdapter through an in-process SSH/SFTP server on localhost
+(benchmarks.sftp_server), once per SSH backend:
+
+    local      LocalScanAdapter (os.scandir)
+    ssh-sftp   SFTP walker (--sftp-workers channels)
+    ssh-find   remote `find -printf` over one exec channel
+    ssh-agent  remote scan agent against a manifest of an unchanged previous scan
+
+For every backend it reports listing files/sec, peak RSS during the listing
+and the DB insert rate of the scan writer (listing streamed into a fresh
+SQLite database, as in a real scan). The SSH server runs in this process, so
+its memory is part of the RSS figures; find and the agent run as child
+processes and are not.
+
+Results are written as JSON together with the commit they were measured on;
+--compare prints the change between two result files.
+
+Usage (from the repository root):
+    python -m benchmarks.scan_suite --files 50000 --output bench-new.json
+    python -m benchmarks.scan_suite --backends local,ssh-find --nfd 0.2
+    python -m benchmarks.scan_suite --compare bench-old.json bench-new.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import create_engine
+
+from backend.adapters.base import FileEntry
+from backend.adapters.local_scan import LocalScanAdapter
+from backend.adapters.ssh_scan import SshScanAdapter
+from backend.config import compile_exclude_patterns
+from backend.database import Base
+from backend.job_runner import _ScanWriter
+from backend.scan_manifest import ScanManifest
+from backend.ssh_pool import ssh_pool
+from benchmarks.sftp_server import LocalSSHServer
+from benchmarks.tree import TreeShape, build_tree
+
+BACKENDS = ("local", "ssh-sftp", "ssh-find", "ssh-agent")
+# Metrics shown by --compare: (key, label, higher is better)
+COMPARED_METRICS = (
+    ("files_per_sec", "files/s", True),
+    ("peak_rss_mb", "peak RSS MB", False),
+    ("db_rows_per_sec", "DB rows/s", True),
+    ("scan_files_per_sec", "scan files/s", True),
+)
+
+
+class RssSampler:
+    """Peak resident set size while active, sampled from /proc/self/statm.
+
+    Falls back to ru_maxrss (process lifetime peak) where /proc is missing.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.baseline_mb = 0.0
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def current_mb() -> Optional[float]:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, self.current_mb() or 0.0)
+
+    def __enter__(self) -> "RssSampler":
+        current = self.current_mb()
+        if current is not None:
+            self.baseline_mb = self.peak_mb = current
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self.peak_mb = max(self.peak_mb, self.current_mb() or 0.0)
+        else:
+            # ru_maxrss is in KB on Linux
+            self.peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    @property
+    def growth_mb(self) -> float:
+        return max(0.0, self.peak_mb - self.baseline_mb)
+
+
+def _create_db(path: str):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+
+def _write_scan(db_path: str, scan_id: int, entries: Iterable[FileEntry]) -> _ScanWriter:
+    """Stream entries into file_entries through the scan writer thread (as run_scan does)."""
+    writer = _ScanWriter(db_path, scan_id, None, compile_exclude_patterns(()))
+    writer.start()
+    try:
+        for entry in entries:
+            writer.add_file((
+                scan_id, entry.full_rel_path, entry.size, entry.mtime_epoch, entry.root_rel_path,
+                entry.fingerprint, entry.inode, entry.dev, entry.nlink,
+            ))
+        writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    return writer
+
+
+class Bench:
+    def __init__(self, base: str, root: str, work_dir: str, port: Optional[int],
+                 sftp_workers: int, repeat: int):
+        self.base = base
+        self.root = root
+        self.work_dir = work_dir
+        self.port = port
+        self.sftp_workers = sftp_workers
+        self.repeat = repeat
+
+    def adapter(self, backend: str):
+        if backend == "local":
+            return LocalScanAdapter(self.base)
+        return SshScanAdapter(
+            "127.0.0.1", self.port, "bench", "bench", base_path=self.base,
+            scan_mode=backend[len("ssh-"):], sftp_workers=self.sftp_workers,
+        )
+
+    def run(self, backend: str) -> Dict:
+        db_path = os.path.join(self.work_dir, f"{backend}.sqlite")
+        _create_db(db_path)
+        roots = [self.root]
+        manifest = None
+        if backend == "ssh-agent":
+            # Previous scan of the same (unchanged) tree - the agent returns no changes
+            _write_scan(db_path, 1, LocalScanAdapter(self.base).list_files(roots))
+            manifest = ScanManifest(db_path, 1)
+
+        # Listing only: nothing is retained, so the RSS is the adapter's own
+        best = None
+        peak_mb = growth_mb = 0.0
+        listed = 0
+        adapter = None
+        for _ in range(self.repeat):
+            adapter = self.adapter(backend)
+            if manifest is not None:
+                manifest.removed.clear()
+                manifest.roots.clear()
+            with RssSampler() as rss:
+                started = time.perf_counter()
+                listed = sum(1 for _ in adapter.list_files(roots, manifest=manifest))
+                elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+            peak_mb = max(peak_mb, rss.peak_mb)
+            growth_mb = max(growth_mb, rss.growth_mb)
+        # The agent yields only changes - throughput is over the files it walked
+        files = adapter.stats["files_found"] if backend != "local" else listed
+
+        # Listing streamed into a fresh scan, including the agent's copy of unchanged rows
+        scan_id = 2
+        adapter = self.adapter(backend)
+        if manifest is not None:
+            manifest.removed.clear()
+            manifest.roots.clear()
+        started = time.perf_counter()
+        writer = _write_scan(db_path, scan_id, adapter.list_files(roots, manifest=manifest))
+        db_rows = writer.stats["rows_written"]
+        # Insert rate counts time spent in commits, not the writer waiting for the listing
+        insert_seconds = writer.stats["commit_time"]
+        if manifest is not None:
+            apply_started = time.perf_counter()
+            conn = sqlite3.connect(db_path)
+            db_rows += manifest.apply(conn, scan_id, compile_exclude_patterns(()))
+            conn.commit()
+            conn.close()
+            insert_seconds += time.perf_counter() - apply_started
+        scan_seconds = time.perf_counter() - started
+
+        return {
+            "files": files,
+            "yielded": listed,
+            "errors": len(getattr(adapter, "stats", {}).get("errors", [])),
+            "seconds": round(best, 4),
+            "files_per_sec": round(files / best, 1) if best else 0.0,
+            "peak_rss_mb": round(peak_mb, 1),
+            "rss_growth_mb": round(growth_mb, 1),
+            "db_rows": db_rows,
+            "db_commits": writer.stats["commits"],
+            "db_insert_seconds": round(insert_seconds, 4),
+            "db_rows_per_sec": round(db_rows / insert_seconds, 1) if insert_seconds else 0.0,
+            # Listing and writing together, as a scan job runs them
+            "scan_seconds": round(scan_seconds, 4),
+            "scan_files_per_sec": round(db_rows / scan_seconds, 1) if scan_seconds else 0.0,
+        }
+
+
+def _git_commit() -> Dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"old: {old.get('commit')}  {old.get('timestamp')}")
+    print(f"new: {new.get('commit')}  {new.get('timestamp')}")
+    if old.get("shape") != new.get("shape"):
+        print("WARNING: results were measured on different tree shapes")
+    for backend in BACKENDS:
+        if backend not in old["results"] or backend not in new["results"]:
+            continue
+        for key, label, higher_better in COMPARED_METRICS:
+            a = old["results"][backend].get(key)
+            b = new["results"][backend].get(key)
+            if not a or b is None:
+                continue
+            change = (b - a) / a * 100
+            worse = change < 0 if higher_better else change > 0
+            flag = "  REGRESSION" if worse and abs(change) >= 10 else ""
+            print(f"{backend:<10} {label:<12} {a:>12,.1f} -> {b:>12,.1f}  {change:+6.1f}%{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan throughput benchmark suite")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    parser.add_argument("--path", help="Existing base path to scan (default: generate a synthetic tree)")
+    parser.add_argument("--root", default="data", help="Root folder under base path")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help=f"Comma separated subset of {', '.join(BACKENDS)}")
+    parser.add_argument("--sftp-workers", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3, help="Listing runs per backend, best time is reported")
+    parser.add_argument("--output", help="JSON result file (default: scan-bench-<commit>.json)")
+    for field, default in asdict(TreeShape()).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", dest=field, type=type(default), default=default)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    unknown = [b for b in backends if b not in BACKENDS]
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(unknown)}")
+
+    shape = TreeShape(**{field: getattr(args, field) for field in asdict(TreeShape())})
+    work_dir = tempfile.mkdtemp(prefix="scan-bench-")
+    result = {
+        **_git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "shape": asdict(shape) if not args.path else None,
+        "path": args.path,
+        "tree": None,
+        "results": {},
+    }
+    try:
+        base = args.path
+        if not base:
+            base = os.path.join(work_dir, "tree")
+            stats = build_tree(base, args.root, shape)
+            result["tree"] = asdict(stats)
+            print(f"Generated {stats.files} files in {stats.dirs} directories "
+                  f"({stats.non_ascii_names} non-ASCII names, {stats.nfd_names} NFD)")
+
+        with LocalSSHServer() as server:
+            bench = Bench(base, args.root, work_dir, server.port, args.sftp_workers, args.repeat)
+            print(f"{'backend':<10} {'files':>9} {'files/s':>11} {'peak RSS':>10} {'DB rows/s':>11} {'scan/s':>9} {'errors':>7}")
+            for backend in backends:
+                try:
+                    r = bench.run(backend)
+                except Exception as e:
+                    result["results"][backend] = {"error": str(e)}
+                    print(f"{backend:<10} FAILED: {e}")
+                    continue
+                result["results"][backend] = r
+                print(f"{backend:<10} {r['files']:>9} {r['files_per_sec']:>11,.0f} {r['peak_rss_mb']:>8.1f}MB "
+                      f"{r['db_rows_per_sec']:>11,.0f} {r['scan_files_per_sec']:>9,.0f} {r['errors']:>7}")
+            ssh_pool.close_all()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or f"scan-bench-{(result['commit'] or 'unknown')[:10]}.json"
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+In-process SSH/SFTP server on localhost for benchmarking SshScanAdapter.
+
+Serves the local filesystem over paramiko's SFTP server and, optionally,
+runs exec requests (remote `find`, the scan agent) as local shell commands, so
+every SSH scan backend can be measured without a real NAS. Any username and
+password are accepted - bind address is 127.0.0.1 only.
+"""
+import os
+import socket
+import subprocess
+import threading
+from typing import List, Optional
+
+import paramiko
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface
+
+
+class _Handle(SFTPHandle):
+    def stat(self):
+        try:
+            return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+
+class _LocalSFTP(SFTPServerInterface):
+    """SFTP operations on the local filesystem (paths are used as given)."""
+
+    def list_folder(self, path):
+        try:
+            items = []
+            for name in os.listdir(path):
+                attr = SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)))
+                attr.filename = name
+                items.append(attr)
+            return items
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.stat(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.lstat(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        try:
+            fd = os.open(path, flags, 0o600)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "r+b"
+        else:
+            mode = "rb"
+        f = os.fdopen(fd, mode)
+        handle = _Handle(flags)
+        handle.filename = path
+        handle.readfile = f
+        handle.writefile = f
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(path)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(path)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def canonicalize(self, path):
+        return os.path.normpath(path if path.startswith("/") else "/" + path)
+
+
+class _Server(paramiko.ServerInterface):
+    def __init__(self, allow_exec: bool):
+        self.allow_exec = allow_exec
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        if not self.allow_exec:
+            return False
+        threading.Thread(target=_run_exec, args=(channel, command), daemon=True).start()
+        return True
+
+
+def _run_exec(channel, command: bytes):
+    """Run an exec request as a local shell command, streaming stdout/stderr to the channel."""
+    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def pump_stderr():
+        for chunk in iter(lambda: process.stderr.read(65536), b""):
+            channel.sendall_stderr(chunk)
+
+    stderr_thread = threading.Thread(target=pump_stderr, daemon=True)
+    stderr_thread.start()
+    try:
+        for chunk in iter(lambda: process.stdout.read1(256 * 1024), b""):
+            channel.sendall(chunk)
+    except Exception:
+        process.kill()
+    stderr_thread.join()
+    channel.send_exit_status(process.wait())
+    channel.close()
+
+
+class LocalSSHServer:
+    """Context manager: `with LocalSSHServer() as server: ... server.port`"""
+
+    def __init__(self, allow_exec: bool = True):
+        self.allow_exec = allow_exec
+        self.port: Optional[int] = None
+        self._key = paramiko.RSAKey.generate(2048)
+        self._sock: Optional[socket.socket] = None
+        self._transports: List[paramiko.Transport] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "LocalSSHServer":
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(16)
+        self.port = self._sock.getsockname()[1]
+        self._thread = threading.Thread(target=self._accept, name="bench-sshd", daemon=True)
+        self._thread.start()
+        return self
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(client)
+            transport.add_server_key(self._key)
+            transport.set_subsystem_handler("sftp", SFTPServer, _LocalSFTP)
+            transport.start_server(server=_Server(self.allow_exec))
+            self._transports.append(transport)
+
+    def __exit__(self, *exc):
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+        for transport in self._transports:
+            transport.close()
@@ -0,0 +1,122 @@
+"""
+Synthetic directory tree generator for scan benchmarks.
+
+The shape is configurable: file count, directory depth and fan-out, name
+length distribution and the share of non-ASCII and NFD (decomposed Unicode)
+names, which exercise the NFC normalization and encoding paths of the
+scanners. Generation is deterministic for a given seed, so runs on different
+commits scan the same tree.
+
+Usage (from the repository root):
+    python -m benchmarks.tree /tmp/tree --files 50000 --depth 4 --nfd 0.05
+"""
+import argparse
+import os
+import random
+import unicodedata
+from dataclasses import asdict, dataclass
+from typing import List
+
+ASCII_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-. "
+# Composed characters - written in NFD they become base letter + combining mark
+NON_ASCII_CHARS = "áčďéěíňóřšťúůýžÁČŘŠŽäöüßñçåøèêëàâîïôûÿœ"
+WIDE_CHARS = "日本語文件写真音楽"
+EXTENSIONS = (".txt", ".jpg", ".mkv", ".pdf", ".flac", ".bin", "")
+
+
+@dataclass
+class TreeShape:
+    files: int = 20000
+    depth: int = 3
+    fanout: int = 6
+    name_min: int = 4          # name length (without extension) is uniform in [name_min, name_max]
+    name_max: int = 24
+    non_ascii: float = 0.10    # share of names containing non-ASCII characters
+    nfd: float = 0.03          # share of non-ASCII names written in NFD form
+    max_size: int = 65536      # file sizes are uniform in [0, max_size] (sparse files)
+    seed: int = 1
+
+
+@dataclass
+class TreeStats:
+    files: int = 0
+    dirs: int = 0
+    bytes: int = 0
+    non_ascii_names: int = 0
+    nfd_names: int = 0
+
+
+def _name(rng: random.Random, shape: TreeShape, stats: TreeStats) -> str:
+    length = rng.randint(shape.name_min, max(shape.name_min, shape.name_max))
+    chars = [rng.choice(ASCII_CHARS) for _ in range(length)]
+    if rng.random() < shape.non_ascii:
+        pool = WIDE_CHARS if rng.random() < 0.2 else NON_ASCII_CHARS
+        for _ in range(max(1, length // 4)):
+            chars[rng.randrange(length)] = rng.choice(pool)
+        stats.non_ascii_names += 1
+        name = "".join(chars).strip(" .") or "x"
+        if rng.random() < shape.nfd and unicodedata.normalize("NFD", name) != name:
+            stats.nfd_names += 1
+            return unicodedata.normalize("NFD", name)
+        return name
+    return "".join(chars).strip(" .") or "x"
+
+
+def build_tree(base: str, root: str, shape: TreeShape) -> TreeStats:
+    """Create the tree under base/root and return what was generated."""
+    rng = random.Random(shape.seed)
+    stats = TreeStats()
+    root_path = os.path.join(base, root)
+    os.makedirs(root_path, exist_ok=True)
+
+    # Directory levels: fanout children per directory down to `depth`
+    dirs: List[str] = [root_path]
+    level = [root_path]
+    for _ in range(shape.depth):
+        next_level = []
+        for parent in level:
+            used = set()
+            for i in range(shape.fanout):
+                name = _name(rng, shape, stats)
+                # Unique per directory, also after NFC normalization (scanners normalize)
+                while unicodedata.normalize("NFC", name) in used:
+                    name = f"{name}_{i}"
+                used.add(unicodedata.normalize("NFC", name))
+                path = os.path.join(parent, name)
+                os.mkdir(path)
+                next_level.append(path)
+        dirs.extend(next_level)
+        level = next_level
+    stats.dirs = len(dirs)
+
+    used_names = {}
+    for i in range(shape.files):
+        directory = rng.choice(dirs)
+        used = used_names.setdefault(directory, set())
+        name = _name(rng, shape, stats) + rng.choice(EXTENSIONS)
+        while unicodedata.normalize("NFC", name) in used:
+            name = f"{i}_{name}"
+        used.add(unicodedata.normalize("NFC", name))
+        size = rng.randint(0, shape.max_size)
+        with open(os.path.join(directory, name), "wb") as f:
+            f.truncate(size)
+        stats.files += 1
+        stats.bytes += size
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic directory tree")
+    parser.add_argument("base", help="Directory to create the tree in")
+    parser.add_argument("--root", default="data", help="Root folder under base")
+    for field, default in asdict(TreeShape()).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", dest=field, type=type(default), default=default)
+    args = parser.parse_args()
+    shape = TreeShape(**{field: getattr(args, field) for field in asdict(TreeShape())})
+    stats = build_tree(args.base, args.root, shape)
+    print(f"Generated {stats.files} files ({stats.bytes / 1024**2:.1f} MB) in {stats.dirs} directories, "
+          f"{stats.non_ascii_names} non-ASCII names ({stats.nfd_names} NFD)")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,9 @@ const STATUS_MAP = {
   completed: 'badge-completed',
   running: 'badge-running',
   pending: 'badge-pending',
+  paused: 'badge-pending',
   failed: 'badge-failed',
+  cancelled: 'badge-muted',
   unknown: 'badge-unknown',
   missing: 'badge-missing',
   conflict: 'badge-conflict',
@@ -16,7 +18,9 @@ const LABEL_MAP = {
   completed: 'Dokončeno',
   running: 'Běží',
   pending: 'Čeká',
+  paused: 'Pozastaveno',
   failed: 'Chyba',
+  cancelled: 'Zrušeno',
   missing: 'Chybí',
   conflict: 'Konflikt',
   extra: 'Přebývá',
@@ -215,7 +215,7 @@ function DiffDetail({ diffId }) {
         <thead><tr><th>Kategorie</th><th>Cesta</th><th>Velikost</th></tr></thead>
         <tbody>
           {items.slice(0, displayLimit).map(item => (
-            <tr key={item.id}>
+            <tr key={item.id ?? item.full_rel_path}>
               <td><StatusBadge status={item.category} /></td>
               <td className="text-mono text-sm">{item.full_rel_path}</td>
               <td className="nowrap">{formatGB(item.source_size || item.target_size)}</td>
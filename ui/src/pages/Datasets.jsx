@@ -195,6 +195,17 @@ export default function Datasets() {
               </select>
             </div>
 
+            {formData.scan_adapter_type === 'local' && (
+              <div className="subform">
+                <div className="subform-title">Lokální scan konfigurace</div>
+                <div className="form-group">
+                  <label className="form-label">Paralelní vlákna</label>
+                  <input className="input" type="number" min="1" max="64" value={formData.scan_adapter_config?.workers || 1} onChange={e => updateConfig('scan_adapter_config', 'workers', Math.max(1, parseInt(e.target.value) || 1))} />
+                  <span className="form-hint">Počet současně listovaných adresářů. Pro síťové mounty (SMB/NFS) zrychlí scan, 1 = sériový průchod.</span>
+                </div>
+              </div>
+            )}
+
             {formData.scan_adapter_type === 'ssh' && (
               <div className="subform">
                 <div className="subform-title">SSH Scan konfigurace</div>
@@ -221,9 +232,40 @@ export default function Datasets() {
                   <input className="input" value={formData.scan_adapter_config?.base_path || '/'} onChange={e => updateConfig('scan_adapter_config', 'base_path', e.target.value)} placeholder="/" />
                   <span className="form-hint">Výchozí cesta na SSH serveru, ze které se relativně řeší root složky.</span>
                 </div>
+                <div className="form-group">
+                  <label className="form-label">Režim scanu</label>
+                  <select className="input select" value={formData.scan_adapter_config?.scan_mode || 'auto'} onChange={e => updateConfig('scan_adapter_config', 'scan_mode', e.target.value)}>
+                    <option value="auto">Automaticky (find, jinak SFTP)</option>
+                    <option value="find">Vzdálený find</option>
+                    <option value="sftp">SFTP</option>
+                    <option value="agent">Scan agent (jen změny)</option>
+                  </select>
+                  <span className="form-hint">Vzdálený find vylistuje celý strom jedním příkazem místo jednoho SFTP požadavku na adresář. Scan agent (vyžaduje python3 na serveru) vrací jen změny proti poslednímu scanu.</span>
+                </div>
+                <div className="form-group">
+                  <label className="form-label">Souběžné SFTP kanály</label>
+                  <input className="input" type="number" min="1" max="32" value={formData.scan_adapter_config?.sftp_workers || 1} onChange={e => updateConfig('scan_adapter_config', 'sftp_workers', Math.max(1, parseInt(e.target.value) || 1))} />
+                  <span className="form-hint">Počet současně listovaných adresářů při SFTP scanu (bez vzdáleného find). Přes WAN doporučeno 4&ndash;8, 1 = sériový průchod.</span>
+                </div>
               </div>
             )}
 
+            <div className="form-group">
+              <label className="form-label">Další výjimky scanu</label>
+              <input className="input" value={(formData.scan_adapter_config?.exclude_patterns || []).join(', ')}
+                onChange={e => updateConfig('scan_adapter_config', 'exclude_patterns', e.target.value.split(',').map(p => p.trim()).filter(Boolean))}
+                placeholder="#recycle, *.part" />
+              <span className="form-hint">Čárkou oddělené patterny navíc k výchozím výjimkám. Adresáře, pod kterými je vše vyloučeno (např. @eaDir, .git), scan vůbec neprochází.</span>
+            </div>
+
+            <div className="form-group">
+              <label className="text-sm">
+                <input type="checkbox" checked={!!formData.scan_adapter_config?.fingerprint} onChange={e => updateConfig('scan_adapter_config', 'fingerprint', e.target.checked)} />{' '}
+                Otisky obsahu souborů (fingerprint)
+              </label>
+              <span className="form-hint">Scan čte začátek a konec každého souboru (malé soubory celé). Otisky se ukládají do cache, nezměněné soubory se znovu nečtou.</span>
+            </div>
+
             <div className="form-group">
               <label className="form-label">Způsob kopírování</label>
               <select className="input select" value={formData.transfer_adapter_type}
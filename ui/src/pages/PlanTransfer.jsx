@@ -246,7 +246,10 @@ export default function PlanTransfer() {
                                       <td>
                                         <input type="checkbox" checked={item.enabled !== false} onChange={e => toggleItemEnabled(batch.id, item.id, e.target.checked)} style={{ cursor: 'pointer' }} />
                                       </td>
-                                      <td className="text-mono text-sm">{item.full_rel_path}</td>
+                                      <td className="text-mono text-sm">
+                                        {item.full_rel_path}
+                                        {item.hardlink_of && <div className="text-muted text-sm">hardlink &rarr; {item.hardlink_of}</div>}
+                                      </td>
                                       <td className="nowrap" style={{ textAlign: 'right' }}>{formatGB(item.size)}</td>
                                       <td><StatusBadge status={item.category} /></td>
                                     </tr>
@@ -17,6 +17,7 @@ export default function Scan() {
   const [datasets, setDatasets] = useState([])
   const [loading, setLoading] = useState(false)
   const [selectedDataset, setSelectedDataset] = useState('')
+  const [incremental, setIncremental] = useState(false)
   const [selectedScan, setSelectedScan] = useState(null)
   const [runningScans, setRunningScans] = useState({})
   const [deleteTarget, setDeleteTarget] = useState(null)
@@ -50,7 +51,7 @@ export default function Scan() {
     if (!selectedDataset) return
     setLoading(true)
     try {
-      await axios.post('/api/scans/', { dataset_id: parseInt(selectedDataset) })
+      await axios.post('/api/scans/', { dataset_id: parseInt(selectedDataset), incremental })
       setSelectedDataset('')
       notify('Scan spuštěn', 'success')
       loadScans()
@@ -71,6 +72,16 @@ export default function Scan() {
     } finally { setDeleteTarget(null) }
   }
 
+  const handleScanControl = async (scanId, action, message) => {
+    try {
+      await axios.post(`/api/scans/${scanId}/${action}`)
+      notify(message, 'success')
+      loadScans()
+    } catch (err) {
+      notify('Chyba: ' + (err.response?.data?.detail || err.message), 'error')
+    }
+  }
+
   const handleExport = async (scanId) => {
     try {
       const { data } = await axios.get(`/api/scans/${scanId}/export`, { responseType: 'blob' })
@@ -98,6 +109,12 @@ export default function Scan() {
             ))}
           </select>
         </div>
+        <div className="form-group">
+          <label className="text-sm">
+            <input type="checkbox" checked={incremental} onChange={e => setIncremental(e.target.checked)} disabled={!canScan} />{' '}
+            Inkrementální scan (převzít nezměněné adresáře z posledního scanu, jen lokální scan)
+          </label>
+        </div>
         <button className="btn btn-primary" onClick={handleStartScan} disabled={!canScan || loading || !selectedDataset}>
           {loading ? 'Spouštím...' : 'Spustit scan'}
         </button>
@@ -133,6 +150,7 @@ export default function Scan() {
                     <td>{ds ? `${ds.name} (${ds.location})` : `Dataset #${scan.dataset_id}`}</td>
                     <td>
                       <StatusBadge status={scan.status} />
+                      {scan.base_scan_id && <span className="text-muted text-sm" style={{ marginLeft: '0.375rem' }}>(inkrementální z #{scan.base_scan_id})</span>}
                       {running && <span className="text-muted text-sm" style={{ marginLeft: '0.375rem' }}>({running.progress} souborů)</span>}
                       {scan.status === 'failed' && scan.error_message && (
                         <div className="banner banner-error mt-sm" style={{ marginBottom: 0, fontSize: '0.75rem' }}>{scan.error_message}</div>
@@ -149,7 +167,16 @@ export default function Scan() {
                         {scan.status === 'completed' && (
                           <button className="btn btn-success btn-sm" onClick={() => handleExport(scan.id)}>Export CSV</button>
                         )}
-                        <button className="btn btn-danger btn-sm" onClick={() => setDeleteTarget(scan.id)} disabled={mountStatus.safe_mode || scan.status === 'running'}>Smazat</button>
+                        {scan.status === 'running' && (
+                          <button className="btn btn-outline btn-sm" onClick={() => handleScanControl(scan.id, 'pause', 'Scan pozastaven')} disabled={mountStatus.safe_mode}>Pozastavit</button>
+                        )}
+                        {(scan.status === 'running' || scan.status === 'paused') && (
+                          <button className="btn btn-danger btn-sm" onClick={() => handleScanControl(scan.id, 'cancel', 'Scan se ukončuje')} disabled={mountStatus.safe_mode}>Zrušit</button>
+                        )}
+                        {['failed', 'cancelled', 'paused'].includes(scan.status) && (
+                          <button className="btn btn-primary btn-sm" onClick={() => handleScanControl(scan.id, 'resume', 'Scan pokračuje')} disabled={mountStatus.safe_mode}>Pokračovat</button>
+                        )}
+                        <button className="btn btn-danger btn-sm" onClick={() => setDeleteTarget(scan.id)} disabled={mountStatus.safe_mode || scan.status === 'running' || scan.status === 'paused'}>Smazat</button>
                       </div>
                     </td>
                   </tr>